@@ -7,22 +7,19 @@ if (-not $env:VIRTUAL_ENV) {
 }
 
 try {
-    Write-Host "Step 1: Deploying infrastructure..." -ForegroundColor Yellow
-    python src/aws_automation/setup_aws.py
+    Write-Host "Step 1: Deploying infrastructure and load balancer..." -ForegroundColor Yellow
+    python src/aws_automation/provision.py
     if ($LASTEXITCODE -ne 0) { throw "Infrastructure deployment failed" }
 
-    Write-Host "Step 2: Creating load balancer..." -ForegroundColor Yellow
-    python src/load_balancer/create_alb.py
-    if ($LASTEXITCODE -ne 0) { throw "ALB creation failed" }
+    Write-Host "Step 2: Waiting for every instance to be healthy..." -ForegroundColor Yellow
+    python src/aws_automation/readiness.py
+    if ($LASTEXITCODE -ne 0) { throw "Instances did not become ready" }
 
-    Write-Host "Step 3: Waiting for apps to start..." -ForegroundColor Yellow
-    Start-Sleep -Seconds 60
-
-    Write-Host "Step 4: Running benchmarks..." -ForegroundColor Yellow
+    Write-Host "Step 3: Running benchmarks..." -ForegroundColor Yellow
     python src/benchmarking/benchmarking_struct.py
     if ($LASTEXITCODE -ne 0) { throw "Benchmarking failed" }
 
-    Write-Host "Step 5: Collecting metrics..." -ForegroundColor Yellow
+    Write-Host "Step 4: Collecting metrics..." -ForegroundColor Yellow
     python src/monitoring/cloudwatch_metrics.py
     if ($LASTEXITCODE -ne 0) { throw "Metrics collection failed" }
 
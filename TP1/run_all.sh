@@ -14,19 +14,16 @@ if [ -f "requirements.txt" ]; then
     pip install -r requirements.txt
 fi
 
-echo "Step 1: Deploying infrastructure"
-python src/aws_automation/setup_aws.py
+echo "Step 1: Deploying infrastructure and load balancer"
+python src/aws_automation/provision.py
 
-echo "Step 2: Creating load balancer"
-python src/load_balancer/create_alb.py
+echo "Step 2: Waiting for every instance to be healthy"
+python src/aws_automation/readiness.py
 
-echo "Step 3: Waiting for apps to start"
-sleep 60
-
-echo "Step 4: Running benchmarks"
+echo "Step 3: Running benchmarks"
 python src/benchmarking/run_benchmark.py
 
-echo "Step 5: Collecting metrics"
+echo "Step 4: Collecting metrics"
 python src/monitoring/cloudwatch_metrics.py
 
 echo "Deployment complete! Check generated JSON/CSV files."
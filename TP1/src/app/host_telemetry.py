@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+# Columns of every sample: wall clock time, shares of CPU time over the last interval (steal is time
+# the hypervisor gave to other guests, which is how a t2 out of CPU credits shows up), runnable
+# processes, this worker's resident memory and bytes moved on all non-loopback interfaces
+FIELDS = (
+    'timestamp', 'cpu_percent', 'steal_percent', 'iowait_percent', 'run_queue', 'rss_bytes', 'net_rx_bytes', 'net_tx_bytes'
+)
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def read_cpu_times(proc):
+    """(busy, steal, iowait, total) jiffies and running processes from /proc/stat"""
+    times = None
+    running = 0
+    with open(os.path.join(proc, 'stat')) as f:
+        for line in f:
+            if line.startswith('cpu '):
+                times = [int(value) for value in line.split()[1:]]
+            elif line.startswith('procs_running'):
+                running = int(line.split()[1])
+    # user nice system idle iowait irq softirq steal; guest time is already counted in user
+    idle, iowait = times[3], times[4]
+    steal = times[7] if len(times) > 7 else 0
+    total = sum(times[:8])
+    return total - idle - iowait - steal, steal, iowait, total, running
+
+def read_network_bytes(proc):
+    rx = tx = 0
+    with open(os.path.join(proc, 'net', 'dev')) as f:
+        for line in f.readlines()[2:]:
+            interface, _, counters = line.partition(':')
+            if interface.strip() == 'lo':
+                continue
+            values = counters.split()
+            rx += int(values[0])
+            tx += int(values[8])
+    return rx, tx
+
+def read_rss_bytes(proc):
+    with open(os.path.join(proc, 'self', 'statm')) as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+class HostTelemetry:
+    """Samples /proc in the background into a fixed-size ring buffer of the most recent samples"""
+
+    def __init__(self, interval=None, capacity=None, proc='/proc'):
+        self.interval = interval if interval is not None else float(os.environ.get('APP_TELEMETRY_INTERVAL', 1.0))
+        # One hour of 1-second samples by default, about 100 bytes each
+        self.capacity = capacity if capacity is not None else int(os.environ.get('APP_TELEMETRY_CAPACITY', 3600))
+        self.proc = proc
+        self.samples = deque(maxlen=self.capacity or 1)
+        self._previous = None
+        self._task = None
+
+    def enabled(self):
+        return self.interval > 0 and self.capacity > 0 and os.path.exists(os.path.join(self.proc, 'stat'))
+
+    async def start(self):
+        if not self.enabled():
+            print("Host telemetry disabled")
+            return
+        self._previous = self.read()
+        self._task = asyncio.ensure_future(self.run())
+        print(f"Host telemetry sampling every {self.interval}s, keeping {self.capacity} samples")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self):
+        # Sleeping until the next multiple of the interval keeps the cadence steady under load
+        start = time.monotonic()
+        ticks = 0
+        while True:
+            ticks += 1
+            await asyncio.sleep(max(start + ticks * self.interval - time.monotonic(), 0))
+            try:
+                self.sample()
+            except (OSError, ValueError, IndexError) as e:
+                print(f"Host telemetry sample failed: {e}")
+
+    def read(self):
+        busy, steal, iowait, total, running = read_cpu_times(self.proc)
+        rx, tx = read_network_bytes(self.proc)
+        return busy, steal, iowait, total, running, rx, tx
+
+    def sample(self):
+        """Append the counters' change since the previous sample"""
+        current = self.read()
+        busy, steal, iowait, total = (now - before for now, before in zip(current[:4], self._previous[:4]))
+        total = total or 1
+        self.samples.append((
+            round(time.time(), 3),
+            round(busy * 100 / total, 2),
+            round(steal * 100 / total, 2),
+            round(iowait * 100 / total, 2),
+            # procs_running counts the sampling process itself
+            max(current[4] - 1, 0),
+            read_rss_bytes(self.proc),
+            current[5] - self._previous[5],
+            current[6] - self._previous[6]
+        ))
+        self._previous = current
+
+    def snapshot(self, since=0.0):
+        """Samples taken after since (epoch seconds), as one row per sample in FIELDS order"""
+        return [sample for sample in self.samples if sample[0] > since]
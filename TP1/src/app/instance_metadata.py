@@ -0,0 +1,102 @@
+import asyncio
+import os
+import time
+from urllib.parse import urlparse
+
+DEFAULT_METADATA_ENDPOINT = 'http://169.254.169.254'
+TOKEN_PATH = '/latest/api/token'
+INSTANCE_ID_PATH = '/latest/meta-data/instance-id'
+TOKEN_TTL_HEADER = 'X-aws-ec2-metadata-token-ttl-seconds'
+TOKEN_HEADER = 'X-aws-ec2-metadata-token'
+
+class InstanceMetadata:
+    """Async IMDSv2 client that fetches the instance identity once and serves it from memory"""
+
+    def __init__(self, endpoint=None, fallback=None, refresh_ttl=None, token_ttl=21600, timeout=2.0):
+        self.endpoint = endpoint or os.environ.get('METADATA_ENDPOINT', DEFAULT_METADATA_ENDPOINT)
+        self.fallback = fallback if fallback is not None else os.environ.get('INSTANCE_ID_FALLBACK', 'unknown')
+        self.refresh_ttl = refresh_ttl if refresh_ttl is not None else float(os.environ.get('METADATA_REFRESH_TTL', 300))
+        self.token_ttl = token_ttl
+        self.timeout = timeout
+
+        parsed = urlparse(self.endpoint)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+
+        self._instance_id = None
+        self._fetched_at = 0.0
+        self._token = None
+        self._token_expires_at = 0.0
+        self._refresh_task = None
+
+    async def start(self):
+        """Fetch the identity before the app starts serving"""
+        await self.refresh()
+        print(f"Instance metadata loaded: {self.instance_id()}")
+
+    def instance_id(self):
+        """Return the cached identity, scheduling a background refresh once it is older than the TTL"""
+        if self._is_stale() and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.ensure_future(self.refresh())
+        return self._instance_id or self.fallback
+
+    def _is_stale(self):
+        return self.refresh_ttl > 0 and time.monotonic() - self._fetched_at > self.refresh_ttl
+
+    async def refresh(self):
+        try:
+            instance_id = await self._get_metadata(INSTANCE_ID_PATH)
+            if instance_id:
+                self._instance_id = instance_id
+        except Exception as e:
+            print(f"Instance metadata refresh failed: {e}")
+        # Failed refreshes also wait a full TTL so an unreachable endpoint is not hammered
+        self._fetched_at = time.monotonic()
+
+    async def _get_metadata(self, path):
+        token = await self._get_token()
+        headers = {TOKEN_HEADER: token} if token else {}
+        status, body = await self._request('GET', path, headers)
+
+        if status == 401 and token:
+            # Token was revoked or expired early; fetch a new one and retry once
+            self._token = None
+            token = await self._get_token()
+            headers = {TOKEN_HEADER: token} if token else {}
+            status, body = await self._request('GET', path, headers)
+
+        if status != 200:
+            raise RuntimeError(f"GET {path} returned {status}")
+        return body.strip()
+
+    async def _get_token(self):
+        """Return the cached session token, requesting a new one shortly before it expires"""
+        if self._token and time.monotonic() < self._token_expires_at:
+            return self._token
+
+        status, body = await self._request('PUT', TOKEN_PATH, {TOKEN_TTL_HEADER: str(self.token_ttl)})
+        if status != 200:
+            # IMDSv2 unavailable, fall back to unauthenticated IMDSv1 requests
+            return None
+
+        self._token = body.strip()
+        self._token_expires_at = time.monotonic() + self.token_ttl * 0.9
+        return self._token
+
+    async def _request(self, method, path, headers):
+        return await asyncio.wait_for(self._send(method, path, headers), self.timeout)
+
+    async def _send(self, method, path, headers):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", "Connection: close", "Content-Length: 0"]
+            lines.extend(f"{name}: {value}" for name, value in headers.items())
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+
+        head, _, body = raw.partition(b'\r\n\r\n')
+        status = int(head.split(b' ', 2)[1])
+        return status, body.decode()
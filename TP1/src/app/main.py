@@ -0,0 +1,143 @@
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Query
+from fastapi.responses import Response
+from host_telemetry import FIELDS, HostTelemetry
+from instance_metadata import InstanceMetadata
+from metrics import LatencyHistograms, LatencyMiddleware
+from workloads import InjectedLatencyMiddleware, burn_cpu
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CLUSTER_NAME = os.environ.get('CLUSTER_NAME', 'unknown')
+
+# json: FastAPI default serialization, orjson: serialize every response with orjson,
+# precomputed: serialize each route body once per instance id and reuse the bytes
+RESPONSE_MODE = os.environ.get('APP_RESPONSE_MODE', 'json')
+
+# CPU work for /work runs in a 'process' or 'thread' pool so it never blocks the event loop
+WORK_POOL = os.environ.get('APP_WORK_POOL', 'process')
+WORK_POOL_SIZE = int(os.environ.get('APP_WORK_POOL_SIZE', 0)) or None
+
+# Extra delay per request, only set by the local cluster harness to mimic slower instances
+INJECT_LATENCY_MS = float(os.environ.get('APP_INJECT_LATENCY_MS', 0))
+INJECT_JITTER_MS = float(os.environ.get('APP_INJECT_JITTER_MS', 0))
+
+metadata = InstanceMetadata()
+telemetry = HostTelemetry()
+_body_cache = {}
+_work_executor = None
+
+@asynccontextmanager
+async def lifespan(app):
+    global _work_executor
+    await metadata.start()
+    await telemetry.start()
+    if WORK_POOL == 'thread':
+        _work_executor = ThreadPoolExecutor(max_workers=WORK_POOL_SIZE)
+    else:
+        # Spawned rather than forked so pool processes never inherit the listening socket
+        _work_executor = ProcessPoolExecutor(max_workers=WORK_POOL_SIZE, mp_context=multiprocessing.get_context('spawn'))
+    yield
+    await telemetry.stop()
+    _work_executor.shutdown(wait=False)
+
+app = FastAPI(lifespan=lifespan)
+
+def get_instance_id():
+    return metadata.instance_id()
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+def respond(payload):
+    """Serialize a per-request payload according to RESPONSE_MODE"""
+    if RESPONSE_MODE == 'json':
+        return payload
+    return Response(dumps(payload), media_type='application/json')
+
+def render(key, build):
+    """Build a constant route payload from the instance id, reusing the serialized body in precomputed mode"""
+    instance_id = get_instance_id()
+    if RESPONSE_MODE != 'precomputed':
+        return respond(build(instance_id))
+
+    cached = _body_cache.get(key)
+    if cached is None or cached[0] != instance_id:
+        cached = (instance_id, dumps(build(instance_id)))
+        _body_cache[key] = cached
+    return Response(cached[1], media_type='application/json')
+
+@app.get("/")
+async def root():
+    return render('root', lambda instance_id: {
+        "message": f"Instance {instance_id} is responding now!", "instance_id": instance_id, "cluster": CLUSTER_NAME
+    })
+
+@app.get("/health")
+async def health():
+    return render('health', lambda instance_id: {
+        "status": "healthy", "instance_id": instance_id, "cluster": CLUSTER_NAME
+    })
+
+@app.get("/cluster1")
+async def cluster1():
+    return render('cluster1', lambda instance_id: {
+        "message": f"Cluster1 - Instance {instance_id} is responding now!", "instance_id": instance_id, "cluster": "cluster1"
+    })
+
+@app.get("/cluster2")
+async def cluster2():
+    return render('cluster2', lambda instance_id: {
+        "message": f"Cluster2 - Instance {instance_id} is responding now!", "instance_id": instance_id, "cluster": "cluster2"
+    })
+
+workload_router = APIRouter()
+
+@workload_router.get("/work")
+async def work(cpu_ms: int = Query(10, ge=0, le=5000), alloc_kb: int = Query(0, ge=0, le=65536)):
+    loop = asyncio.get_event_loop()
+    result = await loop.run_in_executor(_work_executor, burn_cpu, cpu_ms, alloc_kb)
+    result.update({"instance_id": get_instance_id(), "cluster": CLUSTER_NAME})
+    return respond(result)
+
+@workload_router.get("/io")
+async def io_wait(sleep_ms: int = Query(10, ge=0, le=10000), payload_bytes: int = Query(0, ge=0, le=10485760, alias='bytes')):
+    await asyncio.sleep(sleep_ms / 1000)
+    return respond({
+        "sleep_ms": sleep_ms, "payload": "x" * payload_bytes, "instance_id": get_instance_id(), "cluster": CLUSTER_NAME
+    })
+
+@app.get("/metrics")
+async def metrics():
+    return Response(latency_histograms.render_prometheus(), media_type='text/plain; version=0.0.4')
+
+@app.get("/telemetry")
+async def host_telemetry(since: float = Query(0.0, ge=0)):
+    # Every uvicorn worker samples on its own: host-wide columns agree, rss_bytes is the answering worker's
+    return respond({
+        "instance_id": get_instance_id(), "cluster": CLUSTER_NAME, "pid": os.getpid(), "interval": telemetry.interval,
+        "fields": FIELDS, "samples": telemetry.snapshot(since)
+    })
+
+# The ALB forwards /cluster1* and /cluster2* unchanged, so the workloads are also mounted under those prefixes
+WORKLOAD_PREFIXES = ('', '/cluster1', '/cluster2')
+for prefix in WORKLOAD_PREFIXES:
+    app.include_router(workload_router, prefix=prefix)
+
+route_paths = [route.path for route in app.routes if hasattr(route, 'path')]
+route_paths += [prefix + route.path for prefix in WORKLOAD_PREFIXES for route in workload_router.routes]
+latency_histograms = LatencyHistograms(route_paths)
+app.add_middleware(LatencyMiddleware, histograms=latency_histograms)
+if INJECT_LATENCY_MS or INJECT_JITTER_MS:
+    # Added last so it wraps the latency middleware: the delay shows up client-side only, like network time
+    app.add_middleware(InjectedLatencyMiddleware, latency_ms=INJECT_LATENCY_MS, jitter_ms=INJECT_JITTER_MS)
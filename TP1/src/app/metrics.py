@@ -0,0 +1,77 @@
+import os
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds, log scale from 100us to ~105s with 4 buckets per decade
+BUCKET_BOUNDS = tuple(round(1e-4 * 10 ** (i / 4), 7) for i in range(25))
+
+# Workers of this server (set by server.py); each scrape reports it so a client knows how many pids to collect
+WORKER_COUNT = int(os.environ.get('APP_WORKERS', 1))
+
+class RouteHistogram:
+    """Fixed-bucket service time histogram; recording only updates preallocated counters"""
+
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        # Last slot is the +Inf bucket
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def record(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+class LatencyHistograms:
+    """Per-route histograms, created once for the known route paths"""
+
+    def __init__(self, routes):
+        # Anything that is not a known route (404s, scanners) shares 'other' to bound the series count
+        self.histograms = {route: RouteHistogram() for route in routes}
+        self.other = RouteHistogram()
+
+    def get(self, path):
+        return self.histograms.get(path, self.other)
+
+    def render_prometheus(self):
+        """Render all histograms in the Prometheus text exposition format"""
+        # Each uvicorn worker has its own histograms, the pid label keeps their series apart
+        pid = os.getpid()
+        lines = [
+            '# HELP app_workers Number of server workers, each exposing its own series',
+            '# TYPE app_workers gauge',
+            f'app_workers{{pid="{pid}"}} {WORKER_COUNT}',
+            '# HELP app_request_duration_seconds Time spent in the app per request',
+            '# TYPE app_request_duration_seconds histogram'
+        ]
+        routes = list(self.histograms.items()) + [('other', self.other)]
+        for route, histogram in routes:
+            labels = f'route="{route}",pid="{pid}"'
+            cumulative = 0
+            for bound, count in zip(BUCKET_BOUNDS, histogram.counts):
+                cumulative += count
+                lines.append(f'app_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'app_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'app_request_duration_seconds_sum{{{labels}}} {histogram.total}')
+            lines.append(f'app_request_duration_seconds_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+class LatencyMiddleware:
+    """ASGI middleware that records per-route service time from request start to the last response byte"""
+
+    def __init__(self, app, histograms):
+        self.app = app
+        self.histograms = histograms
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.histograms.get(scope['path']).record(time.perf_counter() - start)
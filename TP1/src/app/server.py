@@ -0,0 +1,79 @@
+import argparse
+import importlib.util
+import os
+import uvicorn
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# workers='auto' uses one worker per available CPU
+PROFILES = {
+    'baseline': {
+        'workers': 1,
+        'loop': 'asyncio',
+        'http': 'h11',
+        'response_mode': 'json',
+        'access_log': True
+    },
+    'tuned': {
+        'workers': 'auto',
+        'loop': 'uvloop',
+        'http': 'httptools',
+        'response_mode': 'precomputed',
+        'access_log': False
+    }
+}
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def resolve_profile(name, workers=None):
+    """Turn a profile name into concrete uvicorn settings for this host"""
+    if name not in PROFILES:
+        raise ValueError(f"Unknown server profile '{name}', expected one of {sorted(PROFILES)}")
+
+    profile = dict(PROFILES[name])
+    if workers is not None:
+        profile['workers'] = workers
+    elif profile['workers'] == 'auto':
+        profile['workers'] = available_cpus()
+
+    # uvloop and httptools are optional, fall back to the pure-python implementations
+    if profile['loop'] == 'uvloop' and importlib.util.find_spec('uvloop') is None:
+        profile['loop'] = 'asyncio'
+    if profile['http'] == 'httptools' and importlib.util.find_spec('httptools') is None:
+        profile['http'] = 'h11'
+
+    return profile
+
+def run(profile_name, host='0.0.0.0', port=8000, workers=None):
+    profile = resolve_profile(profile_name, workers)
+    # Workers re-import main.py, so the response mode and worker count are handed over through the environment
+    os.environ['APP_RESPONSE_MODE'] = profile['response_mode']
+    os.environ['APP_WORKERS'] = str(profile['workers'])
+
+    print(f"Starting app with profile '{profile_name}': {profile}")
+    uvicorn.run(
+        'main:app',
+        host=host,
+        port=port,
+        app_dir=APP_DIR,
+        workers=profile['workers'],
+        loop=profile['loop'],
+        http=profile['http'],
+        access_log=profile['access_log']
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the cluster app with a server profile')
+    parser.add_argument('--profile', default=os.environ.get('APP_SERVER_PROFILE', 'baseline'), choices=sorted(PROFILES))
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help='Override the profile worker count')
+    args = parser.parse_args()
+
+    run(args.profile, args.host, args.port, args.workers)
+
+if __name__ == "__main__":
+    main()
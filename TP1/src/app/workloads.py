@@ -0,0 +1,39 @@
+import asyncio
+import random
+import time
+
+PAGE_SIZE = 4096
+
+def burn_cpu(cpu_ms, alloc_kb):
+    """Hold alloc_kb of touched memory and spin until cpu_ms of CPU time has been used"""
+    buffer = bytearray(alloc_kb * 1024)
+    for offset in range(0, len(buffer), PAGE_SIZE):
+        buffer[offset] = 1
+
+    start = time.thread_time()
+    deadline = start + cpu_ms / 1000
+    iterations = 0
+    value = 0
+    while time.thread_time() < deadline:
+        for i in range(1000):
+            value = (value * 31 + i) & 0xFFFFFFFF
+        iterations += 1
+
+    return {
+        'cpu_ms': (time.thread_time() - start) * 1000,
+        'alloc_kb': len(buffer) // 1024,
+        'iterations': iterations
+    }
+
+class InjectedLatencyMiddleware:
+    """ASGI middleware that delays every response by latency_ms plus up to jitter_ms, to mimic a slower network path"""
+
+    def __init__(self, app, latency_ms, jitter_ms=0.0):
+        self.app = app
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await asyncio.sleep((self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000)
+        await self.app(scope, receive, send)
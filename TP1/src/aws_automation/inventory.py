@@ -0,0 +1,201 @@
+import boto3
+import json
+import os
+import sys
+import threading
+import time
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from constants import CLUSTER_CONFIGS, PROJECT_NAME
+
+INVENTORY_FILE = 'inventory.json'
+
+# Bumped whenever the layout of the state file changes; files of another version are rediscovered
+INVENTORY_VERSION = 1
+
+# Entries checked against AWS this recently are trusted without another call
+MAX_AGE = 300
+
+# Instance states that change on their own, so an instance in one of them is always revalidated
+TRANSITIONAL_STATES = ('pending', 'stopping', 'shutting-down')
+
+# Guards the read-modify-write of the state file between threads, e.g. the steps of provision.py
+_lock = threading.Lock()
+
+def instance_record(instance):
+    """What the scripts need of one describe_instances entry, JSON serializable"""
+    tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+    cpu_options = instance.get('CpuOptions', {})
+    return {
+        'InstanceId': instance['InstanceId'],
+        'PublicDnsName': instance.get('PublicDnsName', ''),
+        'PublicIpAddress': instance.get('PublicIpAddress', ''),
+        'State': instance['State']['Name'],
+        'InstanceType': instance['InstanceType'],
+        'Cluster': tags.get('Cluster', 'unknown'),
+        'ImageMode': tags.get('ImageMode', 'standard'),
+        'LaunchTime': instance['LaunchTime'].isoformat(),
+        'VCpus': cpu_options.get('CoreCount', 1) * cpu_options.get('ThreadsPerCore', 1)
+    }
+
+def split_clusters(instances):
+    """{cluster: [records]} with an entry for every cluster in CLUSTER_CONFIGS"""
+    clusters = {cluster: [] for cluster in CLUSTER_CONFIGS}
+    for instance in instances:
+        clusters.setdefault(instance['Cluster'], []).append(instance)
+    return clusters
+
+class Inventory:
+    """Project resources found in AWS, kept in a versioned state file shared by every script
+
+    Each section (instances, security group, target groups, load balancer) records when it was last
+    checked. Within MAX_AGE it is used as is, after that it is revalidated: instances by id, which
+    falls back to a paginated scan of the Project tag, the others by name. Resources that are not
+    found are not recorded, so they are looked up again next time. refresh=True always rescans.
+    """
+
+    def __init__(self, path=INVENTORY_FILE, max_age=MAX_AGE, ec2_client=None, elbv2_client=None):
+        self.path = path
+        self.max_age = max_age
+        self.project_name = PROJECT_NAME
+        self.ec2_client = ec2_client or boto3.client('ec2')
+        self.elbv2_client = elbv2_client or boto3.client('elbv2')
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = None
+        except ValueError:
+            print(f"Ignoring unreadable {self.path}")
+            state = None
+        if state is not None and (state.get('version') != INVENTORY_VERSION or state.get('project') != self.project_name):
+            print(f"Ignoring {self.path} from another version or project")
+            state = None
+        return state or {'version': INVENTORY_VERSION, 'project': self.project_name}
+
+    def update(self, section, change):
+        """Set one section of the state file to change(current section), stamped as checked now"""
+        with _lock:
+            state = self.load()
+            state[section] = dict(change(state.get(section) or {}), checked=time.time())
+            # Written next to the file and renamed over it, so a reader never sees half a file
+            temporary = f"{self.path}.tmp"
+            with open(temporary, 'w') as f:
+                json.dump(state, f, indent=2)
+            os.replace(temporary, self.path)
+
+    def cached(self, section):
+        """The section if it was checked within max_age, else None"""
+        entry = self.load().get(section)
+        if entry is None or time.time() - entry['checked'] > self.max_age:
+            return None
+        return entry
+
+    def clear(self):
+        with _lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    # Instances
+
+    def scan_instances(self):
+        """Every instance tagged with the project, across all pages"""
+        paginator = self.ec2_client.get_paginator('describe_instances')
+        pages = paginator.paginate(Filters=[{'Name': 'tag:Project', 'Values': [self.project_name]}])
+        return [
+            instance_record(instance)
+            for page in pages for reservation in page['Reservations'] for instance in reservation['Instances']
+        ]
+
+    def describe_instances(self, instance_ids):
+        """Current records of the given instances, which are added to the inventory"""
+        paginator = self.ec2_client.get_paginator('describe_instances')
+        records = [
+            instance_record(instance)
+            for page in paginator.paginate(InstanceIds=list(instance_ids))
+            for reservation in page['Reservations'] for instance in reservation['Instances']
+        ]
+        described = {record['InstanceId']: record for record in records}
+        self.update('instances', lambda entry: {'items': dict(entry.get('items', {}), **described)})
+        return records
+
+    def get_instances(self, states=('running',), refresh=False):
+        """Project instances in one of states, sorted by cluster and id"""
+        entry = None if refresh else self.load().get('instances')
+        items = entry['items'] if entry else {}
+        if not items:
+            records = self.scan_instances()
+            self.update('instances', lambda entry: {'items': {record['InstanceId']: record for record in records}})
+            print(f"Discovered {len(records)} project instances")
+        elif self.cached('instances') and not any(item['State'] in TRANSITIONAL_STATES for item in items.values()):
+            records = list(items.values())
+        else:
+            try:
+                records = self.describe_instances(sorted(items))
+            except ClientError as e:
+                # Instances terminated long enough ago are gone from EC2 altogether
+                if e.response['Error']['Code'] != 'InvalidInstanceID.NotFound':
+                    raise
+                return self.get_instances(states, refresh=True)
+        return sorted((record for record in records if record['State'] in states),
+                      key=lambda record: (record['Cluster'], record['InstanceId']))
+
+    # Security group, target groups and load balancer
+
+    def get_security_group(self):
+        """Id of the project's security group, None if there is none"""
+        entry = self.cached('security_group')
+        if entry is not None:
+            return entry['GroupId']
+        groups = self.ec2_client.describe_security_groups(
+            Filters=[{'Name': 'group-name', 'Values': [f'{self.project_name}-SG']}]
+        )['SecurityGroups']
+        if not groups:
+            return None
+        self.set_security_group(groups[0]['GroupId'])
+        return groups[0]['GroupId']
+
+    def set_security_group(self, group_id):
+        self.update('security_group', lambda entry: {'GroupId': group_id})
+
+    def get_target_groups(self):
+        """{cluster: target group ARN} of the project's target groups that exist"""
+        names = {cluster: f"{self.project_name}-{config['name']}-TG" for cluster, config in CLUSTER_CONFIGS.items()}
+        entry = self.cached('target_groups')
+        if entry is not None and all(cluster in entry['arns'] for cluster in names):
+            return {cluster: entry['arns'][cluster] for cluster in names}
+        arns = {}
+        for cluster, name in names.items():
+            try:
+                response = self.elbv2_client.describe_target_groups(Names=[name])
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TargetGroupNotFound':
+                    raise
+                continue
+            arns[cluster] = response['TargetGroups'][0]['TargetGroupArn']
+        if len(arns) == len(names):
+            self.update('target_groups', lambda entry: {'arns': arns})
+        return arns
+
+    def set_target_group(self, cluster, target_group_arn):
+        self.update('target_groups', lambda entry: {'arns': dict(entry.get('arns', {}), **{cluster: target_group_arn})})
+
+    def get_load_balancer(self):
+        """{'LoadBalancerArn', 'DNSName'} of the project's ALB, None if there is none"""
+        entry = self.cached('load_balancer')
+        if entry is not None:
+            return entry['alb']
+        try:
+            alb = self.elbv2_client.describe_load_balancers(Names=[f'{self.project_name}-ALB'])['LoadBalancers'][0]
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'LoadBalancerNotFound':
+                raise
+            return None
+        self.set_load_balancer(alb['LoadBalancerArn'], alb['DNSName'])
+        return {'LoadBalancerArn': alb['LoadBalancerArn'], 'DNSName': alb['DNSName']}
+
+    def set_load_balancer(self, alb_arn, alb_dns):
+        self.update('load_balancer', lambda entry: {'alb': {'LoadBalancerArn': alb_arn, 'DNSName': alb_dns}})
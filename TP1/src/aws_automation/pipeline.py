@@ -0,0 +1,70 @@
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+class Pipeline:
+    """Runs named steps on a thread pool, each as soon as the steps it depends on have finished"""
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.steps = {}
+        self.timeline = {}
+        self.start_time = None
+
+    def add(self, name, function, depends_on=()):
+        """function is called with the results of depends_on, in order"""
+        self.steps[name] = (function, tuple(depends_on))
+
+    def run_step(self, name, function, arguments):
+        started = time.perf_counter() - self.start_time
+        try:
+            return function(*arguments)
+        finally:
+            self.timeline[name] = {'start': started, 'end': time.perf_counter() - self.start_time}
+
+    def run(self):
+        """Results by step name; the first failing step stops new steps from starting and is re-raised"""
+        self.start_time = time.perf_counter()
+        results = {}
+        pending = dict(self.steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name, (function, depends_on) in list(pending.items()):
+                    if all(dependency in results for dependency in depends_on):
+                        del pending[name]
+                        arguments = [results[dependency] for dependency in depends_on]
+                        running[executor.submit(self.run_step, name, function, arguments)] = name
+                if not running:
+                    raise ValueError(f"Steps with unknown or circular dependencies: {sorted(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception:
+                        print(f"Step '{name}' failed")
+                        raise
+        return results
+
+    def print_timeline(self, title='PROVISIONING TIMELINE', width=40):
+        total = max(step['end'] for step in self.timeline.values()) or 1
+        print("\n" + "="*60)
+        print(f"{title} ({total:.1f}s)")
+        print("="*60)
+        name_width = max(len(name) for name in self.timeline)
+        for name, step in sorted(self.timeline.items(), key=lambda item: item[1]['start']):
+            begin = int(step['start'] / total * width)
+            length = max(int(step['end'] / total * width) - begin, 1)
+            bar = ' ' * begin + '#' * length
+            print(f"  {name:<{name_width}} {step['start']:6.1f}s - {step['end']:6.1f}s |{bar:<{width}}|")
+
+    def save_timeline(self, path='provision_timeline.json'):
+        timeline = {
+            name: dict(step, duration=step['end'] - step['start'])
+            for name, step in sorted(self.timeline.items(), key=lambda item: item[1]['start'])
+        }
+        with open(path, 'w') as f:
+            json.dump({'total': max(step['end'] for step in timeline.values()), 'steps': timeline}, f, indent=2)
+        print(f"Timeline saved to {path}")
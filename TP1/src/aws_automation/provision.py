@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from constants import CLUSTER_CONFIGS, DEFAULT_AMI_ID
+from load_balancer.create_alb import ALBManager
+from pipeline import Pipeline
+from setup_aws import AWSManager
+
+def build_pipeline(aws, alb, ami_id):
+    """Deployment steps of setup_aws.py and create_alb.py, with only their real dependencies between them"""
+    pipeline = Pipeline()
+    pipeline.add('security_group', aws.create_security_group)
+    # The base AMI is known up front; a prebaked image may first have to be baked, which needs the security group
+    if aws.prebaked:
+        pipeline.add('image', lambda security_group: aws.get_prebaked_image(ami_id, security_group), ['security_group'])
+    else:
+        pipeline.add('image', lambda: ami_id)
+    pipeline.add('network', alb.get_vpc_and_subnets)
+    pipeline.add('load_balancer', lambda network, security_group: alb.create_load_balancer(network[1], security_group),
+                 ['network', 'security_group'])
+
+    for cluster in CLUSTER_CONFIGS:
+        pipeline.add(f'launch_{cluster}', lambda image, security_group, cluster=cluster: aws.launch_cluster(cluster, image, security_group),
+                     ['image', 'security_group'])
+        pipeline.add(f'target_group_{cluster}', lambda network, cluster=cluster: alb.create_target_group(cluster, network[0]),
+                     ['network'])
+        pipeline.add(f'register_{cluster}',
+                     lambda instance_ids, target_group, cluster=cluster: alb.register_when_running(cluster, target_group, instance_ids),
+                     [f'launch_{cluster}', f'target_group_{cluster}'])
+
+    target_group_steps = [f'target_group_{cluster}' for cluster in CLUSTER_CONFIGS]
+    pipeline.add('listener', lambda load_balancer, *arns: alb.create_listener_with_rules(load_balancer[0], dict(zip(CLUSTER_CONFIGS, arns))),
+                 ['load_balancer'] + target_group_steps)
+    pipeline.add('alb_available', lambda load_balancer, listener: alb.wait_for_alb(load_balancer[0]), ['load_balancer', 'listener'])
+
+    def save_info(load_balancer, *steps):
+        launched = steps[:len(CLUSTER_CONFIGS)]
+        cluster1_instances, cluster2_instances = aws.get_instance_details([i for instance_ids in launched for i in instance_ids])
+        aws.save_deployment_info(cluster1_instances, cluster2_instances)
+        alb.save_alb_info(load_balancer[1], cluster1_instances, cluster2_instances)
+
+    # Registration only finishes once every instance is running, so the public DNS names are known by then
+    pipeline.add('save_info', save_info,
+                 ['load_balancer'] + [f'launch_{cluster}' for cluster in CLUSTER_CONFIGS] +
+                 [f'register_{cluster}' for cluster in CLUSTER_CONFIGS] + ['alb_available'])
+    return pipeline
+
+def main():
+    parser = argparse.ArgumentParser(description='Deploy the instances and the ALB with independent steps overlapped')
+    parser.add_argument('--ami', default=DEFAULT_AMI_ID, help='Base AMI, also the one a prebaked image is built from')
+    parser.add_argument('--prebaked', action='store_true', help='Boot from an image with the dependencies pre-installed')
+    parser.add_argument('--timeline', default='provision_timeline.json', help='Where to save the per-step timeline')
+    args = parser.parse_args()
+
+    pipeline = None
+    try:
+        print("Starting pipelined deployment")
+
+        pipeline = build_pipeline(AWSManager(prebaked=args.prebaked), ALBManager(), args.ami)
+        pipeline.run()
+
+        print("\nDeployment completed successfully!")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        raise
+    finally:
+        if pipeline is not None and pipeline.timeline:
+            pipeline.print_timeline()
+            pipeline.save_timeline(args.timeline)
+
+if __name__ == "__main__":
+    main()
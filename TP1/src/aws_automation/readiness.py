@@ -0,0 +1,309 @@
+import argparse
+import boto3
+import csv
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from constants import CLUSTER_CONFIGS
+from aws_automation.inventory import Inventory
+
+# Instance states an instance never comes back from on its own
+DEAD_STATES = ('shutting-down', 'terminated', 'stopping', 'stopped')
+
+# Boot times of every run, appended to so the standard and prebaked image modes can be compared
+BOOT_TIMES_FILE = 'boot_times.csv'
+BOOT_TIMES_FIELDS = ('timestamp', 'instance_id', 'cluster', 'image_mode', 'boot_to_first_health', 'boot_to_ready')
+
+# Target health reasons that mean the target will never become healthy without a fix
+FATAL_REASONS = ('Target.NotRegistered', 'Target.NotInUse', 'Target.InvalidState')
+
+class ReadinessError(Exception):
+    pass
+
+class ReadinessGate:
+    """Waits until every instance is healthy in its target group and answers /health itself"""
+
+    def __init__(self, timeout=900, min_interval=2, max_interval=20, health_timeout=3,
+                 max_health_errors=3, alb_lag=120):
+        self.ec2_client = boto3.client('ec2')
+        self.elbv2_client = boto3.client('elbv2')
+        self.inventory = Inventory(ec2_client=self.ec2_client, elbv2_client=self.elbv2_client)
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.health_timeout = health_timeout
+        # Consecutive error responses from /health before giving up on an instance
+        self.max_health_errors = max_health_errors
+        # How long the ALB may keep reporting an instance unhealthy after its /health answers directly
+        self.alb_lag = alb_lag
+        self.instances = {}
+
+    def load_instances(self, deployment_file='deployment_info.json'):
+        with open(deployment_file, 'r') as f:
+            deployment = json.load(f)
+        for cluster, instances in deployment['clusters'].items():
+            for instance in instances:
+                self.instances[instance['InstanceId']] = {
+                    'cluster': cluster,
+                    'image_mode': instance.get('ImageMode', 'standard'),
+                    'public_dns': instance.get('PublicDnsName', ''),
+                    'instance_state': None,
+                    'launch_time': None,
+                    'target_state': None,
+                    'target_reason': None,
+                    'health': None,
+                    'health_errors': 0,
+                    'app_ready_at': None,
+                    'app_ready_time': None,
+                    'ready_at': None,
+                    'ready_time': None
+                }
+        print(f"Waiting for {len(self.instances)} instances")
+
+    def get_target_groups(self):
+        target_groups = self.inventory.get_target_groups()
+        missing = [cluster for cluster in CLUSTER_CONFIGS if cluster not in target_groups]
+        if missing:
+            raise ReadinessError(f"No target group for {', '.join(missing)}, run provision.py first")
+        return target_groups
+
+    def check_instances(self):
+        response = self.ec2_client.describe_instances(InstanceIds=sorted(self.instances))
+        return {
+            instance['InstanceId']: (instance['State']['Name'], instance['LaunchTime'], instance.get('PublicDnsName', ''))
+            for reservation in response['Reservations'] for instance in reservation['Instances']
+        }
+
+    def check_target_health(self, target_group_arn):
+        response = self.elbv2_client.describe_target_health(TargetGroupArn=target_group_arn)
+        return {
+            description['Target']['Id']: (description['TargetHealth']['State'], description['TargetHealth'].get('Reason'))
+            for description in response['TargetHealthDescriptions']
+        }
+
+    def check_app(self, instance_id):
+        """(ok, detail) of GET /health on the instance itself; the answer must come from the expected cluster"""
+        instance = self.instances[instance_id]
+        if not instance['public_dns']:
+            return False, 'no public DNS name yet'
+        try:
+            with urllib.request.urlopen(f"http://{instance['public_dns']}:8000/health", timeout=self.health_timeout) as response:
+                body = json.load(response)
+        except urllib.error.HTTPError as e:
+            return False, f"HTTP {e.code}"
+        except (OSError, ValueError) as e:
+            return False, f"{type(e).__name__}: {getattr(e, 'reason', e)}"
+        if body.get('cluster') != instance['cluster']:
+            return False, f"answered as cluster {body.get('cluster')}"
+        return True, 'ok'
+
+    def poll(self, executor, target_groups, check_aws=True):
+        """Run one round of checks concurrently and update every instance's state
+
+        Without check_aws only the instances that have not answered /health yet are checked, against the
+        instance and target states of the last full round.
+        """
+        if check_aws:
+            instances_future = executor.submit(self.check_instances)
+            health_futures = {cluster: executor.submit(self.check_target_health, arn) for cluster, arn in target_groups.items()}
+        app_futures = {
+            instance_id: executor.submit(self.check_app, instance_id)
+            for instance_id, instance in self.instances.items() if check_aws or instance['app_ready_at'] is None
+        }
+
+        now = time.monotonic()
+        if check_aws:
+            for instance_id, (state, launch_time, public_dns) in instances_future.result().items():
+                instance = self.instances[instance_id]
+                instance['instance_state'] = state
+                instance['launch_time'] = launch_time
+                instance['public_dns'] = public_dns or instance['public_dns']
+
+            target_health = {}
+            for cluster, future in health_futures.items():
+                target_health.update(future.result())
+            for instance_id, instance in self.instances.items():
+                instance['target_state'], instance['target_reason'] = target_health.get(instance_id, ('missing', 'Target.NotRegistered'))
+        for instance_id, future in app_futures.items():
+            instance = self.instances[instance_id]
+            ok, detail = future.result()
+            instance['health'] = detail
+            if ok:
+                instance['health_errors'] = 0
+                if instance['app_ready_at'] is None:
+                    instance['app_ready_at'] = now
+                    instance['app_ready_time'] = datetime.now(timezone.utc)
+            elif detail.startswith('HTTP') or detail.startswith('answered'):
+                # The app is up but answering wrong; connection errors are expected while it installs and starts
+                instance['health_errors'] += 1
+            if check_aws and ok and instance['target_state'] == 'healthy' and instance['ready_at'] is None:
+                instance['ready_at'] = now
+                instance['ready_time'] = datetime.now(timezone.utc)
+
+    def failures(self, now):
+        """Instances that will not become ready without intervention, with the reason"""
+        failed = {}
+        for instance_id, instance in self.instances.items():
+            if instance['instance_state'] in DEAD_STATES:
+                failed[instance_id] = f"instance is {instance['instance_state']}"
+            elif instance['target_reason'] in FATAL_REASONS:
+                failed[instance_id] = f"target {instance['target_state']} ({instance['target_reason']})"
+            elif instance['health_errors'] >= self.max_health_errors:
+                failed[instance_id] = f"/health failed {instance['health_errors']} times in a row: {instance['health']}"
+            elif (instance['app_ready_at'] is not None and instance['target_state'] != 'healthy'
+                  and now - instance['app_ready_at'] > self.alb_lag):
+                failed[instance_id] = (f"/health answers directly but the ALB reports {instance['target_state']} "
+                                       f"({instance['target_reason']}) for over {self.alb_lag}s, check the security group")
+        return failed
+
+    def wait(self, target_groups):
+        """Poll until every instance is ready, backing off while nothing changes; raises ReadinessError otherwise"""
+        start = time.monotonic()
+        interval = self.min_interval
+        progress = None
+        next_aws_check = start
+        with ThreadPoolExecutor(max_workers=len(self.instances) + len(target_groups) + 1) as executor:
+            while True:
+                check_aws = time.monotonic() >= next_aws_check
+                self.poll(executor, target_groups, check_aws)
+                now = time.monotonic()
+                ready = sum(1 for instance in self.instances.values() if instance['ready_at'] is not None)
+                healthy = sum(1 for instance in self.instances.values() if instance['target_state'] == 'healthy')
+                answering = sum(1 for instance in self.instances.values() if instance['app_ready_at'] is not None)
+                if ready == len(self.instances):
+                    print(f"[{now - start:6.1f}s] All {ready} instances ready")
+                    return now - start
+
+                failed = self.failures(now)
+                if failed:
+                    raise ReadinessError(f"{len(failed)} instances will not become ready: " +
+                                         "; ".join(f"{instance_id} {reason}" for instance_id, reason in failed.items()))
+                if now - start > self.timeout:
+                    raise ReadinessError(f"Only {ready} of {len(self.instances)} instances ready after {self.timeout}s")
+
+                if check_aws:
+                    # Progress resets the interval, quiet rounds double it up to max_interval
+                    interval = self.min_interval if (healthy, answering, ready) != progress else min(interval * 2, self.max_interval)
+                    progress = (healthy, answering, ready)
+                    next_aws_check = now + interval
+                    print(f"[{now - start:6.1f}s] {healthy}/{len(self.instances)} healthy in their target group, "
+                          f"{answering}/{len(self.instances)} answering /health, next check in {interval}s")
+                # The back-off only applies to the EC2 and ALB side: /health is checked every min_interval until each
+                # instance first answers, so boot_to_first_health is at most min_interval late
+                delay = next_aws_check - time.monotonic()
+                if answering < len(self.instances):
+                    delay = min(delay, self.min_interval)
+                time.sleep(max(delay, 0))
+
+    def report(self, start_time, elapsed=None, error=None):
+        instances = {}
+        for instance_id, instance in sorted(self.instances.items(), key=lambda item: (item[1]['cluster'], item[0])):
+            entry = {
+                'cluster': instance['cluster'],
+                'image_mode': instance['image_mode'],
+                'instance_state': instance['instance_state'],
+                'target_state': instance['target_state'],
+                'target_reason': instance['target_reason'],
+                'health': instance['health'],
+                'app_ready_after': instance['app_ready_at'] - start_time if instance['app_ready_at'] is not None else None,
+                'ready_after': instance['ready_at'] - start_time if instance['ready_at'] is not None else None
+            }
+            if instance['launch_time'] is not None:
+                # First direct /health answer is when the app is up; ready adds the ALB's healthy threshold
+                if instance['app_ready_time'] is not None:
+                    entry['boot_to_first_health'] = (instance['app_ready_time'] - instance['launch_time']).total_seconds()
+                if instance['ready_time'] is not None:
+                    entry['boot_to_ready'] = (instance['ready_time'] - instance['launch_time']).total_seconds()
+            instances[instance_id] = entry
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'ready': error is None,
+            'error': error,
+            'wait_seconds': elapsed,
+            'poll_interval': [self.min_interval, self.max_interval],
+            'modes': summarize_boot_times(instances.values()),
+            'instances': instances
+        }
+
+    def save_boot_times(self, report, path=BOOT_TIMES_FILE):
+        """Append this run's per-instance boot times to the history file"""
+        rows = [
+            [report['timestamp'], instance_id, entry['cluster'], entry['image_mode'],
+             entry.get('boot_to_first_health', ''), entry.get('boot_to_ready', '')]
+            for instance_id, entry in report['instances'].items() if 'boot_to_first_health' in entry
+        ]
+        if not rows:
+            return
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(BOOT_TIMES_FIELDS)
+            writer.writerows(rows)
+        print(f"Boot times appended to {path}")
+
+    def print_report(self, report):
+        print("\n" + "="*60)
+        print("READINESS " + ("OK" if report['ready'] else "FAILED"))
+        print("="*60)
+        for instance_id, entry in report['instances'].items():
+            line = (f"  • {instance_id} ({entry['cluster']}): {entry['instance_state']}, target {entry['target_state']}"
+                    + (f" ({entry['target_reason']})" if entry['target_reason'] else "") + f", /health {entry['health']}")
+            if entry.get('boot_to_ready') is not None:
+                line += f", ready {entry['boot_to_ready']:.0f}s after launch"
+            print(line)
+        for mode, summary in report['modes'].items():
+            print(f"  • {mode} image: first /health {summary['avg_boot_to_first_health']:.0f}s after launch on average "
+                  f"(min {summary['min_boot_to_first_health']:.0f}s, max {summary['max_boot_to_first_health']:.0f}s, "
+                  f"{summary['instances']} instances)")
+
+def summarize_boot_times(entries):
+    """Boot to first /health answer per image mode, over the instances that answered"""
+    by_mode = {}
+    for entry in entries:
+        if entry.get('boot_to_first_health') is not None:
+            by_mode.setdefault(entry['image_mode'], []).append(entry['boot_to_first_health'])
+    return {
+        mode: {
+            'instances': len(times),
+            'avg_boot_to_first_health': sum(times) / len(times),
+            'min_boot_to_first_health': min(times),
+            'max_boot_to_first_health': max(times)
+        }
+        for mode, times in sorted(by_mode.items())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Wait until every instance is healthy behind the ALB and answers /health')
+    parser.add_argument('--timeout', type=float, default=900, help='Give up after this many seconds')
+    parser.add_argument('--max-interval', type=float, default=20, help='Longest pause between checks')
+    parser.add_argument('--report', default='readiness_report.json')
+    parser.add_argument('--boot-times', default=BOOT_TIMES_FILE, help='History of boot times to append to')
+    args = parser.parse_args()
+
+    gate = ReadinessGate(timeout=args.timeout, max_interval=args.max_interval)
+    start_time = time.monotonic()
+    elapsed = error = None
+    try:
+        gate.load_instances()
+        elapsed = gate.wait(gate.get_target_groups())
+    except Exception as e:
+        error = str(e)
+        print(f"Error: {e}")
+        raise
+    finally:
+        report = gate.report(start_time, elapsed, error)
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        gate.save_boot_times(report, args.boot_times)
+        gate.print_report(report)
+
+if __name__ == "__main__":
+    main()
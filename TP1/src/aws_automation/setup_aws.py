@@ -1,18 +1,30 @@
+import argparse
+import base64
 import boto3
+import hashlib
+import io
 import json
 import sys
 import os
+import tarfile
 from datetime import datetime
 
 # Add src directory to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from constants import USER_DATA_SCRIPT, PROJECT_NAME, DEFAULT_AMI_ID, CLUSTER_CONFIGS
+from constants import (USER_DATA_SCRIPT, PREBAKED_USER_DATA_SCRIPT, IMAGE_BAKE_SCRIPT, DEPENDENCY_INSTALL_SCRIPT,
+                       PROJECT_NAME, DEFAULT_AMI_ID, CLUSTER_CONFIGS, SERVER_PROFILE)
+from aws_automation.inventory import Inventory
+
+APP_DIR = os.path.join(os.path.dirname(__file__), '..', 'app')
 
 class AWSManager:
-    def __init__(self):
+    def __init__(self, prebaked=False):
         self.ec2_client = boto3.client('ec2')
         self.project_name = PROJECT_NAME
-        print(f"AWS setup initialized for {self.project_name}")
+        self.inventory = Inventory(ec2_client=self.ec2_client)
+        # Prebaked instances boot from an image with the dependencies installed and only start the app
+        self.prebaked = prebaked
+        print(f"AWS setup initialized for {self.project_name}" + (" (prebaked image)" if prebaked else ""))
 
     def get_default_vpc(self):
         vpcs = self.ec2_client.describe_vpcs(
@@ -22,11 +34,9 @@ class AWSManager:
 
     def create_security_group(self):
         try:
-            groups = self.ec2_client.describe_security_groups(
-                Filters=[{'Name': 'group-name', 'Values': [f'{self.project_name}-SG']}]
-            )
-            if groups['SecurityGroups']:
-                return groups['SecurityGroups'][0]['GroupId']
+            existing_id = self.inventory.get_security_group()
+            if existing_id:
+                return existing_id
             
             response = self.ec2_client.create_security_group(
                 GroupName=f'{self.project_name}-SG',
@@ -52,6 +62,7 @@ class AWSManager:
                 }]
             )
             
+            self.inventory.set_security_group(sg_id)
             print(f"Created security group: {sg_id}")
             return sg_id
             
@@ -59,58 +70,117 @@ class AWSManager:
             print(f"Error creating security group: {e}")
             raise
 
+    def build_app_bundle(self):
+        """Pack the app sources into a base64 tar.gz that fits in the user data"""
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+            for file_name in sorted(os.listdir(APP_DIR)):
+                if file_name.endswith('.py'):
+                    tar.add(os.path.join(APP_DIR, file_name), arcname=file_name)
+        return base64.encodebytes(buffer.getvalue()).decode().strip()
+
     def get_user_data_script(self, cluster_name):
         """Generate cluster-specific user data script"""
-        return USER_DATA_SCRIPT.format(cluster_name=cluster_name)
+        template = PREBAKED_USER_DATA_SCRIPT if self.prebaked else USER_DATA_SCRIPT
+        return template.format(
+            cluster_name=cluster_name,
+            app_bundle=self.build_app_bundle(),
+            server_profile=SERVER_PROFILE
+        )
 
-    def launch_instances(self, ami_id, security_group_id):
-        all_instances = []
-        
-        print("Launching 4 t2.large instances for cluster1...")
-        response1 = self.ec2_client.run_instances(
-            ImageId=ami_id,
-            MinCount=4,
-            MaxCount=4,
-            InstanceType='t2.large',
+    def get_image_name(self, base_ami_id):
+        """Image name tied to the base AMI and the install script, so changing either bakes a new image"""
+        digest = hashlib.sha1(f"{base_ami_id}\n{DEPENDENCY_INSTALL_SCRIPT}".encode()).hexdigest()[:12]
+        return f"{self.project_name}-app-{digest}"
+
+    def find_image(self, name):
+        images = self.ec2_client.describe_images(
+            Owners=['self'],
+            Filters=[{'Name': 'name', 'Values': [name]}, {'Name': 'state', 'Values': ['available', 'pending']}]
+        )['Images']
+        return images[0]['ImageId'] if images else None
+
+    def bake_image(self, base_ami_id, security_group_id, instance_type='t2.micro'):
+        """Install the dependencies on a builder instance, which powers itself off, and image it"""
+        name = self.get_image_name(base_ami_id)
+        print(f"Baking image {name} from {base_ami_id}...")
+        response = self.ec2_client.run_instances(
+            ImageId=base_ami_id,
+            MinCount=1,
+            MaxCount=1,
+            InstanceType=instance_type,
             KeyName='key',
             SecurityGroupIds=[security_group_id],
-            UserData=self.get_user_data_script('cluster1'),
+            UserData=IMAGE_BAKE_SCRIPT,
             TagSpecifications=[{
                 'ResourceType': 'instance',
                 'Tags': [
-                    {'Key': 'Name', 'Value': f'{self.project_name}-Cluster1'},
-                    {'Key': 'Project', 'Value': self.project_name},
-                    {'Key': 'Cluster', 'Value': 'cluster1'}
+                    {'Key': 'Name', 'Value': f"{self.project_name}-ImageBuilder"},
+                    {'Key': 'Project', 'Value': self.project_name}
                 ]
             }]
         )
-        
-        cluster1_ids = [instance['InstanceId'] for instance in response1['Instances']]
-        all_instances.extend(cluster1_ids)
-        
-        print("Launching 4 t2.micro instances for cluster2...")
-        response2 = self.ec2_client.run_instances(
+        builder_id = response['Instances'][0]['InstanceId']
+        try:
+            # The bake script stops on the first failed command, so a builder that never stops has a broken install
+            self.ec2_client.get_waiter('instance_stopped').wait(
+                InstanceIds=[builder_id], WaiterConfig={'Delay': 15, 'MaxAttempts': 80}
+            )
+            image_id = self.ec2_client.create_image(
+                InstanceId=builder_id,
+                Name=name,
+                Description=f"{self.project_name} app dependencies on {base_ami_id}",
+                TagSpecifications=[{'ResourceType': 'image', 'Tags': [{'Key': 'Project', 'Value': self.project_name}]}]
+            )['ImageId']
+            self.ec2_client.get_waiter('image_available').wait(
+                ImageIds=[image_id], WaiterConfig={'Delay': 15, 'MaxAttempts': 80}
+            )
+        finally:
+            self.ec2_client.terminate_instances(InstanceIds=[builder_id])
+        print(f"Baked image {image_id}")
+        return image_id
+
+    def get_prebaked_image(self, base_ami_id, security_group_id):
+        """Id of the image baked from base_ami_id, baking it on first use"""
+        name = self.get_image_name(base_ami_id)
+        image_id = self.find_image(name)
+        if image_id is None:
+            return self.bake_image(base_ami_id, security_group_id)
+        self.ec2_client.get_waiter('image_available').wait(ImageIds=[image_id], WaiterConfig={'Delay': 15, 'MaxAttempts': 80})
+        print(f"Reusing image {name}: {image_id}")
+        return image_id
+
+    def launch_cluster(self, cluster, ami_id, security_group_id):
+        """Launch every instance of one cluster in CLUSTER_CONFIGS and return their ids"""
+        config = CLUSTER_CONFIGS[cluster]
+        print(f"Launching {config['count']} {config['instance_type']} instances for {cluster}...")
+        response = self.ec2_client.run_instances(
             ImageId=ami_id,
-            MinCount=4,
-            MaxCount=4,
-            InstanceType='t2.micro',
+            MinCount=config['count'],
+            MaxCount=config['count'],
+            InstanceType=config['instance_type'],
             KeyName='key',
             SecurityGroupIds=[security_group_id],
-            UserData=self.get_user_data_script('cluster2'),
+            UserData=self.get_user_data_script(cluster),
             TagSpecifications=[{
                 'ResourceType': 'instance',
                 'Tags': [
-                    {'Key': 'Name', 'Value': f'{self.project_name}-Cluster2'},
+                    {'Key': 'Name', 'Value': f"{self.project_name}-{config['name']}"},
                     {'Key': 'Project', 'Value': self.project_name},
-                    {'Key': 'Cluster', 'Value': 'cluster2'}
+                    {'Key': 'Cluster', 'Value': cluster},
+                    {'Key': 'ImageMode', 'Value': 'prebaked' if self.prebaked else 'standard'}
                 ]
             }]
         )
         
-        cluster2_ids = [instance['InstanceId'] for instance in response2['Instances']]
-        all_instances.extend(cluster2_ids)
-        
-        print(f"Launched instances: Cluster1={cluster1_ids}, Cluster2={cluster2_ids}")
+        instance_ids = [instance['InstanceId'] for instance in response['Instances']]
+        print(f"Launched {cluster} instances: {instance_ids}")
+        return instance_ids
+
+    def launch_instances(self, ami_id, security_group_id):
+        all_instances = []
+        for cluster in CLUSTER_CONFIGS:
+            all_instances.extend(self.launch_cluster(cluster, ami_id, security_group_id))
         return all_instances
 
     def wait_for_instances(self, instance_ids):
@@ -120,33 +190,9 @@ class AWSManager:
         print("All instances are running!")
 
     def get_instance_details(self, instance_ids):
-        response = self.ec2_client.describe_instances(InstanceIds=instance_ids)
-        cluster1_instances = []
-        cluster2_instances = []
-        
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_data = {
-                    'InstanceId': instance['InstanceId'],
-                    'PublicDnsName': instance.get('PublicDnsName', ''),
-                    'PublicIpAddress': instance.get('PublicIpAddress', ''),
-                    'State': instance['State']['Name'],
-                    'InstanceType': instance['InstanceType']
-                }
-                
-                cluster = 'unknown'
-                for tag in instance.get('Tags', []):
-                    if tag['Key'] == 'Cluster':
-                        cluster = tag['Value']
-                        break
-                
-                instance_data['Cluster'] = cluster
-                
-                if cluster == 'cluster1':
-                    cluster1_instances.append(instance_data)
-                else:
-                    cluster2_instances.append(instance_data)
-        
+        instances = self.inventory.describe_instances(instance_ids)
+        cluster1_instances = [instance for instance in instances if instance['Cluster'] == 'cluster1']
+        cluster2_instances = [instance for instance in instances if instance['Cluster'] != 'cluster1']
         return cluster1_instances, cluster2_instances
 
     def save_deployment_info(self, cluster1_instances, cluster2_instances):
@@ -182,13 +228,18 @@ class AWSManager:
                 print(f"  Cluster2-{i}: http://{instance['PublicDnsName']}:8000")
 
 def main():
+    parser = argparse.ArgumentParser(description='Create the security group and launch both clusters')
+    parser.add_argument('--prebaked', action='store_true', help='Boot from an image with the dependencies pre-installed')
+    args = parser.parse_args()
+
     try:
         print("Starting AWS Infrastructure Setup")
         
-        manager = AWSManager()
+        manager = AWSManager(prebaked=args.prebaked)
         
         security_group_id = manager.create_security_group()
-        instance_ids = manager.launch_instances(DEFAULT_AMI_ID, security_group_id)
+        ami_id = manager.get_prebaked_image(DEFAULT_AMI_ID, security_group_id) if args.prebaked else DEFAULT_AMI_ID
+        instance_ids = manager.launch_instances(ami_id, security_group_id)
         manager.wait_for_instances(instance_ids)
         cluster1_instances, cluster2_instances = manager.get_instance_details(instance_ids)
         manager.save_deployment_info(cluster1_instances, cluster2_instances)
@@ -1,6 +1,29 @@
+import argparse
 import boto3
 import time
 import os
+import sys
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from constants import CLUSTER_CONFIGS
+from aws_automation.inventory import Inventory
+from pipeline import Pipeline
+
+def retry_with_backoff(function, retry_codes, timeout=300, initial_delay=2, max_delay=20):
+    """Call function until it stops failing with one of retry_codes, doubling the pause up to max_delay"""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        try:
+            return function()
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code not in retry_codes or time.monotonic() + delay > deadline:
+                raise
+            print(f"{code}, retrying in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
 
 class AWSTeardown:
     def __init__(self):
@@ -8,103 +31,120 @@ class AWSTeardown:
         self.ec2_client = boto3.client('ec2')
         self.elbv2_client = boto3.client('elbv2')
         self.project_name = 'LOG8415E-TP1'
+        # Nothing cached is trusted here, every resource is looked up again before it is deleted
+        self.inventory = Inventory(max_age=0, ec2_client=self.ec2_client, elbv2_client=self.elbv2_client)
+        # Step name -> error of every deletion that failed; the other steps carry on without it
+        self.errors = {}
         print(f"AWS Teardown initialized for {self.project_name}")
 
     def find_project_instances(self):
         """Find project EC2 instances"""
-        response = self.ec2_client.describe_instances(
-            Filters=[
-                {'Name': 'tag:Project', 'Values': [self.project_name]},
-                {'Name': 'instance-state-name', 'Values': ['running', 'stopped', 'pending']}
-            ]
-        )
-        
-        instance_ids = []
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_ids.append(instance['InstanceId'])
+        instances = self.inventory.get_instances(states=('running', 'stopped', 'pending'), refresh=True)
+        instance_ids = [instance['InstanceId'] for instance in instances]
         
         print(f"Found {len(instance_ids)} instances to terminate")
         return instance_ids
 
     def terminate_instances(self, instance_ids):
-        """Terminate EC2 instances"""
+        """Request termination; what depends on the instances waits for the resource it actually needs released"""
         if not instance_ids:
             print("No instances to terminate")
             return
         
         print(f"Terminating {len(instance_ids)} instances...")
-        self.ec2_client.terminate_instances(InstanceIds=instance_ids)
-        
-        print("Waiting for instances to terminate...")
-        waiter = self.ec2_client.get_waiter('instance_terminated')
-        waiter.wait(InstanceIds=instance_ids)
-        print("All instances terminated")
+        try:
+            self.ec2_client.terminate_instances(InstanceIds=instance_ids)
+        except Exception as e:
+            print(f"Instance termination error: {e}")
+            self.errors['terminate_instances'] = str(e)
+
+    def wait_for_termination(self, instance_ids):
+        if not instance_ids or 'terminate_instances' in self.errors:
+            return
+        try:
+            waiter = self.ec2_client.get_waiter('instance_terminated')
+            waiter.wait(InstanceIds=instance_ids, WaiterConfig={'Delay': 5, 'MaxAttempts': 120})
+            print("All instances terminated")
+        except Exception as e:
+            print(f"Instances not terminated: {e}")
+            self.errors['instances_terminated'] = str(e)
 
     def delete_load_balancer(self):
-        """Delete ALB and target groups"""
+        """Delete the ALB, which removes its listeners and so frees the target groups"""
         try:
-            albs = self.elbv2_client.describe_load_balancers(
-                Names=[f'{self.project_name}-ALB']
-            )
+            alb = self.inventory.get_load_balancer()
             
-            if albs['LoadBalancers']:
-                alb_arn = albs['LoadBalancers'][0]['LoadBalancerArn']
+            if alb:
+                alb_arn = alb['LoadBalancerArn']
                 print(f"Deleting ALB: {alb_arn}")
-                
                 self.elbv2_client.delete_load_balancer(LoadBalancerArn=alb_arn)
-                
-                print("Waiting for ALB deletion...")
-                waiter = self.elbv2_client.get_waiter('load_balancers_deleted')
-                waiter.wait(LoadBalancerArns=[alb_arn])
                 print("ALB deleted")
             
         except Exception as e:
-            print(f"ALB deletion error (may not exist): {e}")
+            print(f"ALB deletion error: {e}")
+            self.errors['delete_load_balancer'] = str(e)
 
-    def delete_target_groups(self):
-        target_group_names = [
-            f'{self.project_name}-Cluster1-TG',
-            f'{self.project_name}-Cluster2-TG'
-        ]
-        
-        for tg_name in target_group_names:
-            try:
-                tgs = self.elbv2_client.describe_target_groups(
-                    Names=[tg_name]
-                )
+    def delete_target_group(self, cluster, tg_arn):
+        if tg_arn is None:
+            print(f"No {cluster} target group")
+            return
+        try:
+            print(f"Deleting {cluster} target group")
+            # A listener being removed with its ALB can still hold the target group for a moment
+            retry_with_backoff(lambda: self.elbv2_client.delete_target_group(TargetGroupArn=tg_arn), ('ResourceInUse',))
+            print(f"Target group {cluster} deleted")
                 
-                for tg in tgs['TargetGroups']:
-                    tg_arn = tg['TargetGroupArn']
-                    print(f"Deleting target group: {tg_name}")
-                    self.elbv2_client.delete_target_group(TargetGroupArn=tg_arn)
-                    print(f"Target group {tg_name} deleted")
-                    
-            except Exception as e:
-                print(f"Target group {tg_name} deletion error (may not exist): {e}")
+        except Exception as e:
+            print(f"Target group {cluster} deletion error: {e}")
+            self.errors[f'delete_target_group_{cluster}'] = str(e)
+
+    def wait_for_security_group_release(self, sg_id, timeout=600, max_interval=15):
+        """Poll until no network interface uses the security group; instances and the ALB release theirs as they go"""
+        deadline = time.monotonic() + timeout
+        interval = 2
+        paginator = self.ec2_client.get_paginator('describe_network_interfaces')
+        while True:
+            interfaces = [
+                interface for page in paginator.paginate(Filters=[{'Name': 'group-id', 'Values': [sg_id]}])
+                for interface in page['NetworkInterfaces']
+            ]
+            if not interfaces:
+                return
+            if time.monotonic() + interval > deadline:
+                raise TimeoutError(f"{len(interfaces)} network interfaces still use {sg_id} after {timeout}s: " +
+                                   ", ".join(interface['NetworkInterfaceId'] for interface in interfaces))
+            print(f"{len(interfaces)} network interfaces still use {sg_id}, checking again in {interval}s")
+            time.sleep(interval)
+            interval = min(interval * 2, max_interval)
 
-    def delete_security_group(self):
+    def delete_security_group(self, sg_id):
+        if not sg_id:
+            print("No security group")
+            return
         try:
-            groups = self.ec2_client.describe_security_groups(
-                Filters=[{'Name': 'group-name', 'Values': [f'{self.project_name}-SG']}]
-            )
-            
-            if groups['SecurityGroups']:
-                sg_id = groups['SecurityGroups'][0]['GroupId']
-                print(f"Deleting security group: {sg_id}")
-                self.ec2_client.delete_security_group(GroupId=sg_id)
-                print("Security group deleted")
+            self.wait_for_security_group_release(sg_id)
+            print(f"Deleting security group: {sg_id}")
+            # Interfaces can take a few more seconds to stop counting as dependencies once they are gone
+            retry_with_backoff(lambda: self.ec2_client.delete_security_group(GroupId=sg_id), ('DependencyViolation',), timeout=120)
+            print("Security group deleted")
                 
         except Exception as e:
-            print(f"Security group deletion error (may be in use): {e}")
+            print(f"Security group deletion error: {e}")
+            self.errors['delete_security_group'] = str(e)
 
     def cleanup_files(self):
         files_to_remove = [
             'deployment_info.json',
+            'provision_timeline.json',
+            'readiness_report.json',
             'alb_info.json',
             'benchmark_results.json',
             'benchmark_results.csv',
-            'cloudwatch_metrics.json'
+            'benchmark_steps.csv',
+            'alb_proxy_stats.json',
+            'cloudwatch_metrics.json',
+            'cloudwatch_cache.db',
+            'inventory.json'
         ]
         
         for file in files_to_remove:
@@ -115,34 +155,61 @@ class AWSTeardown:
             except Exception as e:
                 print(f"Could not remove {file}: {e}")
 
+def build_teardown(teardown):
+    """Deletion steps with only their real dependencies: target groups wait for the ALB that uses them,
+    the security group for every resource with a network interface in it"""
+    pipeline = Pipeline()
+    pipeline.add('find_instances', teardown.find_project_instances)
+    pipeline.add('terminate_instances', teardown.terminate_instances, ['find_instances'])
+    pipeline.add('instances_terminated', lambda instance_ids, terminated: teardown.wait_for_termination(instance_ids),
+                 ['find_instances', 'terminate_instances'])
+    pipeline.add('delete_load_balancer', teardown.delete_load_balancer)
+
+    pipeline.add('find_target_groups', teardown.inventory.get_target_groups)
+    for cluster in CLUSTER_CONFIGS:
+        pipeline.add(f'delete_target_group_{cluster}',
+                     lambda target_groups, load_balancer, cluster=cluster: teardown.delete_target_group(cluster, target_groups.get(cluster)),
+                     ['find_target_groups', 'delete_load_balancer'])
+
+    pipeline.add('find_security_group', teardown.inventory.get_security_group)
+    pipeline.add('delete_security_group', lambda sg_id, instances, load_balancer: teardown.delete_security_group(sg_id),
+                 ['find_security_group', 'terminate_instances', 'delete_load_balancer'])
+    return pipeline
+
 def main():
+    parser = argparse.ArgumentParser(description='Delete every AWS resource of the project, independent ones in parallel')
+    parser.add_argument('--timeline', default='teardown_timeline.json', help='Where to save the per-step timeline')
+    args = parser.parse_args()
+
+    pipeline = None
     try:
         print("Starting AWS Infrastructure Teardown")
         print("=" * 50)
         
         teardown = AWSTeardown()
         
-        instance_ids = teardown.find_project_instances()
-        teardown.terminate_instances(instance_ids)
-        
-        teardown.delete_load_balancer()
-        
-        teardown.delete_target_groups()
-        
-        print("Waiting 30 seconds before deleting security group...")
-        time.sleep(30)
-        teardown.delete_security_group()
+        pipeline = build_teardown(teardown)
+        pipeline.run()
         
         teardown.cleanup_files()
         
         print("\n" + "=" * 50)
-        print("TEARDOWN COMPLETED SUCCESSFULLY!")
-        print("All AWS resources have been removed.")
+        if teardown.errors:
+            print(f"TEARDOWN FINISHED WITH {len(teardown.errors)} ERRORS:")
+            for step, error in teardown.errors.items():
+                print(f"  • {step}: {error}")
+        else:
+            print("TEARDOWN COMPLETED SUCCESSFULLY!")
+            print("All AWS resources have been removed.")
         print("=" * 50)
         
     except Exception as e:
         print(f"Error during teardown: {e}")
         raise
+    finally:
+        if pipeline is not None and pipeline.timeline:
+            pipeline.print_timeline('TEARDOWN TIMELINE')
+            pipeline.save_timeline(args.timeline)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from local_cluster.synthetic_servers import start_server_process
+from run_benchmark import BenchmarkRunner
+
+async def run_with_processes(runner, url, num_requests, concurrency):
+    async with runner.create_session() as session:
+        return await runner.benchmark_endpoint(session, url, num_requests, f"{runner.processes} processes", concurrency)
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure load generator throughput against a null server as client processes are added')
+    parser.add_argument('--port', type=int, default=8310)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--server-processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+
+    servers = [start_server_process(args.port) for _ in range(args.server_processes)]
+    url = f"http://127.0.0.1:{args.port}/"
+
+    try:
+        results = {}
+        for processes in args.processes:
+            runner = BenchmarkRunner(processes=processes)
+            results[processes] = asyncio.run(run_with_processes(runner, url, args.requests, args.concurrency))
+    finally:
+        for server in servers:
+            server.terminate()
+
+    print("\n" + "="*60)
+    print("CLIENT SCALING AGAINST A NULL SERVER")
+    print("="*60)
+    baseline = results[args.processes[0]]['throughput'] or 1
+    for processes, result in results.items():
+        print(f"  • {processes} processes: {result['throughput']:.2f} req/s "
+              f"(x{result['throughput'] / baseline:.2f}), p99 {result['p99_response_time']:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from local_cluster.synthetic_servers import start_server_process
+from run_benchmark import BenchmarkRunner
+
+async def run_mode(runner, url, num_requests, concurrency):
+    async with runner.create_session() as session:
+        return await runner.benchmark_endpoint(session, url, num_requests, runner.mode, concurrency)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare closed and open loop latency against a server with injected stalls')
+    parser.add_argument('--port', type=int, default=8300)
+    parser.add_argument('--rate', type=float, default=500, help='Open-loop arrival rate in req/s')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of open-loop load')
+    parser.add_argument('--stall-every', type=float, default=2.0)
+    parser.add_argument('--stall-ms', type=float, default=500)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--closed-requests', type=int, default=20000,
+                        help='Closed-loop request count, large enough to span several stalls')
+    parser.add_argument('--warmup', type=float, default=1.0, help='Seconds of each run left out of the results')
+    args = parser.parse_args()
+    if args.duration <= args.warmup:
+        parser.error(f"--duration {args.duration:g}s leaves nothing after the {args.warmup:g}s warm-up")
+
+    process = start_server_process(args.port, args.stall_every, args.stall_ms)
+    url = f"http://127.0.0.1:{args.port}/"
+    num_requests = {'closed': args.closed_requests, 'open': int(args.rate * args.duration)}
+
+    try:
+        results = {}
+        for mode in ('closed', 'open'):
+            runner = BenchmarkRunner(mode=mode, rate=args.rate, warmup=args.warmup)
+            results[mode] = asyncio.run(run_mode(runner, url, num_requests[mode], args.concurrency))
+    finally:
+        process.terminate()
+
+    # Percentiles of a run that ended within the warm-up would be empty, not comparable
+    for mode, result in results.items():
+        if not result['successful_requests']:
+            parser.error(f"{result['load']} recorded no samples after the {args.warmup:g}s warm-up "
+                         f"({result['warmup_requests']} warm-up requests), raise --closed-requests/--duration or lower --warmup")
+
+    print("\n" + "="*60)
+    print(f"STALLS OF {args.stall_ms:g}ms EVERY {args.stall_every:g}s")
+    print("="*60)
+    for mode, result in results.items():
+        print(f"  • {result['load']}: avg {result['avg_response_time']:.2f}ms, p50 {result['p50_response_time']:.2f}ms, "
+              f"p99 {result['p99_response_time']:.2f}ms, max {result['max_response_time']:.2f}ms, {result['throughput']:.2f} req/s "
+              f"over {result['total_time']:.1f}s")
+
+if __name__ == "__main__":
+    main()
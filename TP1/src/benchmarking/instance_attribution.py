@@ -0,0 +1,65 @@
+from latency_histogram import LatencyHistogram, REPORTED_PERCENTILES
+
+def extract_field(body, name):
+    """Value of a top-level string field in a JSON body, found by search instead of a full parse"""
+    key = body.find(b'"' + name + b'"')
+    if key < 0:
+        return None
+    colon = body.find(b':', key + len(name) + 2)
+    start = body.find(b'"', colon + 1)
+    end = body.find(b'"', start + 1)
+    if colon < 0 or start < 0 or end < 0:
+        return None
+    return body[start + 1:end].decode('utf-8', 'replace')
+
+def record_instance(instances, body, status, latency_ms):
+    """Charge one response to the instance named in its body (every app response carries instance_id and cluster)"""
+    instance_id = extract_field(body, b'instance_id') or 'unknown'
+    instance = instances.get(instance_id)
+    if instance is None:
+        instance = instances[instance_id] = {
+            'cluster': extract_field(body, b'cluster') or 'unknown',
+            'histogram': LatencyHistogram(),
+            'errors': 0
+        }
+    instance['histogram'].record(latency_ms)
+    if status >= 400:
+        instance['errors'] += 1
+
+def jain_index(counts):
+    """Jain's fairness index: 1 when every instance served the same number of requests, 1/n when one served all"""
+    total = sum(counts)
+    squares = sum(count * count for count in counts)
+    return total * total / (len(counts) * squares) if squares else 0
+
+def summarize_instances(instances, tail_threshold_ms):
+    """Per-instance requests, share, latency and share of the target's tail beyond tail_threshold_ms"""
+    total = sum(instance['histogram'].count for instance in instances.values())
+    tail_counts = {instance_id: instance['histogram'].count_above(tail_threshold_ms) for instance_id, instance in instances.items()}
+    tail_total = sum(tail_counts.values())
+
+    summary = {}
+    for instance_id, instance in sorted(instances.items()):
+        histogram = instance['histogram']
+        latency = histogram.summary()
+        entry = {
+            'cluster': instance['cluster'],
+            'requests': histogram.count,
+            'errors': instance['errors'],
+            'share': histogram.count / total if total else 0,
+            'tail_share': tail_counts[instance_id] / tail_total if tail_total else 0,
+            'avg_response_time': latency['avg'],
+            'histogram': histogram.to_dict()
+        }
+        for name in REPORTED_PERCENTILES:
+            entry[f'{name}_response_time'] = latency[name]
+        summary[instance_id] = entry
+
+    counts = [entry['requests'] for entry in summary.values()]
+    fairness = {
+        'instances': len(counts),
+        'jain_index': jain_index(counts),
+        'min_share': min(entry['share'] for entry in summary.values()) if summary else 0,
+        'max_share': max(entry['share'] for entry in summary.values()) if summary else 0
+    }
+    return summary, fairness
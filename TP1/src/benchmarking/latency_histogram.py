@@ -0,0 +1,112 @@
+import math
+
+# Log-linear buckets in the spirit of HdrHistogram: values (microseconds) below SUB_BUCKETS get
+# their own bucket, above that every power of two is split into SUB_BUCKETS / 2 linear buckets.
+# With 256 sub-buckets the relative error stays under 0.8%, and 3328 buckets cover up to ~1h.
+SUB_BUCKET_BITS = 8
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS // 2
+MAX_TRACKABLE_US = (1 << 32) - 1
+BUCKET_COUNT = SUB_BUCKETS + (32 - SUB_BUCKET_BITS) * HALF_SUB_BUCKETS
+
+REPORTED_PERCENTILES = {'p50': 50, 'p90': 90, 'p99': 99, 'p999': 99.9}
+
+def bucket_index(value_us):
+    if value_us < SUB_BUCKETS:
+        return value_us
+    shift = value_us.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (value_us >> shift) - HALF_SUB_BUCKETS
+
+def bucket_bounds(index):
+    """Lowest and highest microsecond value that fall into a bucket"""
+    if index < SUB_BUCKETS:
+        return index, index
+    offset = index - SUB_BUCKETS
+    shift = offset // HALF_SUB_BUCKETS + 1
+    mantissa = offset % HALF_SUB_BUCKETS + HALF_SUB_BUCKETS
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+class LatencyHistogram:
+    """Streaming, mergeable latency histogram with constant memory, recording milliseconds"""
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def record(self, latency_ms):
+        value_us = min(max(int(latency_ms * 1000), 0), MAX_TRACKABLE_US)
+        self.counts[bucket_index(value_us)] += 1
+        self.count += 1
+        self.total += latency_ms
+        if self.min is None or latency_ms < self.min:
+            self.min = latency_ms
+        if latency_ms > self.max:
+            self.max = latency_ms
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+        return self
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, percentile):
+        """Value at the given percentile (0-100) in milliseconds, accurate to the bucket width"""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(percentile * self.count / 100 - 1e-9))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                low, high = bucket_bounds(index)
+                value_ms = (low + high) / 2 / 1000
+                return min(max(value_ms, self.min), self.max)
+        return self.max
+
+    def count_above(self, value_ms):
+        """Number of recorded values in buckets entirely above value_ms"""
+        first = bucket_index(min(max(int(value_ms * 1000), 0), MAX_TRACKABLE_US)) + 1
+        return sum(self.counts[first:])
+
+    def summary(self):
+        summary = {
+            'count': self.count,
+            'avg': self.mean(),
+            'min': self.min or 0,
+            'max': self.max
+        }
+        for name, percentile in REPORTED_PERCENTILES.items():
+            summary[name] = self.percentile(percentile)
+        return summary
+
+    def to_dict(self):
+        """Compact form (non-empty buckets only) for JSON files and inter-process transfer"""
+        return {
+            'buckets': {str(index): count for index, count in enumerate(self.counts) if count},
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for index, count in data['buckets'].items():
+            histogram.counts[int(index)] = count
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from local_cluster.synthetic_servers import start_server_process
+from run_benchmark import BenchmarkRunner
+
+async def run_profile(runner, url):
+    async with runner.create_session() as session:
+        return await runner.run_load_profile(session, url, 0, "Synthetic server")
+
+def main():
+    parser = argparse.ArgumentParser(description='Run an open-loop step profile without --rate against a local server')
+    parser.add_argument('--port', type=int, default=8350)
+    parser.add_argument('--levels', type=float, nargs='+', default=[20, 40, 80])
+    parser.add_argument('--step-duration', type=float, default=1.0)
+    args = parser.parse_args()
+
+    # Without levels an open loop still needs its rate
+    try:
+        BenchmarkRunner(mode='open', verbose=False)
+    except ValueError as e:
+        print(f"Open loop without rate or levels refused: {e}")
+    else:
+        raise AssertionError("Open loop without rate or levels was accepted")
+
+    process = start_server_process(args.port)
+    try:
+        # The levels are the rates, as with `--mode open --load-profile step --levels ...` and no --rate
+        runner = BenchmarkRunner(mode='open', load_levels=args.levels, step_duration=args.step_duration)
+        result = asyncio.run(run_profile(runner, f"http://127.0.0.1:{args.port}/"))
+    finally:
+        process.terminate()
+
+    steps = result['steps']
+    assert [step['level'] for step in steps] == args.levels, "not every level was run"
+    assert all(step['success_rate'] == 100 for step in steps), "requests failed"
+
+    print("\n" + "="*60)
+    print("OPEN-LOOP STEP PROFILE WITHOUT --rate")
+    print("="*60)
+    for step in steps:
+        print(f"  • {step['level']:g} req/s offered: {step['throughput']:.2f} req/s, p99 {step['p99_response_time']:.2f}ms")
+    print(f"  • Knee: {result['knee']['reason']}")
+
+if __name__ == "__main__":
+    main()
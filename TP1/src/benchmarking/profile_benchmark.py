@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import aiohttp
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from app.server import PROFILES
+from local_cluster.local_app import start_app, stop_app, wait_until_healthy
+from run_benchmark import BenchmarkRunner
+
+async def benchmark_profile(runner, profile, url, num_requests, concurrency):
+    timeout = aiohttp.ClientTimeout(total=30)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        # Warm up connections and caches before measuring
+        await runner.benchmark_endpoint(session, url, concurrency, "Warm-up", concurrency)
+        return await runner.benchmark_endpoint(session, url, num_requests, f"Profile {profile}", concurrency)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare app server profiles on localhost')
+    parser.add_argument('--profiles', nargs='+', default=sorted(PROFILES), choices=sorted(PROFILES))
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--port', type=int, default=8100)
+    args = parser.parse_args()
+
+    runner = BenchmarkRunner()
+    results = {}
+
+    for offset, profile in enumerate(args.profiles):
+        port = args.port + offset
+        url = f"http://127.0.0.1:{port}/cluster1"
+        print(f"\nProfile '{profile}'")
+        process = start_app(port, profile)
+        try:
+            if not wait_until_healthy(f"http://127.0.0.1:{port}"):
+                print(f"  App did not start with profile '{profile}'")
+                continue
+            results[profile] = asyncio.run(benchmark_profile(runner, profile, url, args.requests, args.concurrency))
+        finally:
+            stop_app(process)
+
+    print("\n" + "="*60)
+    print("SERVER PROFILE COMPARISON")
+    print("="*60)
+    for profile, result in results.items():
+        print(f"  • {profile}: {result['throughput']:.2f} req/s, avg {result['avg_response_time']:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import time
+import aiohttp
+from latency_histogram import LatencyHistogram
+
+# Client-side phases of a request, in order; together they add up to the request's latency.
+# dns and connect only happen when a new connection is opened, acquire is the rest of the time
+# spent getting a connection (waiting for a free pool slot), ttfb runs from having a connection
+# to the response headers and body from the headers to the last body byte.
+PHASES = ('dns', 'connect', 'acquire', 'ttfb', 'body')
+
+class RequestTrace:
+    """Timestamps of one traced request, passed to aiohttp as trace_request_ctx"""
+
+    __slots__ = ('counters', 'start', 'dns', 'create', 'connected', 'headers')
+
+    def __init__(self, counters):
+        self.counters = counters
+        self.start = None
+        self.dns = None
+        self.create = None
+        self.connected = None
+        self.headers = None
+
+    def record(self, histograms, end):
+        """Add this request's phases (ms) to the per-phase histograms"""
+        if self.start is None or self.connected is None or self.headers is None:
+            return
+        create = self.create or 0.0
+        if self.dns is not None:
+            histograms['dns'].record(self.dns * 1000)
+        if self.create is not None:
+            histograms['connect'].record((create - (self.dns or 0.0)) * 1000)
+        histograms['acquire'].record(max(self.connected - self.start - create, 0.0) * 1000)
+        histograms['ttfb'].record((self.headers - self.connected) * 1000)
+        histograms['body'].record((end - self.headers) * 1000)
+
+def new_phase_histograms():
+    return {phase: LatencyHistogram() for phase in PHASES}
+
+def phase_trace_config():
+    """TraceConfig that fills the RequestTrace of every request sent with one"""
+    async def on_request_start(session, context, params):
+        if isinstance(context.trace_request_ctx, RequestTrace):
+            context.trace_request_ctx.start = time.perf_counter()
+
+    async def on_dns_resolvehost_start(session, context, params):
+        context.dns_start = time.perf_counter()
+
+    async def on_dns_resolvehost_end(session, context, params):
+        if isinstance(context.trace_request_ctx, RequestTrace):
+            context.trace_request_ctx.dns = time.perf_counter() - context.dns_start
+
+    async def on_connection_create_start(session, context, params):
+        context.create_start = time.perf_counter()
+
+    async def on_connection_create_end(session, context, params):
+        if isinstance(context.trace_request_ctx, RequestTrace):
+            now = time.perf_counter()
+            context.trace_request_ctx.create = now - context.create_start
+            context.trace_request_ctx.connected = now
+
+    async def on_connection_reuseconn(session, context, params):
+        if isinstance(context.trace_request_ctx, RequestTrace):
+            context.trace_request_ctx.connected = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        # Sent once the response status line and headers have been parsed, before the body is read
+        if isinstance(context.trace_request_ctx, RequestTrace):
+            context.trace_request_ctx.headers = time.perf_counter()
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from constants import LOCAL_CLUSTER_CONFIGS
+from local_cluster.alb_proxy import BALANCING_ALGORITHMS, STATS_PATH, start_proxy_process
+from local_cluster.cluster_harness import LocalCluster
+from run_benchmark import BenchmarkRunner
+
+async def run_algorithm(runner, alb, path, num_requests, concurrency):
+    async with runner.create_session() as session:
+        result = await runner.benchmark_endpoint(session, alb + path, num_requests, "ALB proxy", concurrency)
+        async with session.get(alb + STATS_PATH) as response:
+            result['targets'] = await response.json()
+        return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the local ALB proxy balancing algorithms on a local cluster')
+    parser.add_argument('--algorithms', nargs='+', choices=sorted(BALANCING_ALGORITHMS), default=sorted(BALANCING_ALGORITHMS))
+    parser.add_argument('--path', default='/', help="Path to load, '/' is split between both target groups")
+    parser.add_argument('--count', type=int, default=2, help='Instances per cluster')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--base-port', type=int, default=8700)
+    parser.add_argument('--alb-port', type=int, default=8780)
+    parser.add_argument('--jitter-ms', type=float, default=20.0,
+                        help='Random extra latency on cluster2, so that balancing decisions matter')
+    args = parser.parse_args()
+
+    cluster_configs = {name: dict(config) for name, config in LOCAL_CLUSTER_CONFIGS.items()}
+    cluster_configs['cluster2']['jitter_ms'] = args.jitter_ms
+    cluster = LocalCluster(args.count, args.base_port, 'baseline', cluster_configs)
+    runner = BenchmarkRunner()
+    alb = f"http://127.0.0.1:{args.alb_port}"
+    results = {}
+
+    try:
+        cluster.start()
+        target_groups = {
+            name: [f"http://{i['PublicDnsName']}" for i in instances] for name, instances in cluster.instances.items()
+        }
+        for algorithm in args.algorithms:
+            print(f"\nAlgorithm '{algorithm}'")
+            process = start_proxy_process(target_groups, algorithm, port=args.alb_port)
+            try:
+                results[algorithm] = asyncio.run(run_algorithm(runner, alb, args.path, args.requests, args.concurrency))
+            finally:
+                process.terminate()
+                process.join()
+    finally:
+        cluster.stop()
+
+    print("\n" + "="*60)
+    print(f"BALANCING ALGORITHM COMPARISON ({args.path})")
+    print("="*60)
+    for algorithm, result in results.items():
+        print(f"  • {algorithm}: {result['throughput']:.2f} req/s, avg {result['avg_response_time']:.2f}ms, "
+              f"p50 {result['p50_response_time']:.2f}ms, p99 {result['p99_response_time']:.2f}ms")
+        for target_group, targets in result['targets']['target_groups'].items():
+            shares = ', '.join(f"{stats['requests']}" for stats in targets.values())
+            print(f"      {target_group} requests per target: {shares}")
+
+if __name__ == "__main__":
+    main()
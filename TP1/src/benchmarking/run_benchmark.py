@@ -1,15 +1,112 @@
+import argparse
 import asyncio
 import aiohttp
 import json
+import multiprocessing
+import queue
+import random
+import re
 import time
-import statistics
-from datetime import datetime
+from datetime import datetime, timezone
+from instance_attribution import record_instance, summarize_instances
+from latency_histogram import LatencyHistogram, REPORTED_PERCENTILES
+from request_phases import PHASES, RequestTrace, new_phase_histograms, phase_trace_config
+from sample_store import SampleStore
+
+# Path appended to every target URL, see the /work and /io routes in app/main.py
+WORKLOADS = {
+    'static': '',
+    'cpu': '/work?cpu_ms=20&alloc_kb=256',
+    'cpu-heavy': '/work?cpu_ms=100&alloc_kb=4096',
+    'io': '/io?sleep_ms=50&bytes=16384'
+}
+
+# How the client reaches the targets: keep-alive connections from a pool or a new connection
+# per request (TCP handshake every time, like a first-time ALB visitor), with or without DNS caching
+CONNECTION_STRATEGIES = {
+    'pooled': {'force_close': False, 'use_dns_cache': False},
+    'pooled-cached-dns': {'force_close': False, 'use_dns_cache': True},
+    'per-request': {'force_close': True, 'use_dns_cache': False},
+    'per-request-cached-dns': {'force_close': True, 'use_dns_cache': True}
+}
+
+# Targets in different phases never run at the same time. Direct instances also serve the ALB
+# paths, so by default ALB and direct load are kept apart.
+ISOLATION_LEVELS = {
+    'none': lambda target: 'all',
+    'kind': lambda target: target['kind'],
+    'cluster': lambda target: (target['kind'], target['cluster']),
+    'target': lambda target: (target['key'], target['index'])
+}
+
+METRIC_LINE = re.compile(r'app_request_duration_seconds_(sum|count)\{route="([^"]*)",pid="([^"]*)"\} (\S+)')
+WORKERS_LINE = re.compile(r'^app_workers\{pid="[^"]*"\} (\d+)', re.M)
+
+def parse_latency_metrics(text):
+    """Parse the /metrics output of one app worker into {pid: {route: {'sum': s, 'count': n}}}"""
+    workers = {}
+    for match in METRIC_LINE.finditer(text):
+        field, route, pid, value = match.groups()
+        workers.setdefault(pid, {}).setdefault(route, {})[field] = float(value)
+    return workers
 
 class BenchmarkRunner:
-    def __init__(self):
+    def __init__(self, workload='static', mode='closed', rate=None, arrival='fixed', warmup=0.0, processes=1,
+                 connection_strategy='pooled-cached-dns', pool_limit=100, per_host_limit=0, dns_ttl=300,
+                 load_levels=None, step_requests=None, step_duration=10.0, slo_p99=None,
+                 isolation='kind', parallel=0, alb_requests=1000, instance_requests=100, sample_file=None,
+                 trace_phases=False, trace_calibration=500, verbose=True):
         """Initialize benchmark runner"""
+        # A load profile's open-loop levels are the rates, so it runs without a target rate of its own
+        if mode == 'open' and not rate and not load_levels:
+            raise ValueError("Open-loop mode needs a target rate or rate levels")
+        if connection_strategy not in CONNECTION_STRATEGIES:
+            raise ValueError(f"Unknown connection strategy '{connection_strategy}', expected one of {sorted(CONNECTION_STRATEGIES)}")
+        if isolation not in ISOLATION_LEVELS:
+            raise ValueError(f"Unknown isolation '{isolation}', expected one of {sorted(ISOLATION_LEVELS)}")
         self.results = {}
-        print("Benchmark Runner initialized")
+        self.server_metrics = {}
+        self.server_metrics_coverage = {}
+        # closed: a fixed number of requests in flight, open: requests sent at a target rate (req/s)
+        self.mode = mode
+        self.rate = rate
+        self.arrival = arrival
+        self.warmup = warmup
+        # Above 1, every target is load-tested from that many client processes
+        self.processes = processes
+        # pool_limit / per_host_limit cap open connections in total / per target (0 means unlimited)
+        self.connection_strategy = connection_strategy
+        self.pool_limit = pool_limit
+        self.per_host_limit = per_host_limit
+        self.dns_ttl = dns_ttl
+        # Load profile: concurrency (closed) or rate (open) levels, each run for step_requests
+        # requests (closed, defaults to the target budget) or step_duration seconds (open)
+        self.load_levels = load_levels or []
+        self.step_requests = step_requests
+        self.step_duration = step_duration
+        self.slo_p99 = slo_p99
+        # Targets run in phases (see ISOLATION_LEVELS), with up to `parallel` targets of a phase
+        # at once (0 runs the whole phase together, 1 is strictly sequential)
+        self.isolation = isolation
+        self.parallel = parallel
+        self.alb_requests = alb_requests
+        self.instance_requests = instance_requests
+        # With a sample file every recorded request is also kept as a raw sample and exported at the end
+        self.sample_file = sample_file
+        self.samples = SampleStore() if sample_file else None
+        # Break every request down into client-side phases (see request_phases.py); the cost of doing
+        # so is measured on trace_calibration requests before the benchmark
+        self.trace_phases = trace_phases
+        self.trace_calibration = trace_calibration
+        self.tracing_overhead = None
+        self.workload = workload
+        # A name from WORKLOADS or a raw path such as '/work?cpu_ms=5'
+        self.workload_path = WORKLOADS.get(workload, workload)
+        if verbose:
+            print(f"Benchmark Runner initialized (workload: {workload}, connections: {self.describe_connections()})")
+
+    def target_url(self, endpoint):
+        return endpoint + self.workload_path
 
     async def load_endpoints(self):
         """Load endpoints from deployment files"""
@@ -33,135 +130,513 @@ class BenchmarkRunner:
         
         return endpoints
 
-    async def benchmark_endpoint(self, session, endpoint, num_requests=100, name="Endpoint"):
+    async def benchmark_endpoint(self, session, endpoint, num_requests=100, name="Endpoint", concurrency=10, rate=None):
         """Benchmark a single endpoint"""
+        rate = rate or self.rate
         print(f"Benchmarking {name}: {endpoint}")
-        print(f"  Sending {num_requests} requests...")
+        print(f"  Sending {num_requests} requests ({self.describe_load(concurrency, rate)})...")
         
-        semaphore = asyncio.Semaphore(10)
+        # Wall-clock window of the load, so server-side metrics (CloudWatch) can be matched to it
+        start_time = datetime.now(timezone.utc)
+        if self.processes > 1:
+            histogram, counters, overall_time = await self.measure_endpoint_sharded(endpoint, num_requests, concurrency, rate, name)
+        else:
+            histogram, counters, overall_time = await self.measure_endpoint(
+                session, endpoint, num_requests, concurrency, rate, label=name
+            )
+        
+        result = self.build_result(
+            endpoint, histogram, counters, overall_time, overall_time - min(self.warmup, overall_time),
+            self.describe_load(concurrency, rate)
+        )
+        result['start_time'] = start_time.isoformat()
+        result['end_time'] = datetime.now(timezone.utc).isoformat()
+        
+        print(f"  {name} finished, success rate: {result['success_rate']:.1f}%")
+        print(f"  Avg response time: {result['avg_response_time']:.2f}ms")
+        print(f"  p50/p99/max: {result['p50_response_time']:.2f}/{result['p99_response_time']:.2f}/{result['max_response_time']:.2f}ms")
+        print(f"  Throughput: {result['throughput']:.2f} req/s")
+        print(f"  Connections: {result['connections_opened']} opened, {result['connections_reused']} reused")
+        if len(result.get('instances', {})) > 1:
+            print(f"  Spread over {result['fairness']['instances']} instances, "
+                  f"fairness {result['fairness']['jain_index']:.3f}")
+        if 'phases' in result:
+            print(f"  Phases p50/p99: {self.format_phases(result['phases'])}")
         
-        async def make_request():
-            async with semaphore:
-                start_time = time.time()
-                try:
-                    async with session.get(endpoint, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                        await response.text()
-                        response_time = (time.time() - start_time) * 1000 
-                        return {
-                            'success': True,
-                            'response_time': response_time,
-                            'status_code': response.status
-                        }
-                except Exception as e:
-                    return {
-                        'success': False,
-                        'response_time': 0,
-                        'error': str(e)
-                    }
-        
-        overall_start = time.time()
-        tasks = [make_request() for _ in range(num_requests)]
-        results = await asyncio.gather(*tasks)
-        overall_time = time.time() - overall_start
-        
-        successful = [r for r in results if r['success']]
-        failed = [r for r in results if not r['success']]
-        
-        response_times = [r['response_time'] for r in successful]
-        
-        if response_times:
-            avg_time = statistics.mean(response_times)
-            min_time = min(response_times)
-            max_time = max(response_times)
-            throughput = len(successful) / overall_time
+        return result
+
+    async def measure_endpoint(self, session, endpoint, num_requests, concurrency, rate=None, schedule_offset=0.0, label=None):
+        """Send the requests on this event loop and return (histogram, counters, elapsed seconds)"""
+        histogram = LatencyHistogram()
+        counters = {'failed': 0, 'warmup': 0, 'errors': {}, 'connections_opened': 0, 'connections_reused': 0, 'instances': {}}
+        instances = counters['instances']
+        phases = new_phase_histograms() if self.trace_phases else None
+        if phases is not None:
+            counters['phases'] = phases
+        overall_start = time.perf_counter()
+        # Requests started during the warm-up window are sent but not recorded
+        warmup_end = overall_start + self.warmup
+        samples = self.samples
+        target_id = samples.target_id(label or endpoint) if samples is not None else None
+        
+        async def make_request(intended_start=None):
+            # In open-loop mode latency starts at the scheduled send time, so requests
+            # that queue up behind a stalled server are charged for the wait
+            start_time = intended_start if intended_start is not None else time.perf_counter()
+            error = None
+            status = 0
+            body = b''
+            # The counters ride along as trace context so connection events are charged to this
+            # target even when several targets share the session
+            trace = RequestTrace(counters) if phases is not None else counters
+            try:
+                async with session.get(endpoint, timeout=aiohttp.ClientTimeout(total=10), trace_request_ctx=trace) as response:
+                    body = await response.read()
+                    status = response.status
+            except Exception as e:
+                error = type(e).__name__
+            end_time = time.perf_counter()
+            response_time = (end_time - start_time) * 1000
+            
+            if start_time < warmup_end:
+                counters['warmup'] += 1
+                return
+            if samples is not None:
+                samples.record(start_time, int(response_time * 1e6), status, target_id)
+            if error is None:
+                histogram.record(response_time)
+                record_instance(instances, body, status, response_time)
+                if phases is not None:
+                    trace.record(phases, end_time)
+            else:
+                counters['failed'] += 1
+                counters['errors'][error] = counters['errors'].get(error, 0) + 1
+        
+        if self.mode == 'open':
+            await self.run_open_loop(make_request, num_requests, overall_start + schedule_offset, rate or self.rate)
         else:
-            avg_time = min_time = max_time = throughput = 0
+            remaining = [num_requests]
+
+            async def closed_loop_worker():
+                while remaining[0] > 0:
+                    remaining[0] -= 1
+                    await make_request()
+
+            await asyncio.gather(*[closed_loop_worker() for _ in range(min(concurrency, num_requests))])
+        
+        elapsed = time.perf_counter() - overall_start
+        return histogram, counters, elapsed
+
+    async def measure_endpoint_sharded(self, endpoint, num_requests, concurrency, rate=None, label=None):
+        """Split the load across worker processes, each with its own event loop and session, and merge their histograms"""
+        shards = min(self.processes, num_requests)
+        context = multiprocessing.get_context('spawn')
+        barrier = context.Barrier(shards)
+        results_queue = context.Queue()
+        settings = self.load_settings()
+        settings['rate'] = rate or self.rate
+        
+        workers = []
+        for index in range(shards):
+            shard_requests = num_requests // shards + (1 if index < num_requests % shards else 0)
+            shard_concurrency = max(1, concurrency // shards + (1 if index < concurrency % shards else 0))
+            worker = context.Process(
+                target=run_shard,
+                args=(settings, endpoint, shard_requests, shard_concurrency, index, shards, barrier, results_queue, label)
+            )
+            worker.start()
+            workers.append(worker)
+        
+        loop = asyncio.get_event_loop()
+        shard_results = await loop.run_in_executor(None, collect_shard_results, workers, results_queue)
+        for worker in workers:
+            worker.join()
+        
+        histogram = LatencyHistogram()
+        counters = {'failed': 0, 'warmup': 0, 'errors': {}, 'connections_opened': 0, 'connections_reused': 0, 'instances': {}}
+        if self.trace_phases:
+            counters['phases'] = new_phase_histograms()
+        for shard_histogram, shard_counters, _, _, shard_samples in shard_results:
+            histogram.merge(LatencyHistogram.from_dict(shard_histogram))
+            if self.samples is not None:
+                self.samples.merge(shard_samples)
+            for name in ('failed', 'warmup', 'connections_opened', 'connections_reused'):
+                counters[name] += shard_counters[name]
+            for error, count in shard_counters['errors'].items():
+                counters['errors'][error] = counters['errors'].get(error, 0) + count
+            for phase, phase_histogram in shard_counters.get('phases', {}).items():
+                counters['phases'][phase].merge(LatencyHistogram.from_dict(phase_histogram))
+            for instance_id, instance in shard_counters['instances'].items():
+                merged = counters['instances'].setdefault(
+                    instance_id, {'cluster': instance['cluster'], 'histogram': LatencyHistogram(), 'errors': 0}
+                )
+                merged['histogram'].merge(LatencyHistogram.from_dict(instance['histogram']))
+                merged['errors'] += instance['errors']
         
+        # Shards start together at the barrier, the benchmark lasts until the slowest one finishes
+        overall_time = max(result[3] for result in shard_results) - min(result[2] for result in shard_results)
+        return histogram, counters, overall_time
+
+    def build_result(self, endpoint, histogram, counters, total_time, measured_time, load):
+        """Summarize a latency histogram and failure counters into a result entry"""
+        recorded = histogram.count + counters['failed']
+        latency = histogram.summary()
         result = {
             'endpoint': endpoint,
-            'total_requests': num_requests,
-            'successful_requests': len(successful),
-            'failed_requests': len(failed),
-            'success_rate': len(successful) / num_requests * 100,
-            'avg_response_time': avg_time,
-            'min_response_time': min_time,
-            'max_response_time': max_time,
-            'throughput': throughput,
-            'total_time': overall_time
+            'total_requests': recorded,
+            'successful_requests': histogram.count,
+            'failed_requests': counters['failed'],
+            'success_rate': histogram.count / recorded * 100 if recorded else 0,
+            'avg_response_time': latency['avg'],
+            'min_response_time': latency['min'],
+            'max_response_time': latency['max'],
+            'throughput': histogram.count / measured_time if measured_time > 0 else 0,
+            'total_time': total_time,
+            'warmup_requests': counters['warmup'],
+            'errors': counters['errors'],
+            'connections_opened': counters['connections_opened'],
+            'connections_reused': counters['connections_reused'],
+            'load': load,
+            'connection_strategy': self.describe_connections(),
+            'histogram': histogram.to_dict()
         }
-        
-        print(f"  Success rate: {result['success_rate']:.1f}%")
-        print(f"  Avg response time: {avg_time:.2f}ms")
-        print(f"  Throughput: {throughput:.2f} req/s")
-        
+        for name in REPORTED_PERCENTILES:
+            result[f'{name}_response_time'] = latency[name]
+        if counters['instances']:
+            result['instances'], result['fairness'] = summarize_instances(counters['instances'], latency['p99'])
+        if 'phases' in counters:
+            result['phases'] = {}
+            for phase, phase_histogram in counters['phases'].items():
+                result['phases'][phase] = phase_histogram.summary()
+                result['phases'][phase]['histogram'] = phase_histogram.to_dict()
         return result
 
-    async def run_benchmarks(self, endpoints):
-        print("\nStarting Performance Benchmarks")
-        print("=" * 50)
+    async def run_open_loop(self, make_request, num_requests, first_start, rate):
+        """Send requests on a fixed or Poisson schedule, independently of how fast the server answers"""
+        in_flight = set()
+        intended_start = first_start
+        for _ in range(num_requests):
+            delay = intended_start - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(make_request(intended_start))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            if self.arrival == 'poisson':
+                intended_start += random.expovariate(rate)
+            else:
+                intended_start += 1 / rate
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+    def describe_load(self, concurrency, rate=None):
+        if self.mode == 'open':
+            load = f"open loop, {self.arrival} arrivals at {rate or self.rate:g} req/s"
+        else:
+            load = f"closed loop, concurrency {concurrency}"
+        if self.processes > 1:
+            load += f", {self.processes} processes"
+        return load
+
+    def describe_connections(self):
+        if CONNECTION_STRATEGIES[self.connection_strategy]['force_close']:
+            return self.connection_strategy
+        return f"{self.connection_strategy}, limit {self.pool_limit or 'none'}, per host {self.per_host_limit or 'none'}"
+
+    def load_settings(self):
+        """Constructor arguments that reproduce this runner's load shape, for load generator processes"""
+        return {
+            'mode': self.mode,
+            'rate': self.rate,
+            'arrival': self.arrival,
+            'warmup': self.warmup,
+            'connection_strategy': self.connection_strategy,
+            'pool_limit': self.pool_limit,
+            'per_host_limit': self.per_host_limit,
+            'dns_ttl': self.dns_ttl,
+            'sample_file': self.sample_file,
+            'trace_phases': self.trace_phases
+        }
+
+    def create_session(self):
+        """Create a session whose connector follows the configured connection strategy"""
+        strategy = CONNECTION_STRATEGIES[self.connection_strategy]
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_limit,
+            limit_per_host=self.per_host_limit,
+            force_close=strategy['force_close'],
+            use_dns_cache=strategy['use_dns_cache'],
+            ttl_dns_cache=self.dns_ttl if strategy['use_dns_cache'] else None
+        )
+        
+        # Count new and reused connections so the handshake share of each result is visible
+        def request_counters(context):
+            counters = context.trace_request_ctx
+            return counters.counters if isinstance(counters, RequestTrace) else counters
+        
+        async def on_connection_create_end(session, context, params):
+            counters = request_counters(context)
+            if counters is not None:
+                counters['connections_opened'] += 1
+        
+        async def on_connection_reuseconn(session, context, params):
+            counters = request_counters(context)
+            if counters is not None:
+                counters['connections_reused'] += 1
+        
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        
+        trace_configs = [trace_config]
+        if self.trace_phases:
+            trace_configs.append(phase_trace_config())
         
         timeout = aiohttp.ClientTimeout(total=30)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            
-            if endpoints['alb_cluster1']:
-                print(f"\nTesting ALB Cluster1 (/cluster1):")
+        return aiohttp.ClientSession(timeout=timeout, connector=connector, trace_configs=trace_configs)
+
+    async def benchmark_target(self, session, endpoint, num_requests, name):
+        """Benchmark one target with a fixed budget, or step through the load profile when one is configured"""
+        if self.load_levels:
+            return await self.run_load_profile(session, endpoint, num_requests, name)
+        return await self.benchmark_endpoint(session, endpoint, num_requests, name)
+
+    async def run_load_profile(self, session, endpoint, num_requests, name):
+        """Raise the load step by step (concurrency in closed loop, rate in open loop) and locate the knee"""
+        steps = []
+        step_results = []
+        for level in self.load_levels:
+            if self.mode == 'open':
+                step_requests = max(1, int(level * self.step_duration))
                 result = await self.benchmark_endpoint(
-                    session, endpoints['alb_cluster1'], 1000, "ALB Cluster1"
+                    session, endpoint, step_requests, f"{name} @ {level:g} req/s", rate=level
                 )
-                self.results['alb_cluster1'] = result
-            
-            if endpoints['alb_cluster2']:
-                print(f"\nTesting ALB Cluster2 (/cluster2):")
+            else:
                 result = await self.benchmark_endpoint(
-                    session, endpoints['alb_cluster2'], 1000, "ALB Cluster2"
+                    session, endpoint, self.step_requests or num_requests, f"{name} @ concurrency {int(level)}", int(level)
                 )
-                self.results['alb_cluster2'] = result
-            
-            if endpoints['cluster1_direct']:
-                print(f"\nTesting Direct Cluster1 Instances:")
-                direct_results = []
-                for i, endpoint in enumerate(endpoints['cluster1_direct'][:2]):
-                    result = await self.benchmark_endpoint(
-                        session, endpoint, 100, f"Cluster1 Instance {i+1}"
-                    )
-                    direct_results.append(result)
-                self.results['direct_cluster1'] = direct_results
-            
-            if endpoints['cluster2_direct']:
-                print(f"\nTesting Direct Cluster2 Instances:")
-                direct_results = []
-                for i, endpoint in enumerate(endpoints['cluster2_direct'][:2]):
-                    result = await self.benchmark_endpoint(
-                        session, endpoint, 100, f"Cluster2 Instance {i+1}"
-                    )
-                    direct_results.append(result)
-                self.results['direct_cluster2'] = direct_results
+            step_results.append(result)
+            steps.append({
+                'level': level,
+                'throughput': result['throughput'],
+                'avg_response_time': result['avg_response_time'],
+                'p50_response_time': result['p50_response_time'],
+                'p99_response_time': result['p99_response_time'],
+                'success_rate': result['success_rate'],
+                'min_response_time': result['min_response_time'],
+                # Measured part of the sending schedule; throughput also spans the drain after it
+                'send_window': max(step_requests / level - self.warmup, 0) if self.mode == 'open' else None,
+                'start_time': result['start_time'],
+                'end_time': result['end_time']
+            })
+        
+        knee = find_knee(steps, self.slo_p99, self.mode == 'open')
+        if knee['index'] is None:
+            print(f"  {name}: {knee['reason']} from the first step")
+        else:
+            print(f"  {name}: knee at {knee['level']:g} ({knee['reason']}), "
+                  f"{knee['throughput']:.2f} req/s, p99 {knee['p99_response_time']:.2f}ms")
+        
+        # The knee step stands for the target in the usual reports, the full curve is kept alongside
+        result = dict(step_results[knee['index'] if knee['index'] is not None else 0])
+        result['steps'] = steps
+        result['knee'] = knee
+        # The target was under load for the whole profile, not only during the knee step
+        result['start_time'] = steps[0]['start_time']
+        result['end_time'] = steps[-1]['end_time']
+        return result
+
+    def plan_targets(self, endpoints):
+        """One entry per ALB path and per direct instance, each with its own budget and result slot"""
+        targets = []
+        for cluster in ('cluster1', 'cluster2'):
+            if endpoints[f'alb_{cluster}']:
+                targets.append({
+                    'key': f'alb_{cluster}', 'index': None, 'kind': 'alb', 'cluster': cluster,
+                    'name': f"ALB {cluster.capitalize()}", 'url': self.target_url(endpoints[f'alb_{cluster}']),
+                    'requests': self.alb_requests
+                })
+        for cluster in ('cluster1', 'cluster2'):
+            for i, endpoint in enumerate(endpoints[f'{cluster}_direct']):
+                targets.append({
+                    'key': f'direct_{cluster}', 'index': i, 'kind': 'direct', 'cluster': cluster,
+                    'name': f"{cluster.capitalize()} Instance {i+1}", 'url': self.target_url(endpoint),
+                    'requests': self.instance_requests
+                })
+        return targets
+
+    def plan_phases(self, targets):
+        """Group targets into phases that never overlap, in target order"""
+        phases = {}
+        for target in targets:
+            phases.setdefault(ISOLATION_LEVELS[self.isolation](target), []).append(target)
+        return list(phases.values())
+
+    async def run_phase(self, session, targets):
+        """Benchmark the targets of a phase with at most `parallel` of them in flight"""
+        slots = asyncio.Semaphore(self.parallel or len(targets))
+        
+        async def run_target(target):
+            async with slots:
+                result = await self.benchmark_target(session, target['url'], target['requests'], target['name'])
+            if target['index'] is None:
+                self.results[target['key']] = result
+            else:
+                self.results[target['key']][target['index']] = result
+        
+        await asyncio.gather(*[run_target(target) for target in targets])
+
+    async def run_benchmarks(self, endpoints):
+        print("\nStarting Performance Benchmarks")
+        print("=" * 50)
+        
+        targets = self.plan_targets(endpoints)
+        # Direct results keep the instance order of deployment_info.json whatever order they finish in
+        for cluster in ('cluster1', 'cluster2'):
+            if endpoints[f'{cluster}_direct']:
+                self.results[f'direct_{cluster}'] = [None] * len(endpoints[f'{cluster}_direct'])
+        
+        if self.trace_phases and self.trace_calibration and targets:
+            await self.measure_tracing_overhead(targets[0]['url'])
+        
+        phases = self.plan_phases(targets)
+        print(f"{len(targets)} targets in {len(phases)} phases (isolation: {self.isolation}, "
+              f"parallel: {self.parallel or 'all'})")
+        
+        async with self.create_session() as session:
+            start_time = time.perf_counter()
+            for number, phase in enumerate(phases, 1):
+                print(f"\nPhase {number}/{len(phases)}: {', '.join(target['name'] for target in phase)}")
+                await self.run_phase(session, phase)
+            print(f"\nAll targets benchmarked in {time.perf_counter() - start_time:.1f}s")
+
+            await self.collect_server_metrics(session, endpoints)
+
+    async def measure_tracing_overhead(self, endpoint):
+        """Client CPU time and latency per request with and without phase tracing, alternating runs"""
+        print(f"\nMeasuring phase tracing overhead on {endpoint} ({self.trace_calibration} requests per run)")
+        settings = self.load_settings()
+        settings.update({'mode': 'closed', 'warmup': 0.0, 'sample_file': None})
+        runs = {True: [], False: []}
+        for traced in (False, True, False, True):
+            settings['trace_phases'] = traced
+            runner = BenchmarkRunner(**settings, verbose=False)
+            async with runner.create_session() as session:
+                cpu_start = time.process_time()
+                histogram, _, elapsed = await runner.measure_endpoint(session, endpoint, self.trace_calibration, 10)
+                runs[traced].append((time.process_time() - cpu_start, elapsed, histogram))
+        
+        overhead = {'requests': self.trace_calibration * 2}
+        for traced, name in ((False, 'untraced'), (True, 'traced')):
+            cpu_time = sum(run[0] for run in runs[traced])
+            elapsed = sum(run[1] for run in runs[traced])
+            merged = LatencyHistogram()
+            for run in runs[traced]:
+                merged.merge(run[2])
+            overhead[f'{name}_cpu_us_per_request'] = cpu_time / max(merged.count, 1) * 1e6
+            overhead[f'{name}_avg_response_time'] = merged.mean()
+            overhead[f'{name}_throughput'] = merged.count / elapsed if elapsed > 0 else 0
+        untraced_cpu = overhead['untraced_cpu_us_per_request']
+        overhead['cpu_overhead_pct'] = (overhead['traced_cpu_us_per_request'] / untraced_cpu - 1) * 100 if untraced_cpu else 0
+        self.tracing_overhead = overhead
+        print(f"  Client CPU per request: {untraced_cpu:.1f}us untraced, {overhead['traced_cpu_us_per_request']:.1f}us traced "
+              f"({overhead['cpu_overhead_pct']:+.1f}%)")
+        print(f"  Avg response time: {overhead['untraced_avg_response_time']:.2f}ms untraced, "
+              f"{overhead['traced_avg_response_time']:.2f}ms traced")
+
+    async def fetch_server_metrics(self, session, endpoint, attempts_per_worker=8):
+        """Scrape /metrics from one instance and sum the service time of every app worker
+
+        Returns the per-route totals and the coverage: workers collected out of those the server reports.
+        """
+        # Each scrape is answered by a single uvicorn worker, so scrape until every pid has answered
+        workers = {}
+        expected = 1
+        scrapes = 0
+        while len(workers) < expected and scrapes < attempts_per_worker * expected:
+            scrapes += 1
+            try:
+                async with session.get(f"{endpoint}/metrics", headers={'Connection': 'close'},
+                                       timeout=aiohttp.ClientTimeout(total=5)) as response:
+                    text = await response.text()
+            except Exception as e:
+                print(f"  Could not scrape {endpoint}/metrics: {e}")
+                break
+            workers.update(parse_latency_metrics(text))
+            match = WORKERS_LINE.search(text)
+            if match:
+                expected = int(match.group(1))
+        coverage = {'workers_collected': len(workers), 'workers_expected': expected, 'complete': len(workers) >= expected}
+
+        routes = {}
+        for worker_routes in workers.values():
+            for route, values in worker_routes.items():
+                totals = routes.setdefault(route, {'count': 0, 'sum': 0.0})
+                totals['count'] += int(values.get('count', 0))
+                totals['sum'] += values.get('sum', 0.0)
+
+        return {
+            route: {
+                'requests': totals['count'],
+                'avg_service_time': totals['sum'] / totals['count'] * 1000
+            }
+            for route, totals in routes.items() if totals['count']
+        }, coverage
+
+    async def collect_server_metrics(self, session, endpoints):
+        """Collect server-side service times from every instance to compare with client-side latency"""
+        print("\nCollecting server-side latency from /metrics:")
+        for endpoint in endpoints['cluster1_direct'] + endpoints['cluster2_direct']:
+            self.server_metrics[endpoint], self.server_metrics_coverage[endpoint] = await self.fetch_server_metrics(session, endpoint)
+            coverage = self.server_metrics_coverage[endpoint]
+            print(f"  {endpoint}: {len(self.server_metrics[endpoint])} routes from "
+                  f"{coverage['workers_collected']}/{coverage['workers_expected']} workers")
+            if not coverage['complete']:
+                print(f"  Warning: {endpoint} service times leave out workers that never answered a scrape")
 
     def analyze_results(self):
         """Analyze and compare results"""
         analysis = {
             'timestamp': datetime.utcnow().isoformat(),
+            'workload': self.workload_path or '/',
+            'connection_strategy': self.describe_connections(),
             'summary': {},
-            'detailed_results': self.results
+            'detailed_results': self.results,
+            'server_metrics': self.server_metrics,
+            'server_metrics_coverage': self.server_metrics_coverage
         }
+        if self.tracing_overhead:
+            analysis['tracing_overhead'] = self.tracing_overhead
         
         summary = {}
         
-        if 'alb_cluster1' in self.results:
-            summary['alb_cluster1_avg_response_time'] = self.results['alb_cluster1']['avg_response_time']
-            summary['alb_cluster1_throughput'] = self.results['alb_cluster1']['throughput']
-        
-        if 'alb_cluster2' in self.results:
-            summary['alb_cluster2_avg_response_time'] = self.results['alb_cluster2']['avg_response_time']
-            summary['alb_cluster2_throughput'] = self.results['alb_cluster2']['throughput']
-        
-        if 'direct_cluster1' in self.results:
-            direct1_times = [r['avg_response_time'] for r in self.results['direct_cluster1']]
-            summary['direct_cluster1_avg_response_time'] = statistics.mean(direct1_times) if direct1_times else 0
-        
-        if 'direct_cluster2' in self.results:
-            direct2_times = [r['avg_response_time'] for r in self.results['direct_cluster2']]
-            summary['direct_cluster2_avg_response_time'] = statistics.mean(direct2_times) if direct2_times else 0
+        for key in ('alb_cluster1', 'alb_cluster2'):
+            if key in self.results:
+                result = self.results[key]
+                summary[f'{key}_avg_response_time'] = result['avg_response_time']
+                summary[f'{key}_throughput'] = result['throughput']
+                summary[f'{key}_failed_requests'] = result['failed_requests']
+                for name in REPORTED_PERCENTILES:
+                    summary[f'{key}_{name}_response_time'] = result[f'{name}_response_time']
+                if 'knee' in result:
+                    summary[f'{key}_knee'] = result['knee']
+                if 'fairness' in result:
+                    summary[f'{key}_fairness'] = result['fairness']['jain_index']
+        
+        for key in ('direct_cluster1', 'direct_cluster2'):
+            if key in self.results:
+                direct_results = self.results[key]
+                # Cluster-wide figures come from the merged histograms, so an instance that
+                # failed every request does not drag the average down with zeros
+                merged = LatencyHistogram()
+                for r in direct_results:
+                    merged.merge(LatencyHistogram.from_dict(r['histogram']))
+                summary[f'{key}_avg_response_time'] = merged.mean()
+                summary[f'{key}_failed_requests'] = sum(r['failed_requests'] for r in direct_results)
+                for name, percentile in REPORTED_PERCENTILES.items():
+                    summary[f'{key}_{name}_response_time'] = merged.percentile(percentile)
+                if all('knee' in r for r in direct_results):
+                    summary[f'{key}_knees'] = [r['knee'] for r in direct_results]
         
         if 'alb_cluster1_avg_response_time' in summary and 'alb_cluster2_avg_response_time' in summary:
             if summary['alb_cluster1_avg_response_time'] < summary['alb_cluster2_avg_response_time']:
@@ -176,61 +651,91 @@ class BenchmarkRunner:
         with open('benchmark_results.json', 'w') as f:
             json.dump(analysis, f, indent=2)
         
-        csv_data = []
+        csv_data = [self.csv_row(label, result) for label, result in self.labelled_results()]
         
-        if 'alb_cluster1' in self.results:
-            csv_data.append([
-                'ALB Cluster1',
-                self.results['alb_cluster1']['endpoint'],
-                self.results['alb_cluster1']['total_requests'],
-                f"{self.results['alb_cluster1']['success_rate']:.1f}%",
-                f"{self.results['alb_cluster1']['avg_response_time']:.2f}",
-                f"{self.results['alb_cluster1']['throughput']:.2f}"
-            ])
+        with open('benchmark_results.csv', 'w') as f:
+            f.write('Type,Endpoint,Requests,Failed,Success Rate,Avg Response Time (ms),'
+                    'P50 (ms),P90 (ms),P99 (ms),P99.9 (ms),Max (ms),Throughput (req/s),'
+                    'Connections Opened,Connections Reused,Start Time,End Time\n')
+            for row in csv_data:
+                f.write(','.join(map(str, row)) + '\n')
         
-        if 'alb_cluster2' in self.results:
-            csv_data.append([
-                'ALB Cluster2',
-                self.results['alb_cluster2']['endpoint'],
-                self.results['alb_cluster2']['total_requests'],
-                f"{self.results['alb_cluster2']['success_rate']:.1f}%",
-                f"{self.results['alb_cluster2']['avg_response_time']:.2f}",
-                f"{self.results['alb_cluster2']['throughput']:.2f}"
-            ])
-        
-        if 'direct_cluster1' in self.results:
-            for i, result in enumerate(self.results['direct_cluster1']):
-                csv_data.append([
-                    f'Direct Cluster1-{i+1}',
+        step_rows = []
+        for label, result in self.labelled_results():
+            for step in result.get('steps', []):
+                step_rows.append([
+                    label,
                     result['endpoint'],
-                    result['total_requests'],
-                    f"{result['success_rate']:.1f}%",
-                    f"{result['avg_response_time']:.2f}",
-                    f"{result['throughput']:.2f}"
+                    f"{step['level']:g}",
+                    f"{step['throughput']:.2f}",
+                    f"{step['avg_response_time']:.2f}",
+                    f"{step['p50_response_time']:.2f}",
+                    f"{step['p99_response_time']:.2f}",
+                    f"{step['success_rate']:.1f}%",
+                    'yes' if result['knee']['level'] == step['level'] else ''
                 ])
         
-        if 'direct_cluster2' in self.results:
-            for i, result in enumerate(self.results['direct_cluster2']):
-                csv_data.append([
-                    f'Direct Cluster2-{i+1}',
-                    result['endpoint'],
-                    result['total_requests'],
-                    f"{result['success_rate']:.1f}%",
-                    f"{result['avg_response_time']:.2f}",
-                    f"{result['throughput']:.2f}"
-                ])
+        if step_rows:
+            with open('benchmark_steps.csv', 'w') as f:
+                f.write('Type,Endpoint,Level,Throughput (req/s),Avg Response Time (ms),P50 (ms),P99 (ms),Success Rate,Knee\n')
+                for row in step_rows:
+                    f.write(','.join(map(str, row)) + '\n')
+            print("Load profile steps saved to benchmark_steps.csv")
         
-        with open('benchmark_results.csv', 'w') as f:
-            f.write('Type,Endpoint,Requests,Success Rate,Avg Response Time (ms),Throughput (req/s)\n')
-            for row in csv_data:
-                f.write(','.join(map(str, row)) + '\n')
+        if self.samples is not None:
+            self.samples.save(self.sample_file)
+            print(f"{len(self.samples)} raw samples saved to {self.sample_file}")
         
         print("Results saved to benchmark_results.json and benchmark_results.csv")
 
+    def labelled_results(self):
+        """Yield (label, result) for every benchmarked target in report order"""
+        if 'alb_cluster1' in self.results:
+            yield 'ALB Cluster1', self.results['alb_cluster1']
+        if 'alb_cluster2' in self.results:
+            yield 'ALB Cluster2', self.results['alb_cluster2']
+        for i, result in enumerate(self.results.get('direct_cluster1', [])):
+            yield f'Direct Cluster1-{i+1}', result
+        for i, result in enumerate(self.results.get('direct_cluster2', [])):
+            yield f'Direct Cluster2-{i+1}', result
+
+    def csv_row(self, label, result):
+        return [
+            label,
+            result['endpoint'],
+            result['total_requests'],
+            result['failed_requests'],
+            f"{result['success_rate']:.1f}%",
+            f"{result['avg_response_time']:.2f}",
+            f"{result['p50_response_time']:.2f}",
+            f"{result['p90_response_time']:.2f}",
+            f"{result['p99_response_time']:.2f}",
+            f"{result['p999_response_time']:.2f}",
+            f"{result['max_response_time']:.2f}",
+            f"{result['throughput']:.2f}",
+            result['connections_opened'],
+            result['connections_reused'],
+            result['start_time'],
+            result['end_time']
+        ]
+
+    def format_phases(self, phases):
+        return ', '.join(
+            f"{phase} {phases[phase]['p50']:.2f}/{phases[phase]['p99']:.2f}ms" for phase in PHASES if phases[phase]['count']
+        )
+
+    def format_percentiles(self, summary, key):
+        percentiles = ', '.join(
+            f"{name} {summary[f'{key}_{name}_response_time']:.2f}ms" for name in REPORTED_PERCENTILES
+        )
+        return f"{percentiles}, failed {summary[f'{key}_failed_requests']}"
+
     def print_summary(self, analysis):
         print("\n" + "="*60)
         print("BENCHMARK RESULTS SUMMARY")
         print("="*60)
+        print(f"Workload: {analysis.get('workload', '/')}")
+        print(f"Connections: {analysis.get('connection_strategy', 'default')}")
         
         if 'summary' in analysis:
             summary = analysis['summary']
@@ -238,28 +743,193 @@ class BenchmarkRunner:
             
             if 'alb_cluster1_avg_response_time' in summary:
                 print(f"  • ALB Cluster1 (t2.large) avg response: {summary['alb_cluster1_avg_response_time']:.2f}ms")
+                print(f"  • ALB Cluster1 {self.format_percentiles(summary, 'alb_cluster1')}")
                 print(f"  • ALB Cluster1 throughput: {summary['alb_cluster1_throughput']:.2f} req/s")
             
             if 'alb_cluster2_avg_response_time' in summary:
                 print(f"  • ALB Cluster2 (t2.micro) avg response: {summary['alb_cluster2_avg_response_time']:.2f}ms")
+                print(f"  • ALB Cluster2 {self.format_percentiles(summary, 'alb_cluster2')}")
                 print(f"  • ALB Cluster2 throughput: {summary['alb_cluster2_throughput']:.2f} req/s")
             
             if 'direct_cluster1_avg_response_time' in summary:
                 print(f"  • Direct Cluster1 avg response: {summary['direct_cluster1_avg_response_time']:.2f}ms")
+                print(f"  • Direct Cluster1 {self.format_percentiles(summary, 'direct_cluster1')}")
             
             if 'direct_cluster2_avg_response_time' in summary:
                 print(f"  • Direct Cluster2 avg response: {summary['direct_cluster2_avg_response_time']:.2f}ms")
+                print(f"  • Direct Cluster2 {self.format_percentiles(summary, 'direct_cluster2')}")
             
             if 'faster_cluster' in summary:
                 print(f"\nPERFORMANCE WINNER: {summary['faster_cluster']}")
+
+        knees = [(label, result['knee']) for label, result in self.labelled_results() if 'knee' in result]
+        if knees:
+            print(f"\nSATURATION KNEES ({'rate' if self.mode == 'open' else 'concurrency'}):")
+            for label, knee in knees:
+                if knee['index'] is None:
+                    print(f"  • {label}: {knee['reason']} from the first step")
+                else:
+                    print(f"  • {label}: {knee['level']:g} -> {knee['throughput']:.2f} req/s, "
+                          f"p99 {knee['p99_response_time']:.2f}ms ({knee['reason']})")
+
+        spreads = [(label, result) for label, result in self.labelled_results() if len(result.get('instances', {})) > 1]
+        if spreads:
+            print(f"\nPER-INSTANCE ATTRIBUTION (fairness 1.0 = perfectly even):")
+            for label, result in spreads:
+                print(f"  • {label}: fairness {result['fairness']['jain_index']:.3f}, "
+                      f"shares {result['fairness']['min_share']:.0%}-{result['fairness']['max_share']:.0%}")
+                for instance_id, instance in result['instances'].items():
+                    print(f"      {instance_id} ({instance['cluster']}): {instance['requests']} requests ({instance['share']:.0%}), "
+                          f"{instance['errors']} errors, p50 {instance['p50_response_time']:.2f}ms, "
+                          f"p99 {instance['p99_response_time']:.2f}ms, {instance['tail_share']:.0%} of the tail")
+
+        breakdowns = [(label, result['phases']) for label, result in self.labelled_results() if 'phases' in result]
+        if breakdowns:
+            print(f"\nCLIENT-SIDE LATENCY BREAKDOWN (p50/p99):")
+            for label, phases in breakdowns:
+                print(f"  • {label}: {self.format_phases(phases)}")
+            overhead = analysis.get('tracing_overhead')
+            if overhead:
+                print(f"  Tracing overhead: {overhead['cpu_overhead_pct']:+.1f}% client CPU per request, "
+                      f"avg latency {overhead['untraced_avg_response_time']:.2f}ms -> {overhead['traced_avg_response_time']:.2f}ms")
+
+        if analysis.get('server_metrics'):
+            print(f"\nSERVER-SIDE SERVICE TIME (all workers, since app start):")
+            for endpoint, routes in analysis['server_metrics'].items():
+                coverage = analysis.get('server_metrics_coverage', {}).get(endpoint)
+                if coverage and not coverage['complete']:
+                    print(f"  • {endpoint}: INCOMPLETE, only {coverage['workers_collected']} of "
+                          f"{coverage['workers_expected']} workers collected")
+                for route, metrics in routes.items():
+                    if route in ('/metrics', '/health'):
+                        continue
+                    print(f"  • {endpoint}{route}: {metrics['avg_service_time']:.2f}ms over {metrics['requests']} requests")
         
         print("\n" + "="*60)
 
+def drained_rate(step):
+    """Throughput of a server keeping up with an open-loop step: the offered rate, spread over the send
+    window plus the drain of the last responses, which take about one unqueued (minimum) response time"""
+    send_window = step.get('send_window')
+    if not send_window:
+        return step['level']
+    return step['level'] * send_window / (send_window + step['min_response_time'] / 1000)
+
+def find_knee(steps, slo_p99=None, open_loop=False, min_gain=0.05):
+    """Last step before p99 breaks the SLO or throughput stops following the load"""
+    for index, step in enumerate(steps):
+        if slo_p99 is not None and step['p99_response_time'] > slo_p99:
+            reason = f"p99 above the {slo_p99:g}ms SLO at the next step"
+        elif open_loop and step['throughput'] < drained_rate(step) * (1 - min_gain):
+            # In open loop the offered rate is known, saturation shows as throughput falling behind it
+            reason = "throughput falls behind the offered rate at the next step"
+        elif not open_loop and index > 0 and step['throughput'] < steps[index - 1]['throughput'] * (1 + min_gain):
+            reason = "throughput plateaus at the next step"
+        else:
+            continue
+        if index == 0:
+            return {'index': None, 'level': None, 'reason': reason.replace(' at the next step', '')}
+        return dict(steps[index - 1], index=index - 1, reason=reason)
+    return dict(steps[-1], index=len(steps) - 1, reason="not reached, highest step tested")
+
+def collect_shard_results(workers, results_queue):
+    """Wait for one result per load generator process, failing if they all exit without reporting"""
+    results = []
+    while len(results) < len(workers):
+        try:
+            results.append(results_queue.get(timeout=1))
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                try:
+                    results.append(results_queue.get(timeout=1))
+                except queue.Empty:
+                    raise RuntimeError("A load generator process exited without reporting its results")
+    return results
+
+def run_shard(settings, endpoint, num_requests, concurrency, index, shards, barrier, results_queue, label=None):
+    """Entry point of one load generator process, reports a compact histogram, counters and raw samples"""
+    runner = BenchmarkRunner(**settings, verbose=False)
+    rate = settings['rate'] / shards if settings['rate'] else None
+    # Fixed-rate shards are phase-shifted so their combined schedule stays evenly spaced
+    offset = index / settings['rate'] if settings['mode'] == 'open' and settings['arrival'] == 'fixed' else 0.0
+
+    async def shard():
+        async with runner.create_session() as session:
+            barrier.wait(timeout=120)
+            start = time.time()
+            histogram, counters, elapsed = await runner.measure_endpoint(
+                session, endpoint, num_requests, concurrency, rate, offset, label
+            )
+            if 'phases' in counters:
+                counters['phases'] = {phase: phase_histogram.to_dict() for phase, phase_histogram in counters['phases'].items()}
+            for instance in counters['instances'].values():
+                instance['histogram'] = instance['histogram'].to_dict()
+            return histogram.to_dict(), counters, start, start + elapsed, runner.samples
+
+    results_queue.put(asyncio.run(shard()))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the ALB paths and the cluster instances')
+    parser.add_argument('--workload', default='static',
+                        help=f"One of {sorted(WORKLOADS)} or a raw path such as '/work?cpu_ms=5&alloc_kb=64'")
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed',
+                        help='closed: fixed concurrency, open: constant arrival rate (avoids coordinated omission)')
+    parser.add_argument('--rate', type=float, default=None, help='Target request rate in req/s for open-loop mode')
+    parser.add_argument('--arrival', choices=['fixed', 'poisson'], default='fixed', help='Open-loop inter-arrival distribution')
+    parser.add_argument('--warmup', type=float, default=0.0, help='Seconds of requests to send but not record')
+    parser.add_argument('--connection-strategy', choices=sorted(CONNECTION_STRATEGIES), default='pooled-cached-dns',
+                        help='Keep-alive pool or new connection per request, with or without DNS caching')
+    parser.add_argument('--pool-limit', type=int, default=100, help='Maximum open connections (0 for unlimited)')
+    parser.add_argument('--per-host-limit', type=int, default=0, help='Maximum open connections per target (0 for unlimited)')
+    parser.add_argument('--dns-ttl', type=int, default=300, help='DNS cache TTL in seconds for the cached-dns strategies')
+    parser.add_argument('--load-profile', choices=['fixed', 'step', 'ramp'], default='fixed',
+                        help='fixed: one run per target, step: run each of --levels, ramp: linear levels from --ramp')
+    parser.add_argument('--levels', type=float, nargs='+', default=[1, 2, 4, 8, 16, 32, 64],
+                        help='Concurrency (closed loop) or rate in req/s (open loop) for each step')
+    parser.add_argument('--ramp', type=float, nargs=3, metavar=('START', 'END', 'STEPS'),
+                        help='Generate STEPS evenly spaced levels from START to END')
+    parser.add_argument('--step-requests', type=int, default=None, help='Requests per closed-loop step (default: target budget)')
+    parser.add_argument('--step-duration', type=float, default=10.0, help='Seconds per open-loop step')
+    parser.add_argument('--slo-p99', type=float, default=None, help='p99 latency SLO in ms used to locate the knee')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Client processes per target, each with its own event loop and connection pool')
+    parser.add_argument('--isolation', choices=sorted(ISOLATION_LEVELS), default='kind',
+                        help='Targets that must not overlap: none, ALB vs direct (kind), per kind and cluster, or every target')
+    parser.add_argument('--parallel', type=int, default=0,
+                        help='Targets benchmarked at once within a phase (0 for all, 1 for sequential)')
+    parser.add_argument('--alb-requests', type=int, default=1000, help='Request budget for each ALB path')
+    parser.add_argument('--instance-requests', type=int, default=100, help='Request budget for each direct instance')
+    parser.add_argument('--trace-phases', action='store_true',
+                        help='Break latency down into dns/connect/acquire/ttfb/body phases (costs client CPU)')
+    parser.add_argument('--trace-calibration', type=int, default=500,
+                        help='Requests per run used to measure the tracing overhead (0 to skip)')
+    parser.add_argument('--samples', default=None, metavar='FILE',
+                        help='Also keep every request as a raw sample and save them to FILE (.npz, or .parquet with pyarrow)')
+    args = parser.parse_args()
+    
+    args.load_levels = []
+    if args.load_profile == 'step':
+        args.load_levels = sorted(args.levels)
+    elif args.load_profile == 'ramp':
+        if not args.ramp:
+            parser.error('--load-profile ramp needs --ramp START END STEPS')
+        start, end, count = args.ramp
+        count = max(2, int(count))
+        args.load_levels = [start + (end - start) * i / (count - 1) for i in range(count)]
+    return args
+
 async def main():
+    args = parse_args()
     try:
         print("Starting Simplified Benchmark for LOG8415E Assignment")
         
-        runner = BenchmarkRunner()
+        runner = BenchmarkRunner(
+            args.workload, args.mode, args.rate, args.arrival, args.warmup, args.processes,
+            args.connection_strategy, args.pool_limit, args.per_host_limit, args.dns_ttl,
+            args.load_levels, args.step_requests, args.step_duration, args.slo_p99,
+            args.isolation, args.parallel, args.alb_requests, args.instance_requests, args.samples,
+            args.trace_phases, args.trace_calibration
+        )
         
         endpoints = await runner.load_endpoints()
         
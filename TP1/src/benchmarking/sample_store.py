@@ -0,0 +1,210 @@
+import argparse
+import json
+import time
+from array import array
+from latency_histogram import BUCKET_COUNT, MAX_TRACKABLE_US, SUB_BUCKET_BITS, SUB_BUCKETS, HALF_SUB_BUCKETS, LatencyHistogram, REPORTED_PERCENTILES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Column name -> array typecode: seconds since the store epoch, latency, HTTP status (0 when the
+# request failed without a response) and index into the target names. About 20 bytes per sample.
+COLUMNS = {
+    'start_offset': 'd',
+    'latency_ns': 'q',
+    'status': 'H',
+    'target_id': 'H'
+}
+
+NUMPY_TYPES = {'d': 'float64', 'q': 'int64', 'H': 'uint16'}
+
+# Samples added when a store without capacity grows
+MIN_CAPACITY = 1024
+
+class SampleStore:
+    """Raw per-request samples in preallocated typed arrays, one column per field"""
+
+    def __init__(self, capacity=4096, epoch=None):
+        # perf_counter is system-wide, so stores from load generator processes share the time base
+        self.epoch = time.perf_counter() if epoch is None else epoch
+        self.columns = {name: array(code, bytes(array(code).itemsize * capacity)) for name, code in COLUMNS.items()}
+        self.capacity = capacity
+        self.length = 0
+        self.targets = []
+
+    def __len__(self):
+        return self.length
+
+    def target_id(self, name):
+        if name not in self.targets:
+            self.targets.append(name)
+        return self.targets.index(name)
+
+    def record(self, start_time, latency_ns, status, target_id):
+        """Store one sample; start_time is a perf_counter() value"""
+        if self.length == self.capacity:
+            self.grow()
+        index = self.length
+        self.columns['start_offset'][index] = start_time - self.epoch
+        self.columns['latency_ns'][index] = latency_ns
+        self.columns['status'][index] = status
+        self.columns['target_id'][index] = target_id
+        self.length += 1
+
+    def grow(self):
+        """Double the capacity, so appending stays amortized O(1) without per-sample allocations"""
+        # Stores sized to their contents (merged or loaded empty) can have no capacity at all
+        added = max(self.capacity, MIN_CAPACITY)
+        for column in self.columns.values():
+            column.frombytes(bytes(column.itemsize * added))
+        self.capacity += added
+
+    def column(self, name):
+        return self.columns[name][:self.length]
+
+    def merge(self, other):
+        """Append another store's samples, re-basing its offsets and target ids onto this store"""
+        shift = other.epoch - self.epoch
+        ids = [self.target_id(name) for name in other.targets]
+        for index in range(other.length):
+            target_id = ids[other.columns['target_id'][index]]
+            self.record(
+                self.epoch + other.columns['start_offset'][index] + shift,
+                other.columns['latency_ns'][index], other.columns['status'][index], target_id
+            )
+        return self
+
+    def __getstate__(self):
+        # Only the filled part is pickled when a store is sent back from a load generator process
+        return {
+            'epoch': self.epoch,
+            'targets': self.targets,
+            'columns': {name: self.column(name) for name in COLUMNS}
+        }
+
+    def __setstate__(self, state):
+        self.epoch = state['epoch']
+        self.targets = state['targets']
+        self.columns = state['columns']
+        self.length = self.capacity = len(self.columns['latency_ns'])
+
+    def save(self, path):
+        """Write the samples as NumPy .npz or, with pyarrow installed, Parquet (chosen by extension)"""
+        if path.endswith('.parquet'):
+            if pa is None:
+                raise RuntimeError("Parquet export needs pyarrow, use a .npz path instead")
+            table = pa.table({name: pa.array(self.column(name), type=NUMPY_TYPES[code]) for name, code in COLUMNS.items()})
+            table = table.replace_schema_metadata({'targets': json.dumps(self.targets), 'epoch': repr(self.epoch)})
+            pq.write_table(table, path)
+        else:
+            if np is None:
+                raise RuntimeError("NPZ export needs numpy")
+            columns = {name: np.frombuffer(self.column(name), dtype=NUMPY_TYPES[code]) for name, code in COLUMNS.items()}
+            np.savez_compressed(path, targets=np.array(self.targets), epoch=self.epoch, **columns)
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.parquet'):
+            if pa is None:
+                raise RuntimeError("Parquet import needs pyarrow, use a .npz path instead")
+            table = pq.read_table(path)
+            metadata = table.schema.metadata
+            columns = {name: table.column(name).to_numpy() for name in COLUMNS}
+            targets = json.loads(metadata[b'targets'])
+            epoch = float(metadata[b'epoch'])
+        else:
+            if np is None:
+                raise RuntimeError("NPZ import needs numpy")
+            with np.load(path) as data:
+                columns = {name: data[name] for name in COLUMNS}
+                targets = [str(target) for target in data['targets']]
+                epoch = float(data['epoch'])
+
+        store = cls(capacity=0, epoch=epoch)
+        store.__setstate__({
+            'epoch': epoch,
+            'targets': targets,
+            'columns': {name: array(code, columns[name].astype(NUMPY_TYPES[code]).tobytes()) for name, code in COLUMNS.items()}
+        })
+        return store
+
+def histogram_from_samples(latencies_ns):
+    """Build a LatencyHistogram from a NumPy array of latencies in one vectorized pass"""
+    histogram = LatencyHistogram()
+    if not len(latencies_ns):
+        return histogram
+    values_us = np.clip(latencies_ns // 1000, 0, MAX_TRACKABLE_US).astype(np.int64)
+    # Same indexing as latency_histogram.bucket_index; frexp gives the bit length of integers below 2**53
+    bit_length = np.frexp(values_us.astype(np.float64))[1].astype(np.int64)
+    shift = np.maximum(bit_length - SUB_BUCKET_BITS, 1)
+    indexes = np.where(
+        values_us < SUB_BUCKETS,
+        values_us,
+        SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (values_us >> shift) - HALF_SUB_BUCKETS
+    )
+    histogram.counts = np.bincount(indexes, minlength=BUCKET_COUNT).tolist()
+    latencies_ms = latencies_ns / 1e6
+    histogram.count = len(latencies_ns)
+    histogram.total = float(latencies_ms.sum())
+    histogram.min = float(latencies_ms.min())
+    histogram.max = float(latencies_ms.max())
+    return histogram
+
+def summarize_samples(store):
+    """Rebuild the per-target figures of benchmark_results.json from raw samples"""
+    if np is None:
+        raise RuntimeError("Summarizing samples needs numpy")
+    columns = {name: np.frombuffer(store.column(name), dtype=NUMPY_TYPES[code]) for name, code in COLUMNS.items()}
+    summary = {}
+    for target_id, target in enumerate(store.targets):
+        selected = columns['target_id'] == target_id
+        total = int(selected.sum())
+        if not total:
+            continue
+        starts = columns['start_offset'][selected]
+        latencies = columns['latency_ns'][selected]
+        statuses = columns['status'][selected]
+        histogram = histogram_from_samples(latencies[statuses > 0])
+        latency = histogram.summary()
+        duration = float((starts + latencies / 1e9).max() - starts.min())
+        codes, counts = np.unique(statuses, return_counts=True)
+        result = {
+            'total_requests': total,
+            'successful_requests': histogram.count,
+            'failed_requests': total - histogram.count,
+            'success_rate': histogram.count / total * 100,
+            'avg_response_time': latency['avg'],
+            'min_response_time': latency['min'],
+            'max_response_time': latency['max'],
+            'throughput': histogram.count / duration if duration > 0 else 0,
+            'total_time': duration,
+            'status_codes': {str(code): int(count) for code, count in zip(codes, counts)},
+            'histogram': histogram.to_dict()
+        }
+        for name in REPORTED_PERCENTILES:
+            result[f'{name}_response_time'] = latency[name]
+        summary[target] = result
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize raw benchmark samples saved with run_benchmark.py --samples')
+    parser.add_argument('path', help='.npz or .parquet sample file')
+    args = parser.parse_args()
+
+    store = SampleStore.load(args.path)
+    print(f"{len(store)} samples for {len(store.targets)} targets in {args.path}")
+    for target, result in summarize_samples(store).items():
+        percentiles = ', '.join(f"{name} {result[f'{name}_response_time']:.2f}ms" for name in REPORTED_PERCENTILES)
+        print(f"  • {target}: {result['successful_requests']}/{result['total_requests']} ok, "
+              f"avg {result['avg_response_time']:.2f}ms, {percentiles}, {result['throughput']:.2f} req/s")
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,35 @@
-USER_DATA_SCRIPT = '''#!/bin/bash
-yum update -y
+# Everything the app needs from the OS and PyPI. In prebaked mode it is installed once into an image
+# (see AWSManager.bake_image) and instances only run APP_START_SCRIPT.
+DEPENDENCY_INSTALL_SCRIPT = '''yum update -y
 yum install -y python3 python3-pip
-pip3 install fastapi uvicorn
+pip3 install fastapi uvicorn uvloop httptools orjson
+'''
 
-mkdir -p /home/ec2-user/app
+APP_START_SCRIPT = '''mkdir -p /home/ec2-user/app
 cd /home/ec2-user/app
 
-cat > main.py << 'EOF'
-from fastapi import FastAPI
-import subprocess
-
-app = FastAPI()
-
-def get_instance_id():
-    try:
-        result = subprocess.run(['curl', '-s', 'http://169.254.169.254/latest/meta-data/instance-id'], 
-                              capture_output=True, text=True, timeout=5)
-        return result.stdout.strip() if result.returncode == 0 else 'unknown'
-    except:
-        return 'unknown'
-
-@app.get("/")
-async def root():
-    instance_id = get_instance_id()
-    return {{"message": f"Instance {{instance_id}} is responding now!", "instance_id": instance_id, "cluster": "{cluster_name}"}}
-
-@app.get("/health")
-async def health():
-    return {{"status": "healthy", "instance_id": get_instance_id(), "cluster": "{cluster_name}"}}
-
-@app.get("/cluster1")
-async def cluster1():
-    instance_id = get_instance_id()
-    return {{"message": f"Cluster1 - Instance {{instance_id}} is responding now!", "instance_id": instance_id, "cluster": "cluster1"}}
-
-@app.get("/cluster2")
-async def cluster2():
-    instance_id = get_instance_id()
-    return {{"message": f"Cluster2 - Instance {{instance_id}} is responding now!", "instance_id": instance_id, "cluster": "cluster2"}}
+base64 -d > app.tar.gz << 'EOF'
+{app_bundle}
 EOF
+tar -xzf app.tar.gz
+rm app.tar.gz
 
 chown -R ec2-user:ec2-user /home/ec2-user/app
 cd /home/ec2-user/app
-nohup python3 -m uvicorn main:app --host 0.0.0.0 --port 8000 &
+export CLUSTER_NAME={cluster_name}
+nohup python3 server.py --profile {server_profile} --port 8000 > server.log 2>&1 &
 '''
 
+USER_DATA_SCRIPT = '#!/bin/bash\n' + DEPENDENCY_INSTALL_SCRIPT + '\n' + APP_START_SCRIPT
+
+PREBAKED_USER_DATA_SCRIPT = '#!/bin/bash\n' + APP_START_SCRIPT
+
+# User data of the image builder instance, which powers off once the dependencies are installed
+IMAGE_BAKE_SCRIPT = '#!/bin/bash\nset -e\n' + DEPENDENCY_INSTALL_SCRIPT + 'shutdown -h now\n'
+
+# Server profile used on the instances, see app/server.py for the available profiles
+SERVER_PROFILE = 'tuned'
+
 PROJECT_NAME = 'LOG8415E-TP1'
 DEFAULT_AMI_ID = "ami-0c02fb55956c7d316"
 
@@ -59,4 +44,33 @@ CLUSTER_CONFIGS = {
         'count': 4,
         'name': 'Cluster2'
     }
-}
\ No newline at end of file
+}
+
+# ALB listener: requests matching a rule's path pattern (checked in priority order) go to its target
+# group, anything else is split between the target groups by weight. Shared by create_alb.py and the
+# local proxy in local_cluster/alb_proxy.py.
+LISTENER_CONFIG = {
+    'default_weights': {
+        'cluster1': 1,
+        'cluster2': 1
+    },
+    'rules': [
+        {'priority': 100, 'path_pattern': '/cluster1*', 'target_group': 'cluster1'},
+        {'priority': 200, 'path_pattern': '/cluster2*', 'target_group': 'cluster2'}
+    ]
+}
+
+# Local stand-ins for the clusters (local_cluster/cluster_harness.py): CPUs each app copy is pinned to,
+# share of CPU time it may use, and extra latency per request in ms
+LOCAL_CLUSTER_CONFIGS = {
+    'cluster1': {
+        'cpus': 2,
+        'cpu_quota': 1.0,
+        'latency_ms': 0.0
+    },
+    'cluster2': {
+        'cpus': 1,
+        'cpu_quota': 1.0,
+        'latency_ms': 0.0
+    }
+}
@@ -1,43 +1,27 @@
 import boto3
 import json
+import os
+import sys
+import time
+from botocore.exceptions import ClientError
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from constants import CLUSTER_CONFIGS, LISTENER_CONFIG
+from aws_automation.inventory import Inventory, split_clusters
+
 class ALBManager:
     def __init__(self):
         self.ec2_client = boto3.client('ec2')
         self.elbv2_client = boto3.client('elbv2')
         self.project_name = 'LOG8415E-TP1'
+        self.inventory = Inventory(ec2_client=self.ec2_client, elbv2_client=self.elbv2_client)
         print(f"ALB Manager initialized for {self.project_name}")
 
     def get_project_instances(self):
-        response = self.ec2_client.describe_instances(
-            Filters=[
-                {'Name': 'tag:Project', 'Values': [self.project_name]},
-                {'Name': 'instance-state-name', 'Values': ['running']}
-            ]
-        )
-        
-        cluster1_instances = []
-        cluster2_instances = []
-        
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_data = {
-                    'InstanceId': instance['InstanceId'],
-                    'PublicDnsName': instance.get('PublicDnsName', ''),
-                    'PublicIpAddress': instance.get('PublicIpAddress', '')
-                }
-                
-                cluster = 'unknown'
-                for tag in instance.get('Tags', []):
-                    if tag['Key'] == 'Cluster':
-                        cluster = tag['Value']
-                        break
-                
-                if cluster == 'cluster1':
-                    cluster1_instances.append(instance_data)
-                elif cluster == 'cluster2':
-                    cluster2_instances.append(instance_data)
+        clusters = split_clusters(self.inventory.get_instances())
+        cluster1_instances = clusters['cluster1']
+        cluster2_instances = clusters['cluster2']
         
         print(f"Found Cluster1: {len(cluster1_instances)} instances, Cluster2: {len(cluster2_instances)} instances")
         return cluster1_instances, cluster2_instances
@@ -56,41 +40,30 @@ class ALBManager:
         return vpc_id, subnet_ids
 
     def get_security_group_id(self):
-        groups = self.ec2_client.describe_security_groups(
-            Filters=[{'Name': 'group-name', 'Values': [f'{self.project_name}-SG']}]
-        )
-        return groups['SecurityGroups'][0]['GroupId']
+        security_group_id = self.inventory.get_security_group()
+        if security_group_id is None:
+            raise ValueError(f"Security group {self.project_name}-SG not found. Run setup_aws.py first.")
+        return security_group_id
 
-    def create_target_groups(self, vpc_id):
-        target_groups = {}
-        
-        response1 = self.elbv2_client.create_target_group(
-            Name=f'{self.project_name}-Cluster1-TG',
+    def create_target_group(self, cluster, vpc_id):
+        response = self.elbv2_client.create_target_group(
+            Name=f"{self.project_name}-{CLUSTER_CONFIGS[cluster]['name']}-TG",
             Protocol='HTTP',
             Port=8000,
             VpcId=vpc_id,
             HealthCheckPath='/health',
-            HealthCheckIntervalSeconds=30,
+            # Two passing checks mark a target healthy, so the interval bounds how soon it can serve
+            HealthCheckIntervalSeconds=10,
             HealthyThresholdCount=2,
             UnhealthyThresholdCount=3
         )
-        target_groups['cluster1'] = response1['TargetGroups'][0]['TargetGroupArn']
-        print(f"Created cluster1 target group: {target_groups['cluster1']}")
-        
-        response2 = self.elbv2_client.create_target_group(
-            Name=f'{self.project_name}-Cluster2-TG',
-            Protocol='HTTP',
-            Port=8000,
-            VpcId=vpc_id,
-            HealthCheckPath='/health',
-            HealthCheckIntervalSeconds=30,
-            HealthyThresholdCount=2,
-            UnhealthyThresholdCount=3
-        )
-        target_groups['cluster2'] = response2['TargetGroups'][0]['TargetGroupArn']
-        print(f"Created cluster2 target group: {target_groups['cluster2']}")
-        
-        return target_groups
+        target_group_arn = response['TargetGroups'][0]['TargetGroupArn']
+        self.inventory.set_target_group(cluster, target_group_arn)
+        print(f"Created {cluster} target group: {target_group_arn}")
+        return target_group_arn
+
+    def create_target_groups(self, vpc_id):
+        return {cluster: self.create_target_group(cluster, vpc_id) for cluster in CLUSTER_CONFIGS}
 
     def register_targets(self, target_groups, cluster1_instances, cluster2_instances):        
         if cluster1_instances:
@@ -109,6 +82,35 @@ class ALBManager:
             )
             print(f"Registered {len(targets2)} cluster2 targets")
 
+    def register_when_running(self, cluster, target_group_arn, instance_ids, poll_interval=3, timeout=600):
+        """Register instances with their target group one by one as they reach the running state"""
+        pending = set(instance_ids)
+        deadline = time.monotonic() + timeout
+        while pending:
+            try:
+                response = self.ec2_client.describe_instances(InstanceIds=sorted(pending))
+                running = [
+                    instance['InstanceId'] for reservation in response['Reservations']
+                    for instance in reservation['Instances'] if instance['State']['Name'] == 'running'
+                ]
+            except ClientError as e:
+                # Freshly launched instances can be missing from describe_instances for a few seconds
+                if e.response['Error']['Code'] != 'InvalidInstanceID.NotFound':
+                    raise
+                running = []
+            
+            if running:
+                self.elbv2_client.register_targets(
+                    TargetGroupArn=target_group_arn,
+                    Targets=[{'Id': instance_id} for instance_id in running]
+                )
+                pending.difference_update(running)
+                print(f"Registered {len(running)} {cluster} targets, {len(pending)} still starting")
+            if pending:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{cluster} instances not running after {timeout}s: {sorted(pending)}")
+                time.sleep(poll_interval)
+
     def create_load_balancer(self, subnet_ids, security_group_id):
         response = self.elbv2_client.create_load_balancer(
             Name=f'{self.project_name}-ALB',
@@ -122,6 +124,7 @@ class ALBManager:
         alb = response['LoadBalancers'][0]
         alb_arn = alb['LoadBalancerArn']
         alb_dns = alb['DNSName']
+        self.inventory.set_load_balancer(alb_arn, alb_dns)
         
         print(f"Created ALB: {alb_dns}")
         return alb_arn, alb_dns
@@ -137,13 +140,10 @@ class ALBManager:
                     'ForwardConfig': {
                         'TargetGroups': [
                             {
-                                'TargetGroupArn': target_groups['cluster1'],
-                                'Weight': 1
-                            },
-                            {
-                                'TargetGroupArn': target_groups['cluster2'],
-                                'Weight': 1
+                                'TargetGroupArn': target_groups[cluster],
+                                'Weight': weight
                             }
+                            for cluster, weight in LISTENER_CONFIG['default_weights'].items()
                         ],
                         'TargetGroupStickinessConfig': {
                             'Enabled': False
@@ -155,32 +155,20 @@ class ALBManager:
         
         listener_arn = response['Listeners'][0]['ListenerArn']
         print(f"Created listener: {listener_arn}")
-        self.elbv2_client.create_rule(
-            ListenerArn=listener_arn,
-            Priority=100,
-            Conditions=[{
-                'Field': 'path-pattern',
-                'Values': ['/cluster1*']
-            }],
-            Actions=[{
-                'Type': 'forward',
-                'TargetGroupArn': target_groups['cluster1']
-            }]
-        )
-        print("Created rule for /cluster1 -> cluster1 target group")
-        self.elbv2_client.create_rule(
-            ListenerArn=listener_arn,
-            Priority=200,
-            Conditions=[{
-                'Field': 'path-pattern',
-                'Values': ['/cluster2*']
-            }],
-            Actions=[{
-                'Type': 'forward',
-                'TargetGroupArn': target_groups['cluster2']
-            }]
-        )
-        print("Created rule for /cluster2 -> cluster2 target group")
+        for rule in LISTENER_CONFIG['rules']:
+            self.elbv2_client.create_rule(
+                ListenerArn=listener_arn,
+                Priority=rule['priority'],
+                Conditions=[{
+                    'Field': 'path-pattern',
+                    'Values': [rule['path_pattern']]
+                }],
+                Actions=[{
+                    'Type': 'forward',
+                    'TargetGroupArn': target_groups[rule['target_group']]
+                }]
+            )
+            print(f"Created rule for {rule['path_pattern'].rstrip('*')} -> {rule['target_group']} target group")
         
         return listener_arn
 
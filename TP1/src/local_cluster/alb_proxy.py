@@ -0,0 +1,264 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import time
+from fnmatch import fnmatchcase
+
+import aiohttp
+from aiohttp import web
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from benchmarking.latency_histogram import LatencyHistogram, REPORTED_PERCENTILES
+from constants import LISTENER_CONFIG
+
+STATS_PATH = '/_alb/stats'
+
+# Per-connection headers that must not be forwarded by a proxy
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te', 'trailers',
+    'transfer-encoding', 'upgrade', 'content-length', 'content-encoding', 'host'
+}
+
+class Target:
+    """One backend with the live state the balancing algorithms read"""
+
+    def __init__(self, url, target_group):
+        self.url = url.rstrip('/')
+        self.target_group = target_group
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.ewma_ms = None
+        self.histogram = LatencyHistogram()
+
+    def record(self, latency_ms, failed, alpha=0.2):
+        self.requests += 1
+        if failed:
+            self.errors += 1
+            return
+        self.histogram.record(latency_ms)
+        self.ewma_ms = latency_ms if self.ewma_ms is None else alpha * latency_ms + (1 - alpha) * self.ewma_ms
+
+    def stats(self):
+        stats = {
+            'target_group': self.target_group,
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_response_time': self.histogram.mean()
+        }
+        for name, percentile in REPORTED_PERCENTILES.items():
+            stats[f'{name}_response_time'] = self.histogram.percentile(percentile)
+        return stats
+
+class RoundRobin:
+    def __init__(self, targets):
+        self.targets = targets
+        self.next_index = 0
+
+    def choose(self):
+        target = self.targets[self.next_index % len(self.targets)]
+        self.next_index += 1
+        return target
+
+class LeastOutstandingRequests:
+    """Fewest requests in flight, ties broken in rotation like the ALB does"""
+
+    def __init__(self, targets):
+        self.targets = targets
+        self.next_index = 0
+
+    def choose(self):
+        self.next_index += 1
+        count = len(self.targets)
+        rotated = [self.targets[(self.next_index + i) % count] for i in range(count)]
+        return min(rotated, key=lambda target: target.outstanding)
+
+class PowerOfTwoChoices:
+    """Fewer requests in flight of two random targets: close to least outstanding without scanning every target"""
+
+    def __init__(self, targets):
+        self.targets = targets
+
+    def choose(self):
+        if len(self.targets) == 1:
+            return self.targets[0]
+        first, second = random.sample(self.targets, 2)
+        return first if first.outstanding <= second.outstanding else second
+
+class LatencyWeighted:
+    """Random choice weighted by the inverse of each target's recent (EWMA) latency"""
+
+    def __init__(self, targets):
+        self.targets = targets
+
+    def choose(self):
+        measured = [target.ewma_ms for target in self.targets if target.ewma_ms is not None]
+        # Targets without samples yet get the best known latency so they are tried
+        default = min(measured) if measured else 1.0
+        weights = [1 / max(target.ewma_ms if target.ewma_ms is not None else default, 0.01) for target in self.targets]
+        return random.choices(self.targets, weights)[0]
+
+BALANCING_ALGORITHMS = {
+    'round-robin': RoundRobin,
+    'least-outstanding': LeastOutstandingRequests,
+    'power-of-two': PowerOfTwoChoices,
+    'latency-weighted': LatencyWeighted
+}
+
+class ALBProxy:
+    def __init__(self, target_groups, algorithm='round-robin', listener_config=None):
+        """Proxy for {target group: [instance url]} routed like the ALB listener"""
+        if algorithm not in BALANCING_ALGORITHMS:
+            raise ValueError(f"Unknown algorithm '{algorithm}', expected one of {sorted(BALANCING_ALGORITHMS)}")
+        self.algorithm = algorithm
+        self.listener_config = listener_config or LISTENER_CONFIG
+        self.targets = {
+            name: [Target(url, name) for url in urls] for name, urls in target_groups.items() if urls
+        }
+        self.balancers = {name: BALANCING_ALGORITHMS[algorithm](targets) for name, targets in self.targets.items()}
+        self.rules = sorted(self.listener_config['rules'], key=lambda rule: rule['priority'])
+        # Groups without targets or weight are never picked, so they are left out of the default pick
+        self.default_groups = [
+            name for name, weight in self.listener_config['default_weights'].items() if name in self.targets and weight > 0
+        ]
+        self.default_weights = [self.listener_config['default_weights'][name] for name in self.default_groups]
+        self.session = None
+        self.runner = None
+
+    def route(self, path):
+        """Target group for a request path: first matching rule, else a weighted pick among the default groups
+
+        None when no rule matches and no default group has targets.
+        """
+        for rule in self.rules:
+            if fnmatchcase(path, rule['path_pattern']):
+                return rule['target_group']
+        if not self.default_groups:
+            return None
+        return random.choices(self.default_groups, self.default_weights)[0]
+
+    async def handle(self, request):
+        if request.path == STATS_PATH:
+            return web.json_response(self.stats())
+
+        target_group = self.route(request.path)
+        if target_group is None:
+            # Like the ALB, a request nothing can serve gets a 503 rather than an error
+            return web.Response(status=503, text=f"No rule matches {request.path} and no default target group has targets")
+        if target_group not in self.balancers:
+            return web.Response(status=503, text=f"No targets in target group {target_group}")
+        target = self.balancers[target_group].choose()
+
+        headers = {name: value for name, value in request.headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+        headers['X-Forwarded-For'] = request.remote or ''
+        body = await request.read()
+
+        target.outstanding += 1
+        start_time = time.perf_counter()
+        try:
+            async with self.session.request(request.method, target.url + request.path_qs, headers=headers,
+                                            data=body or None, allow_redirects=False) as response:
+                payload = await response.read()
+                response_headers = {
+                    name: value for name, value in response.headers.items() if name.lower() not in HOP_BY_HOP_HEADERS
+                }
+                status = response.status
+        except Exception as e:
+            target.record((time.perf_counter() - start_time) * 1000, True)
+            return web.Response(status=502, text=f"Target {target.url} failed: {type(e).__name__}")
+        finally:
+            target.outstanding -= 1
+
+        target.record((time.perf_counter() - start_time) * 1000, status >= 500)
+        return web.Response(status=status, body=payload, headers=response_headers)
+
+    async def start(self, host='127.0.0.1', port=8080):
+        connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60))
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        print(f"ALB proxy on http://{host}:{port} ({self.algorithm}, "
+              f"{sum(len(targets) for targets in self.targets.values())} targets)")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+        if self.session:
+            await self.session.close()
+
+    def stats(self):
+        """Per-target request counts and latency, grouped by target group"""
+        stats = {'algorithm': self.algorithm, 'target_groups': {}}
+        for name, targets in self.targets.items():
+            stats['target_groups'][name] = {target.url: target.stats() for target in targets}
+        return stats
+
+    def print_stats(self):
+        print("\n" + "="*60)
+        print(f"ALB PROXY TARGETS ({self.algorithm})")
+        print("="*60)
+        for name, targets in self.targets.items():
+            total = sum(target.requests for target in targets) or 1
+            for target in targets:
+                stats = target.stats()
+                print(f"  • {name} {target.url}: {stats['requests']} requests ({stats['requests'] / total:.0%}), "
+                      f"{stats['errors']} errors, avg {stats['avg_response_time']:.2f}ms, "
+                      f"p50 {stats['p50_response_time']:.2f}ms, p99 {stats['p99_response_time']:.2f}ms")
+
+def load_target_groups(deployment_file='deployment_info.json'):
+    """Target groups from deployment_info.json: one per cluster, with the instance endpoints"""
+    with open(deployment_file, 'r') as f:
+        deployment = json.load(f)
+    return deployment.get('endpoints', {})
+
+def run_proxy(target_groups, algorithm, host='127.0.0.1', port=8080, stats_file=None):
+    """Serve until SIGINT/SIGTERM, then print and optionally save the per-target stats"""
+    async def serve():
+        proxy = ALBProxy(target_groups, algorithm)
+        await proxy.start(host, port)
+        stopped = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopped.set)
+        await stopped.wait()
+        await proxy.stop()
+        proxy.print_stats()
+        if stats_file:
+            with open(stats_file, 'w') as f:
+                json.dump(proxy.stats(), f, indent=2)
+            print(f"Proxy stats saved to {stats_file}")
+
+    asyncio.run(serve())
+
+def start_proxy_process(target_groups, algorithm, host='127.0.0.1', port=8080, stats_file=None):
+    """Run the proxy in its own process so it never competes with the benchmark's event loop"""
+    process = multiprocessing.Process(target=run_proxy, args=(target_groups, algorithm, host, port, stats_file))
+    process.start()
+    time.sleep(1)
+    return process
+
+def main():
+    parser = argparse.ArgumentParser(description='Local reverse proxy with the ALB listener rules')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--algorithm', choices=sorted(BALANCING_ALGORITHMS), default='round-robin')
+    parser.add_argument('--deployment', default='deployment_info.json', help='Targets, as written by setup_aws.py')
+    parser.add_argument('--stats-file', default='alb_proxy_stats.json')
+    args = parser.parse_args()
+
+    try:
+        run_proxy(load_target_groups(args.deployment), args.algorithm, args.host, args.port, args.stats_file)
+    except Exception as e:
+        print(f"Error: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from constants import PROJECT_NAME, CLUSTER_CONFIGS, LOCAL_CLUSTER_CONFIGS, SERVER_PROFILE
+from local_cluster.alb_proxy import BALANCING_ALGORITHMS, start_proxy_process
+from local_cluster.local_app import start_app, stop_app, wait_until_healthy
+
+class CpuThrottle(threading.Thread):
+    """Caps a process group to a share of CPU time by pausing it for part of every period, like a CPU quota"""
+
+    def __init__(self, process, quota, period=0.1):
+        super().__init__(daemon=True)
+        if not hasattr(signal, 'SIGSTOP'):
+            raise ValueError("CPU quotas need SIGSTOP/SIGCONT, which this platform does not have")
+        self.process = process
+        self.quota = quota
+        self.period = period
+        self.stopped = threading.Event()
+
+    def run(self):
+        running = self.quota * self.period
+        paused = self.period - running
+        try:
+            while not self.stopped.wait(running):
+                os.killpg(self.process.pid, signal.SIGSTOP)
+                time.sleep(paused)
+                os.killpg(self.process.pid, signal.SIGCONT)
+        except ProcessLookupError:
+            pass
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        try:
+            os.killpg(self.process.pid, signal.SIGCONT)
+        except ProcessLookupError:
+            pass
+
+class LocalCluster:
+    def __init__(self, count=None, base_port=8000, profile=SERVER_PROFILE, cluster_configs=None):
+        """Initialize the local cluster harness"""
+        self.count = count
+        self.base_port = base_port
+        self.profile = profile
+        self.cluster_configs = cluster_configs or LOCAL_CLUSTER_CONFIGS
+        self.instances = {'cluster1': [], 'cluster2': []}
+        self.processes = []
+        self.throttles = []
+        self.alb_process = None
+        print(f"Local cluster initialized (server profile: {profile})")
+
+    def pick_cpus(self, count, offset):
+        """Spread instances over the host CPUs, `count` consecutive CPUs each"""
+        if not hasattr(os, 'sched_getaffinity'):
+            return None
+        host_cpus = sorted(os.sched_getaffinity(0))
+        count = min(count, len(host_cpus))
+        return {host_cpus[(offset + i) % len(host_cpus)] for i in range(count)}
+
+    def start(self):
+        """Start every app copy and wait until all of them answer /health"""
+        port = self.base_port
+        cpu_offset = 0
+        for cluster, config in self.cluster_configs.items():
+            count = self.count or CLUSTER_CONFIGS[cluster]['count']
+            for i in range(count):
+                instance_id = f"i-local-{cluster}-{i+1}"
+                cpus = self.pick_cpus(config['cpus'], cpu_offset)
+                cpu_offset += config['cpus']
+                extra_env = {}
+                if config['latency_ms'] or config.get('jitter_ms'):
+                    extra_env['APP_INJECT_LATENCY_MS'] = str(config['latency_ms'])
+                    extra_env['APP_INJECT_JITTER_MS'] = str(config.get('jitter_ms', 0))
+
+                process = start_app(port, self.profile, cluster, instance_id, extra_env=extra_env, cpus=cpus)
+                self.processes.append(process)
+                if config['cpu_quota'] < 1:
+                    throttle = CpuThrottle(process, config['cpu_quota'])
+                    throttle.start()
+                    self.throttles.append(throttle)
+
+                self.instances[cluster].append({
+                    'InstanceId': instance_id,
+                    'PublicDnsName': f"127.0.0.1:{port}",
+                    'PublicIpAddress': '127.0.0.1',
+                    'State': 'running',
+                    'InstanceType': CLUSTER_CONFIGS[cluster]['instance_type'],
+                    'Cluster': cluster,
+                    'Cpus': sorted(cpus) if cpus else None,
+                    'CpuQuota': config['cpu_quota'],
+                    'InjectedLatencyMs': config['latency_ms']
+                })
+                port += 1
+
+        print("Waiting for the local instances to be healthy...")
+        for instance in self.instances['cluster1'] + self.instances['cluster2']:
+            if not wait_until_healthy(f"http://{instance['PublicDnsName']}"):
+                raise RuntimeError(f"{instance['InstanceId']} did not become healthy on {instance['PublicDnsName']}")
+        print("All local instances are healthy!")
+
+    def start_alb(self, port, algorithm):
+        """Put the local ALB proxy in front of the instances and return its address"""
+        target_groups = {
+            cluster: [f"http://{i['PublicDnsName']}" for i in instances] for cluster, instances in self.instances.items()
+        }
+        self.alb_process = start_proxy_process(target_groups, algorithm, port=port, stats_file='alb_proxy_stats.json')
+        return f"127.0.0.1:{port}"
+
+    def save_deployment_info(self):
+        """Write deployment_info.json in the format produced by setup_aws.py"""
+        cluster1_instances = self.instances['cluster1']
+        cluster2_instances = self.instances['cluster2']
+        info = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'project': PROJECT_NAME,
+            'local': True,
+            'clusters': {
+                'cluster1': cluster1_instances,
+                'cluster2': cluster2_instances
+            },
+            'total_instances': len(cluster1_instances) + len(cluster2_instances),
+            'endpoints': {
+                'cluster1': [f"http://{i['PublicDnsName']}" for i in cluster1_instances],
+                'cluster2': [f"http://{i['PublicDnsName']}" for i in cluster2_instances]
+            }
+        }
+
+        with open('deployment_info.json', 'w') as f:
+            json.dump(info, f, indent=2)
+        print("Saved deployment info to deployment_info.json")
+
+    def save_alb_info(self, alb_address=None):
+        """Write alb_info.json in the format produced by create_alb.py, pointing at alb_address"""
+        cluster1_instances = self.instances['cluster1']
+        cluster2_instances = self.instances['cluster2']
+        if alb_address:
+            endpoints = {
+                'root': f'http://{alb_address}',
+                'cluster1': f'http://{alb_address}/cluster1',
+                'cluster2': f'http://{alb_address}/cluster2'
+            }
+        else:
+            # Without a load balancer each path goes straight to the first instance of its cluster
+            first1 = cluster1_instances[0]['PublicDnsName']
+            first2 = cluster2_instances[0]['PublicDnsName']
+            endpoints = {
+                'root': f'http://{first1}',
+                'cluster1': f'http://{first1}/cluster1',
+                'cluster2': f'http://{first2}/cluster2'
+            }
+        info = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'project': PROJECT_NAME,
+            'local': True,
+            'alb_dns': alb_address,
+            'endpoints': endpoints,
+            'clusters': {
+                'cluster1': cluster1_instances,
+                'cluster2': cluster2_instances
+            },
+            'total_instances': len(cluster1_instances) + len(cluster2_instances)
+        }
+
+        with open('alb_info.json', 'w') as f:
+            json.dump(info, f, indent=2)
+        print(f"ALB info saved to alb_info.json (root: {endpoints['root']})")
+
+    def stop(self):
+        if self.alb_process:
+            # The proxy prints and saves its per-target stats when it is terminated
+            self.alb_process.terminate()
+            self.alb_process.join()
+        for throttle in self.throttles:
+            throttle.stop()
+        for process in self.processes:
+            stop_app(process)
+        print(f"Stopped {len(self.processes)} local instances")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the clusters on localhost and write the files run_benchmark.py reads')
+    parser.add_argument('--count', type=int, default=None, help='Instances per cluster (default: as in CLUSTER_CONFIGS)')
+    parser.add_argument('--base-port', type=int, default=8000, help='Port of the first instance, the others follow')
+    parser.add_argument('--profile', default=SERVER_PROFILE, help='Server profile of every instance')
+    parser.add_argument('--alb-port', type=int, default=8080, help='Port of the local ALB proxy (0 to run without it)')
+    parser.add_argument('--algorithm', choices=sorted(BALANCING_ALGORITHMS), default='round-robin',
+                        help='Balancing algorithm of the local ALB proxy within a target group')
+    for cluster, config in LOCAL_CLUSTER_CONFIGS.items():
+        parser.add_argument(f'--{cluster}-cpus', type=int, default=config['cpus'],
+                            help=f"CPUs each {cluster} instance is pinned to")
+        parser.add_argument(f'--{cluster}-cpu-quota', type=float, default=config['cpu_quota'],
+                            help=f"Share of CPU time each {cluster} instance may use (0-1)")
+        parser.add_argument(f'--{cluster}-latency-ms', type=float, default=config['latency_ms'],
+                            help=f"Extra latency added to every {cluster} response")
+        parser.add_argument(f'--{cluster}-jitter-ms', type=float, default=0.0,
+                            help=f"Random extra latency of up to this much on {cluster} responses")
+    args = parser.parse_args()
+
+    args.cluster_configs = {}
+    for cluster in LOCAL_CLUSTER_CONFIGS:
+        quota = getattr(args, f'{cluster}_cpu_quota')
+        if not 0 < quota <= 1:
+            parser.error(f"--{cluster}-cpu-quota must be in (0, 1]")
+        args.cluster_configs[cluster] = {
+            'cpus': getattr(args, f'{cluster}_cpus'),
+            'cpu_quota': quota,
+            'latency_ms': getattr(args, f'{cluster}_latency_ms'),
+            'jitter_ms': getattr(args, f'{cluster}_jitter_ms')
+        }
+    return args
+
+def main():
+    args = parse_args()
+    cluster = LocalCluster(args.count, args.base_port, args.profile, args.cluster_configs)
+    # Stop the instances on SIGTERM too, not only on Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        print("Starting Local Cluster")
+        cluster.start()
+        cluster.save_deployment_info()
+        alb_address = cluster.start_alb(args.alb_port, args.algorithm) if args.alb_port else None
+        cluster.save_alb_info(alb_address)
+
+        print("\nLocal cluster is running, benchmark it from this directory with run_benchmark.py")
+        print("Press Ctrl+C to stop")
+        while True:
+            time.sleep(1)
+
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error: {e}")
+        raise
+    finally:
+        cluster.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeMetadataHandler(BaseHTTPRequestHandler):
+    """Minimal IMDSv2 emulation: PUT /latest/api/token then GET metadata with the token"""
+
+    def do_PUT(self):
+        self.server.request_counts['token'] += 1
+        if self.path != '/latest/api/token' or 'X-aws-ec2-metadata-token-ttl-seconds' not in self.headers:
+            self._reply(400, 'missing token ttl')
+            return
+        token = uuid.uuid4().hex
+        self.server.tokens.add(token)
+        self._reply(200, token)
+
+    def do_GET(self):
+        self.server.request_counts['metadata'] += 1
+        token = self.headers.get('X-aws-ec2-metadata-token')
+        if self.server.require_token and token not in self.server.tokens:
+            self._reply(401, 'unauthorized')
+            return
+        if self.path == '/latest/meta-data/instance-id':
+            self._reply(200, self.server.instance_id)
+        else:
+            self._reply(404, 'not found')
+
+    def _reply(self, status, body):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def create_server(port=0, instance_id='i-0fake0000000000000', require_token=True):
+    """Create a fake metadata server; port 0 picks a free port (see server.server_address)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeMetadataHandler)
+    server.instance_id = instance_id
+    server.require_token = require_token
+    server.tokens = set()
+    server.request_counts = {'token': 0, 'metadata': 0}
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake EC2 instance metadata service for local runs')
+    parser.add_argument('--port', type=int, default=1338)
+    parser.add_argument('--instance-id', default='i-0fake0000000000000')
+    parser.add_argument('--allow-imdsv1', action='store_true', help='Serve metadata without a session token')
+    args = parser.parse_args()
+
+    server = create_server(args.port, args.instance_id, not args.allow_imdsv1)
+    print(f"Fake metadata service on http://127.0.0.1:{args.port} (instance {args.instance_id})")
+    print(f"Run the app with METADATA_ENDPOINT=http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+APP_SERVER = os.path.join(os.path.dirname(__file__), '..', 'app', 'server.py')
+
+def start_app(port, profile='baseline', cluster_name='local', instance_id='i-local', workers=None, extra_env=None, cpus=None):
+    """Start one copy of the cluster app on localhost and return the process, pinned to `cpus` when given"""
+    env = dict(os.environ)
+    env.update({
+        'CLUSTER_NAME': cluster_name,
+        'INSTANCE_ID_FALLBACK': instance_id,
+        # Nothing listens on port 1, so the metadata lookup fails fast and the fallback id is used
+        'METADATA_ENDPOINT': 'http://127.0.0.1:1',
+    })
+    env.update(extra_env or {})
+
+    command = [sys.executable, APP_SERVER, '--profile', profile, '--host', '127.0.0.1', '--port', str(port)]
+    if workers is not None:
+        command += ['--workers', str(workers)]
+
+    preexec_fn = None
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        # Set before exec so the uvicorn workers inherit the affinity and size themselves to it
+        preexec_fn = lambda: os.sched_setaffinity(0, cpus)
+
+    # Own process group, so the app and its workers can be paused and resumed together
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            preexec_fn=preexec_fn, start_new_session=True)
+
+def wait_until_healthy(url, timeout=30):
+    """Poll /health until the app answers or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+def stop_app(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
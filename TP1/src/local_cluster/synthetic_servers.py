@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import time
+
+def build_response(instance_id='i-synthetic', cluster='local'):
+    body = json.dumps({"instance_id": instance_id, "cluster": cluster}).encode()
+    head = f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+    return head.encode() + body
+
+class NullHttpProtocol(asyncio.Protocol):
+    """Answers every keep-alive GET with the same canned response, without parsing beyond the header end"""
+
+    def __init__(self, response):
+        self.response = response
+        self.buffer = b''
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        while True:
+            end = self.buffer.find(b'\r\n\r\n')
+            if end < 0:
+                break
+            self.buffer = self.buffer[end + 4:]
+            self.transport.write(self.response)
+
+async def stall_periodically(stall_every, stall_ms):
+    """Block the whole event loop for stall_ms every stall_every seconds, like a GC pause or a throttled CPU"""
+    while True:
+        await asyncio.sleep(stall_every)
+        time.sleep(stall_ms / 1000)
+
+async def serve(port, stall_every=0.0, stall_ms=0.0, instance_id='i-synthetic'):
+    loop = asyncio.get_event_loop()
+    response = build_response(instance_id)
+    # With SO_REUSEPORT several server processes share the port and the kernel spreads connections
+    reuse_port = hasattr(socket, 'SO_REUSEPORT')
+    server = await loop.create_server(
+        lambda: NullHttpProtocol(response), '127.0.0.1', port, reuse_address=True, reuse_port=reuse_port
+    )
+    if stall_every > 0 and stall_ms > 0:
+        asyncio.ensure_future(stall_periodically(stall_every, stall_ms))
+    async with server:
+        await server.serve_forever()
+
+def run_server(port, stall_every=0.0, stall_ms=0.0, instance_id='i-synthetic'):
+    try:
+        asyncio.run(serve(port, stall_every, stall_ms, instance_id))
+    except KeyboardInterrupt:
+        pass
+
+def start_server_process(port, stall_every=0.0, stall_ms=0.0, instance_id='i-synthetic'):
+    """Run a synthetic server in its own process so it never shares a CPU-bound loop with the client"""
+    process = multiprocessing.Process(target=run_server, args=(port, stall_every, stall_ms, instance_id), daemon=True)
+    process.start()
+    time.sleep(0.5)
+    return process
+
+def main():
+    parser = argparse.ArgumentParser(description='Minimal HTTP server for load generator experiments')
+    parser.add_argument('--port', type=int, default=8300)
+    parser.add_argument('--stall-every', type=float, default=0.0, help='Seconds between injected stalls (0 disables)')
+    parser.add_argument('--stall-ms', type=float, default=0.0, help='Length of each injected stall')
+    parser.add_argument('--processes', type=int, default=1, help='Server processes sharing the port')
+    args = parser.parse_args()
+
+    print(f"Synthetic server on http://127.0.0.1:{args.port} ({args.processes} processes)")
+    processes = [start_server_process(args.port, args.stall_every, args.stall_ms) for _ in range(args.processes - 1)]
+    try:
+        run_server(args.port, args.stall_every, args.stall_ms)
+    finally:
+        for process in processes:
+            process.terminate()
+
+if __name__ == "__main__":
+    main()
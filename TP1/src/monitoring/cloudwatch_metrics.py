@@ -1,140 +1,414 @@
+import argparse
 import boto3
 import json
+import os
+import sys
+import urllib.request
 from datetime import datetime, timedelta, timezone
+from metrics_cache import CACHE_FILE, MetricsCache
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from aws_automation.inventory import Inventory
+
+# Labels and result keys of benchmark_results.json, in the order run_benchmark.py reports them
+BENCHMARK_TARGETS = (
+    ('alb_cluster1', 'ALB Cluster1'),
+    ('alb_cluster2', 'ALB Cluster2'),
+    ('direct_cluster1', 'Direct Cluster1'),
+    ('direct_cluster2', 'Direct Cluster2')
+)
+
+# Result key -> (namespace, metric name, statistics) collected per instance and for the ALB
+EC2_METRICS = {
+    'cpu_utilization': ('AWS/EC2', 'CPUUtilization', ('Average', 'Maximum')),
+    'network_in': ('AWS/EC2', 'NetworkIn', ('Sum',)),
+    'network_out': ('AWS/EC2', 'NetworkOut', ('Sum',))
+}
+
+ALB_METRICS = {
+    'request_count': ('AWS/ApplicationELB', 'RequestCount', ('Sum',)),
+    'response_time': ('AWS/ApplicationELB', 'TargetResponseTime', ('Average',)),
+    'healthy_hosts': ('AWS/ApplicationELB', 'HealthyHostCount', ('Average',))
+}
+
+# Per target group, with both the LoadBalancer and TargetGroup dimensions. Percentiles of one period
+# are exact; over several periods they are combined weighted by each period's request count.
+TARGET_GROUP_METRICS = {
+    'request_count': ('AWS/ApplicationELB', 'RequestCount', ('Sum',)),
+    'response_time': ('AWS/ApplicationELB', 'TargetResponseTime', ('Average', 'p50', 'p90', 'p99')),
+    'http_2xx': ('AWS/ApplicationELB', 'HTTPCode_Target_2XX_Count', ('Sum',)),
+    'http_3xx': ('AWS/ApplicationELB', 'HTTPCode_Target_3XX_Count', ('Sum',)),
+    'http_4xx': ('AWS/ApplicationELB', 'HTTPCode_Target_4XX_Count', ('Sum',)),
+    'http_5xx': ('AWS/ApplicationELB', 'HTTPCode_Target_5XX_Count', ('Sum',)),
+    'connection_errors': ('AWS/ApplicationELB', 'TargetConnectionErrorCount', ('Sum',)),
+    'healthy_hosts': ('AWS/ApplicationELB', 'HealthyHostCount', ('Average',)),
+    'unhealthy_hosts': ('AWS/ApplicationELB', 'UnHealthyHostCount', ('Average',))
+}
+
+ALB_OWNER = 'alb'
+
+# The app's /telemetry endpoint, served on the instance port
+TELEMETRY_URL = 'http://{public_dns}:8000/telemetry?since={since}'
+
+# CPU share (busy plus steal) above which a telemetry sample counts as saturated
+SATURATION_PERCENT = 95
+
+# GetMetricData accepts at most 500 queries per call
+MAX_QUERIES_PER_CALL = 500
+
+class MetricQueryBatch:
+    """GetMetricData queries for many series, fetched in as few calls as possible and demultiplexed per owner"""
 
-class CloudWatchMonitor:
     def __init__(self):
+        self.queries = []
+        self.targets = {}
+
+    def add_metrics(self, owner, metrics, dimensions, period):
+        """One query per metric and statistic; GetMetricData returns a single statistic per query"""
+        for key, (namespace, metric_name, statistics) in metrics.items():
+            for stat in statistics:
+                query_id = f"q{len(self.queries)}"
+                self.queries.append({
+                    'Id': query_id,
+                    'MetricStat': {
+                        'Metric': {'Namespace': namespace, 'MetricName': metric_name, 'Dimensions': dimensions},
+                        'Period': period,
+                        'Stat': stat
+                    },
+                    'ReturnData': True
+                })
+                self.targets[query_id] = (owner, key, stat)
+
+    def fetch(self, cloudwatch, start_time, end_time, cache=None):
+        """{owner: {key: datapoints}}, datapoints shaped like get_metric_statistics ones with ISO timestamps
+
+        With a cache only the ranges it has not fetched yet are requested, and the result is read back from it.
+        """
+        values = {query['Id']: [] for query in self.queries}
+        ranges = {}
+        cached = 0
+        for query in self.queries:
+            missing = cache.missing_ranges(query, start_time, end_time) if cache else [(start_time, end_time)]
+            cached += not missing
+            for time_range in missing:
+                ranges.setdefault(time_range, []).append(query)
+        if cache:
+            print(f"  {cached} of {len(self.queries)} series already in {cache.path}")
+        
+        for (range_start, range_end), queries in ranges.items():
+            fetched = self.request(cloudwatch, queries, range_start, range_end)
+            for query in queries:
+                timestamps, series_values = fetched[query['Id']]
+                if cache:
+                    cache.store(query, timestamps, series_values, range_start, range_end)
+                else:
+                    values[query['Id']] = list(zip(timestamps, series_values))
+        
+        if cache:
+            cache.commit()
+            for query in self.queries:
+                values[query['Id']] = cache.load(query, start_time, end_time)
+        
+        series = {}
+        for owner, key, stat in self.targets.values():
+            series.setdefault(owner, {})[key] = {}
+        for query_id, points in values.items():
+            owner, key, stat = self.targets[query_id]
+            datapoints = series[owner][key]
+            for timestamp, value in points:
+                datapoints.setdefault(timestamp, {'Timestamp': timestamp.isoformat()})[stat] = value
+        
+        return {
+            owner: {key: [datapoints[timestamp] for timestamp in sorted(datapoints)] for key, datapoints in metrics.items()}
+            for owner, metrics in series.items()
+        }
+
+    def request(self, cloudwatch, queries, start_time, end_time):
+        """{query id: (timestamps, values)} over [start_time, end_time), in calls of up to 500 queries"""
+        fetched = {query['Id']: ([], []) for query in queries}
+        for offset in range(0, len(queries), MAX_QUERIES_PER_CALL):
+            request = {
+                'MetricDataQueries': queries[offset:offset + MAX_QUERIES_PER_CALL],
+                'StartTime': start_time,
+                'EndTime': end_time,
+                'ScanBy': 'TimestampAscending'
+            }
+            while True:
+                response = cloudwatch.get_metric_data(**request)
+                # A series can continue on the next page
+                for result in response['MetricDataResults']:
+                    timestamps, values = fetched[result['Id']]
+                    timestamps.extend(result['Timestamps'])
+                    values.extend(result['Values'])
+                if not response.get('NextToken'):
+                    break
+                request['NextToken'] = response['NextToken']
+        return fetched
+
+class CloudWatchMonitor:
+    def __init__(self, cache_file=CACHE_FILE):
         self.cloudwatch = boto3.client('cloudwatch')
+        self.cache = MetricsCache(cache_file) if cache_file else None
         self.ec2_client = boto3.client('ec2')
         self.elbv2_client = boto3.client('elbv2')
         self.project_name = 'LOG8415E-TP1'
+        self.inventory = Inventory(ec2_client=self.ec2_client, elbv2_client=self.elbv2_client)
+        self.instance_info = {}
         print(f"CloudWatch Monitor initialized for {self.project_name}")
 
-    def get_project_instances(self):
-        response = self.ec2_client.describe_instances(
-            Filters=[
-                {'Name': 'tag:Project', 'Values': [self.project_name]},
-                {'Name': 'instance-state-name', 'Values': ['running']}
-            ]
-        )
-        
+    def get_project_instances(self, refresh=False):
         instance_ids = []
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_ids.append(instance['InstanceId'])
+        for instance in self.inventory.get_instances(refresh=refresh):
+            instance_ids.append(instance['InstanceId'])
+            self.instance_info[instance['InstanceId']] = {
+                'cluster': instance['Cluster'],
+                'instance_type': instance['InstanceType'],
+                'vcpus': instance['VCpus'],
+                'public_dns': instance['PublicDnsName']
+            }
         
         print(f"Found {len(instance_ids)} instances to monitor")
         return instance_ids
 
     def get_alb_arn(self):
-        try:
-            response = self.elbv2_client.describe_load_balancers(
-                Names=[f'{self.project_name}-ALB']
-            )
-            alb_arn = response['LoadBalancers'][0]['LoadBalancerArn']
-            alb_name = alb_arn.split('/')[-3] + '/' + alb_arn.split('/')[-2] + '/' + alb_arn.split('/')[-1]
-            return alb_name
-        except:
+        alb = self.inventory.get_load_balancer()
+        if alb is None:
             print("ALB not found")
             return None
+        alb_arn = alb['LoadBalancerArn']
+        alb_name = alb_arn.split('/')[-3] + '/' + alb_arn.split('/')[-2] + '/' + alb_arn.split('/')[-1]
+        return alb_name
 
-    def convert_datapoints(self, datapoints):
-        """Convert datetime objects in datapoints to ISO format strings"""
-        converted = []
-        for dp in datapoints:
-            dp_copy = dp.copy()
-            if 'Timestamp' in dp_copy:
-                dp_copy['Timestamp'] = dp_copy['Timestamp'].isoformat()
-            converted.append(dp_copy)
-        return converted
+    def get_target_groups(self):
+        """{cluster: TargetGroup dimension value} of the project's target groups"""
+        arns = self.inventory.get_target_groups()
+        if not arns:
+            print("Target groups not found")
+        return {cluster: arn.split(':')[-1] for cluster, arn in arns.items()}
 
-    def get_ec2_metrics(self, instance_ids, period_minutes=5):
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(minutes=period_minutes)
-        
-        metrics_data = {}
+    def collect_metrics(self, instance_ids, alb_name, period_minutes=5, start_time=None, end_time=None, period=300, target_groups=None):
+        """EC2 metrics per instance and the ALB metrics, packed into as few get_metric_data calls as possible
+
+        With {cluster: TargetGroup dimension} target_groups the ALB metrics also hold a 'target_groups' entry per cluster.
+        """
+        if start_time is None:
+            end_time = datetime.now(timezone.utc)
+            start_time = end_time - timedelta(minutes=period_minutes)
         
+        batch = MetricQueryBatch()
         for instance_id in instance_ids:
-            print(f"Getting metrics for instance {instance_id}")
-            cpu_response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/EC2',
-                MetricName='CPUUtilization',
-                Dimensions=[{'Name': 'InstanceId', 'Value': instance_id}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=300,
-                Statistics=['Average', 'Maximum']
-            )
-            
-            network_in = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/EC2',
-                MetricName='NetworkIn',
-                Dimensions=[{'Name': 'InstanceId', 'Value': instance_id}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=300,
-                Statistics=['Sum']
-            )
+            batch.add_metrics(instance_id, EC2_METRICS, [{'Name': 'InstanceId', 'Value': instance_id}], period)
+        if alb_name:
+            batch.add_metrics(ALB_OWNER, ALB_METRICS, [{'Name': 'LoadBalancer', 'Value': alb_name}], period)
+            for cluster, target_group in (target_groups or {}).items():
+                dimensions = [{'Name': 'LoadBalancer', 'Value': alb_name}, {'Name': 'TargetGroup', 'Value': target_group}]
+                batch.add_metrics((ALB_OWNER, cluster), TARGET_GROUP_METRICS, dimensions, period)
+        
+        print(f"Getting {len(batch.queries)} metric series for {len(instance_ids)} instances" + (" and the ALB" if alb_name else ""))
+        # Only whole periods are cached: CloudWatch buckets other ranges from their own start, so their
+        # datapoints would not line up with those of other requests
+        aligned = start_time.timestamp() % period == 0 and end_time.timestamp() % period == 0
+        cache = self.cache if aligned else None
+        metrics_data = batch.fetch(self.cloudwatch, start_time, end_time, cache)
+        alb_metrics = metrics_data.pop(ALB_OWNER, {})
+        if alb_name and target_groups:
+            alb_metrics['target_groups'] = {cluster: metrics_data.pop((ALB_OWNER, cluster)) for cluster in target_groups}
+        return metrics_data, alb_metrics
+
+    def get_ec2_metrics(self, instance_ids, period_minutes=5, start_time=None, end_time=None, period=300):
+        """Metrics for the last period_minutes, or for [start_time, end_time) when given"""
+        return self.collect_metrics(instance_ids, None, period_minutes, start_time, end_time, period)[0]
+
+    def get_alb_metrics(self, alb_name, period_minutes=5, start_time=None, end_time=None, period=300, target_groups=None):
+        """Metrics for the last period_minutes, or for [start_time, end_time) when given"""
+        if not alb_name:
+            return {}
+        return self.collect_metrics([], alb_name, period_minutes, start_time, end_time, period, target_groups)[1]
+
+    def load_benchmark_windows(self, results_file='benchmark_results.json'):
+        """Start/end time and requests per instance of every benchmarked target"""
+        with open(results_file, 'r') as f:
+            results = json.load(f).get('detailed_results', {})
+        
+        # Older results without per-instance attribution are matched to instances by endpoint
+        by_endpoint = {f"http://{info['public_dns']}:8000": instance_id for instance_id, info in self.instance_info.items()}
+        
+        windows = []
+        for key, label in BENCHMARK_TARGETS:
+            entries = results.get(key)
+            if entries is None:
+                continue
+            entries = [entries] if isinstance(entries, dict) else entries
+            for i, result in enumerate(entries):
+                if not result or 'start_time' not in result:
+                    continue
+                instances = {instance_id: instance['requests'] for instance_id, instance in result.get('instances', {}).items()}
+                if not instances and result['endpoint'].rstrip('/') in by_endpoint:
+                    instances = {by_endpoint[result['endpoint'].rstrip('/')]: result['successful_requests']}
+                windows.append({
+                    'label': label if key.startswith('alb') else f"{label}-{i+1}",
+                    'kind': 'alb' if key.startswith('alb') else 'direct',
+                    'cluster': key.split('_')[1],
+                    'client_latency': {name: result.get(f'{name}_response_time') for name in ('avg', 'p50', 'p90', 'p99')},
+                    'start': datetime.fromisoformat(result['start_time']),
+                    'end': datetime.fromisoformat(result['end_time']),
+                    'requests': result['successful_requests'],
+                    'instances': {instance_id: count for instance_id, count in instances.items() if instance_id in self.instance_info}
+                })
+        
+        print(f"Loaded {len(windows)} benchmark windows from {results_file}")
+        return windows
+
+    def get_window_metrics(self, windows, alb_name, target_groups=None):
+        """Fetch metrics for exactly each benchmark window at the finest period and derive per-request costs"""
+        periods = {window['label']: finest_period(window['start']) for window in windows}
+        window_metrics = {}
+        
+        # Windows sharing a period are fetched together over the span covering all of them and split
+        # locally, so a whole benchmark run takes a call or two instead of several per window
+        for period in sorted(set(periods.values())):
+            group = [window for window in windows if periods[window['label']] == period]
+            instance_ids = sorted({instance_id for window in group for instance_id in window['instances']})
+            first_start = min(window['start'] for window in group)
+            last_end = max(window['end'] for window in group)
+            start_time, end_time = align_window(first_start, last_end, period)
+            print(f"Getting metrics for {len(group)} benchmark windows ({start_time.isoformat()} - {end_time.isoformat()}, {period}s)")
             
-            network_out = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/EC2',
-                MetricName='NetworkOut',
-                Dimensions=[{'Name': 'InstanceId', 'Value': instance_id}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=300,
-                Statistics=['Sum']
+            with_alb = alb_name if any(window['kind'] == 'alb' for window in group) else None
+            ec2_metrics, alb_metrics = self.collect_metrics(
+                instance_ids, with_alb, start_time=start_time, end_time=end_time, period=period, target_groups=target_groups
             )
+            # Without detailed monitoring EC2 only publishes 5-minute datapoints
+            missing = [instance_id for instance_id in instance_ids if not ec2_metrics[instance_id]['cpu_utilization']]
+            if missing and period < 300:
+                coarse_start, coarse_end = align_window(first_start, last_end, 300)
+                ec2_metrics.update(self.get_ec2_metrics(missing, start_time=coarse_start, end_time=coarse_end, period=300))
             
-            metrics_data[instance_id] = {
-                'cpu_utilization': self.convert_datapoints(cpu_response['Datapoints']),
-                'network_in': self.convert_datapoints(network_in['Datapoints']),
-                'network_out': self.convert_datapoints(network_out['Datapoints'])
-            }
+            for window in group:
+                instances = {}
+                for instance_id in window['instances']:
+                    instance_period = 300 if instance_id in missing and period < 300 else period
+                    window_start, window_end = align_window(window['start'], window['end'], instance_period)
+                    instances[instance_id] = self.derive_instance_costs(
+                        instance_id, slice_datapoints(ec2_metrics[instance_id], window_start, window_end), windows, instance_period
+                    )
+                
+                entry = {
+                    'kind': window['kind'],
+                    'start_time': window['start'].isoformat(),
+                    'end_time': window['end'].isoformat(),
+                    'period': period,
+                    'requests': window['requests'],
+                    'instances': instances
+                }
+                if window['kind'] == 'alb' and alb_metrics:
+                    window_start, window_end = align_window(window['start'], window['end'], period)
+                    window_alb = slice_datapoints({key: alb_metrics[key] for key in ALB_METRICS}, window_start, window_end)
+                    entry['alb_request_count'] = sum(dp['Sum'] for dp in window_alb['request_count'])
+                    response_times = [dp['Average'] for dp in window_alb['response_time']]
+                    entry['alb_avg_response_time'] = sum(response_times) / len(response_times) * 1000 if response_times else None
+                    if window['cluster'] in alb_metrics.get('target_groups', {}):
+                        # The target group's own latency view of the same requests the client measured
+                        target_group = slice_datapoints(alb_metrics['target_groups'][window['cluster']], window_start, window_end)
+                        entry['target_group'] = summarize_target_group(target_group)
+                        entry['client_latency'] = window['client_latency']
+                window_metrics[window['label']] = entry
         
-        return metrics_data
+        return window_metrics
 
-    def get_alb_metrics(self, alb_name, period_minutes=5):
-        if not alb_name:
-            return {}
+    def get_host_telemetry(self, instance_ids, since, timeout=5):
+        """1-second /proc samples kept by each instance's app since the given time, as {instance_id: [sample]}"""
+        telemetry = {}
+        for instance_id in instance_ids:
+            url = TELEMETRY_URL.format(public_dns=self.instance_info[instance_id]['public_dns'], since=since.timestamp())
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as response:
+                    payload = json.load(response)
+            except (OSError, ValueError) as e:
+                print(f"No host telemetry from {instance_id}: {e}")
+                continue
+            telemetry[instance_id] = {
+                'interval': payload['interval'],
+                'samples': [dict(zip(payload['fields'], sample)) for sample in payload['samples']]
+            }
         
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(minutes=period_minutes)
-        
-        request_count = self.cloudwatch.get_metric_statistics(
-            Namespace='AWS/ApplicationELB',
-            MetricName='RequestCount',
-            Dimensions=[{'Name': 'LoadBalancer', 'Value': alb_name}],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=300,
-            Statistics=['Sum']
+        print(f"Got host telemetry from {len(telemetry)} of {len(instance_ids)} instances")
+        return telemetry
+
+    def add_window_telemetry(self, window_metrics, windows, telemetry):
+        """Summarize the telemetry samples overlapping each benchmark window into its per-instance entries"""
+        for window in windows:
+            for instance_id, costs in window_metrics[window['label']]['instances'].items():
+                if instance_id not in telemetry:
+                    continue
+                interval = telemetry[instance_id]['interval']
+                start, end = window['start'].timestamp(), window['end'].timestamp()
+                # A sample covers the interval that ends at its timestamp
+                samples = [
+                    sample for sample in telemetry[instance_id]['samples']
+                    if sample['timestamp'] > start and sample['timestamp'] - interval < end
+                ]
+                costs['telemetry'] = summarize_telemetry(samples, interval)
+
+    def derive_instance_costs(self, instance_id, metrics, windows, period):
+        """CPU time and network bytes of an instance over the aligned window, per request it served there"""
+        cpu_seconds = sum(
+            dp['Average'] / 100 * self.instance_info[instance_id]['vcpus'] * period for dp in metrics['cpu_utilization']
         )
+        network_in = sum(dp['Sum'] for dp in metrics['network_in'])
+        network_out = sum(dp['Sum'] for dp in metrics['network_out'])
         
-        response_time = self.cloudwatch.get_metric_statistics(
-            Namespace='AWS/ApplicationELB',
-            MetricName='TargetResponseTime',
-            Dimensions=[{'Name': 'LoadBalancer', 'Value': alb_name}],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=300,
-            Statistics=['Average']
-        )
+        # Datapoints cover whole periods, so every request the instance served in any target whose
+        # window falls into the same periods is charged, not only this target's
+        covered = set()
+        for dp in metrics['cpu_utilization']:
+            covered.add(datetime.fromisoformat(dp['Timestamp']))
+        requests = 0
+        for window in windows:
+            if instance_id not in window['instances']:
+                continue
+            start_time, end_time = align_window(window['start'], window['end'], period)
+            if any(start_time <= timestamp < end_time for timestamp in covered):
+                requests += window['instances'][instance_id]
         
-        healthy_hosts = self.cloudwatch.get_metric_statistics(
-            Namespace='AWS/ApplicationELB',
-            MetricName='HealthyHostCount',
-            Dimensions=[{'Name': 'LoadBalancer', 'Value': alb_name}],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=300,
-            Statistics=['Average']
-        )
+        costs = {
+            'cluster': self.instance_info[instance_id]['cluster'],
+            'period': period,
+            'datapoints': len(metrics['cpu_utilization']),
+            'avg_cpu': sum(dp['Average'] for dp in metrics['cpu_utilization']) / len(metrics['cpu_utilization']) if metrics['cpu_utilization'] else None,
+            'cpu_seconds': cpu_seconds,
+            'network_in_bytes': network_in,
+            'network_out_bytes': network_out,
+            'requests': requests
+        }
+        costs['cpu_ms_per_request'] = cpu_seconds * 1000 / requests if requests else None
+        costs['network_in_bytes_per_request'] = network_in / requests if requests else None
+        costs['network_out_bytes_per_request'] = network_out / requests if requests else None
+        return costs
+
+    def summarize_windows(self, window_metrics):
+        """Per-cluster CPU and network cost per request, from the direct instance windows"""
+        totals = {}
+        for entry in window_metrics.values():
+            if entry['kind'] != 'direct':
+                continue
+            for costs in entry['instances'].values():
+                if not costs['requests'] or not costs['datapoints']:
+                    continue
+                total = totals.setdefault(costs['cluster'], {'cpu_seconds': 0, 'network_in': 0, 'network_out': 0, 'requests': 0})
+                total['cpu_seconds'] += costs['cpu_seconds']
+                total['network_in'] += costs['network_in_bytes']
+                total['network_out'] += costs['network_out_bytes']
+                total['requests'] += costs['requests']
         
         return {
-            'request_count': self.convert_datapoints(request_count['Datapoints']),
-            'response_time': self.convert_datapoints(response_time['Datapoints']),
-            'healthy_hosts': self.convert_datapoints(healthy_hosts['Datapoints'])
+            cluster: {
+                'requests': total['requests'],
+                'cpu_ms_per_request': total['cpu_seconds'] * 1000 / total['requests'],
+                'network_in_bytes_per_request': total['network_in'] / total['requests'],
+                'network_out_bytes_per_request': total['network_out'] / total['requests']
+            }
+            for cluster, total in sorted(totals.items())
         }
 
     def analyze_metrics(self, ec2_metrics, alb_metrics):
@@ -171,6 +445,22 @@ class CloudWatchMonitor:
             'avg_cpu_across_instances': total_cpu / instance_count if instance_count > 0 else 0,
             }
         
+        clusters = {}
+        for instance_id, metrics in analysis['instances'].items():
+            if metrics['data_points']:
+                cluster = self.instance_info.get(instance_id, {}).get('cluster', 'unknown')
+                clusters.setdefault(cluster, {}).setdefault('cpu', []).append(metrics['avg_cpu'])
+        for cluster, metrics in alb_metrics.get('target_groups', {}).items():
+            clusters.setdefault(cluster, {})['alb'] = summarize_target_group(metrics)
+        analysis['clusters'] = {
+            cluster: {
+                'instance_type': next((info['instance_type'] for info in self.instance_info.values() if info['cluster'] == cluster), None),
+                'avg_cpu': sum(entry['cpu']) / len(entry['cpu']) if entry.get('cpu') else None,
+                'alb': entry.get('alb')
+            }
+            for cluster, entry in sorted(clusters.items())
+        }
+        
         return analysis
 
     def save_metrics(self, analysis):
@@ -189,6 +479,16 @@ class CloudWatchMonitor:
         print(f"  • Total instances monitored: {summary['total_instances']}")
         print(f"  • Average CPU utilization: {summary['avg_cpu_across_instances']:.2f}%")
         
+        if analysis.get('clusters'):
+            print(f"\nPER-CLUSTER ALB VIEW:")
+            for cluster, entry in analysis['clusters'].items():
+                line = f"  • {cluster} ({entry['instance_type']})"
+                if entry['avg_cpu'] is not None:
+                    line += f": CPU {entry['avg_cpu']:.2f}%"
+                print(line)
+                if entry['alb']:
+                    print(f"      {format_target_group(entry['alb'])}")
+        
         print(f"\nINSTANCE DETAILS:")
         for instance_id, metrics in analysis['instances'].items():
             print(f"  {instance_id}:")
@@ -196,29 +496,152 @@ class CloudWatchMonitor:
             print(f"    Network In: {metrics['network_in_bytes']} bytes")
             print(f"    Network Out: {metrics['network_out_bytes']} bytes")
         
+        if analysis.get('benchmark_windows'):
+            print(f"\nBENCHMARK WINDOWS:")
+            for label, entry in analysis['benchmark_windows'].items():
+                datapoints = sum(costs['datapoints'] for costs in entry['instances'].values())
+                line = f"  • {label}: {entry['requests']} requests, {datapoints} datapoints at {entry['period']}s"
+                if entry.get('alb_request_count') is not None:
+                    line += f", ALB counted {entry['alb_request_count']:.0f}"
+                print(line)
+                if entry.get('target_group'):
+                    client = entry['client_latency']
+                    print(f"      target group: {format_target_group(entry['target_group'])}")
+                    if client.get('p99') is not None:
+                        print(f"      client: avg {client['avg']:.2f}ms, p50 {client['p50']:.2f}ms, "
+                              f"p90 {client['p90']:.2f}ms, p99 {client['p99']:.2f}ms")
+                for instance_id, costs in entry['instances'].items():
+                    if costs['cpu_ms_per_request'] is not None:
+                        print(f"      {instance_id}: {costs['cpu_ms_per_request']:.3f} CPU ms/request, "
+                              f"{costs['network_out_bytes_per_request']:.0f} bytes out/request")
+                    telemetry = costs.get('telemetry')
+                    if telemetry and telemetry['samples']:
+                        print(f"      {instance_id} at 1s: CPU avg {telemetry['avg_cpu']:.1f}% max {telemetry['max_cpu']:.1f}%, "
+                              f"steal max {telemetry['max_steal']:.1f}%, {telemetry['saturated_seconds']:.0f}s saturated, "
+                              f"run queue max {telemetry['max_run_queue']}")
+            
+            if analysis.get('cost_per_request'):
+                print(f"\nCOST PER REQUEST BY CLUSTER:")
+                for cluster, costs in analysis['cost_per_request'].items():
+                    print(f"  • {cluster}: {costs['cpu_ms_per_request']:.3f} CPU ms, "
+                          f"{costs['network_in_bytes_per_request']:.0f} bytes in, "
+                          f"{costs['network_out_bytes_per_request']:.0f} bytes out ({costs['requests']} requests)")
+            else:
+                print("  No datapoints for the benchmark windows yet, CloudWatch can take a few minutes to publish them")
+        
         print("\n" + "="*60)
 
+def summarize_target_group(metrics):
+    """Request and error totals of target group datapoints, with response times in ms
+
+    Percentiles over several periods are the request-weighted mean of each period's value, max_p99 the worst period.
+    """
+    requests = {dp['Timestamp']: dp['Sum'] for dp in metrics['request_count']}
+    summary = {
+        'requests': sum(requests.values()),
+        'http_codes': {code: sum(dp['Sum'] for dp in metrics[f'http_{code}']) for code in ('2xx', '3xx', '4xx', '5xx')},
+        'connection_errors': sum(dp['Sum'] for dp in metrics['connection_errors']),
+        'min_healthy_hosts': min((dp['Average'] for dp in metrics['healthy_hosts']), default=None),
+        'max_unhealthy_hosts': max((dp['Average'] for dp in metrics['unhealthy_hosts']), default=None)
+    }
+    for name, stat in (('avg', 'Average'), ('p50', 'p50'), ('p90', 'p90'), ('p99', 'p99')):
+        points = [(dp[stat], requests.get(dp['Timestamp'], 0)) for dp in metrics['response_time'] if stat in dp]
+        weight = sum(count for value, count in points)
+        summary[f'{name}_response_time'] = sum(value * count for value, count in points) / weight * 1000 if weight else None
+    p99 = [dp['p99'] for dp in metrics['response_time'] if 'p99' in dp]
+    summary['max_p99_response_time'] = max(p99) * 1000 if p99 else None
+    return summary
+
+def format_target_group(summary):
+    line = f"{summary['requests']:.0f} requests"
+    if summary['p99_response_time'] is not None:
+        line += (f", avg {summary['avg_response_time']:.2f}ms, p50 {summary['p50_response_time']:.2f}ms, "
+                 f"p90 {summary['p90_response_time']:.2f}ms, p99 {summary['p99_response_time']:.2f}ms")
+    codes = summary['http_codes']
+    line += f", 2xx {codes['2xx']:.0f}, 4xx {codes['4xx']:.0f}, 5xx {codes['5xx']:.0f}, {summary['connection_errors']:.0f} connection errors"
+    return line
+
+def summarize_telemetry(samples, interval):
+    """Averages and peaks of telemetry samples; saturated_seconds is time spent with busy plus steal CPU at SATURATION_PERCENT or above"""
+    if not samples:
+        return {'samples': 0}
+    cpu = [sample['cpu_percent'] for sample in samples]
+    steal = [sample['steal_percent'] for sample in samples]
+    return {
+        'samples': len(samples),
+        'avg_cpu': sum(cpu) / len(cpu),
+        'max_cpu': max(cpu),
+        'avg_steal': sum(steal) / len(steal),
+        'max_steal': max(steal),
+        'saturated_seconds': sum(interval for busy, stolen in zip(cpu, steal) if busy + stolen >= SATURATION_PERCENT),
+        'max_run_queue': max(sample['run_queue'] for sample in samples),
+        'max_rss_bytes': max(sample['rss_bytes'] for sample in samples),
+        'net_rx_bytes': sum(sample['net_rx_bytes'] for sample in samples),
+        'net_tx_bytes': sum(sample['net_tx_bytes'] for sample in samples)
+    }
+
+def slice_datapoints(metrics, start_time, end_time):
+    """Datapoints of every metric that fall into [start_time, end_time)"""
+    return {
+        key: [dp for dp in datapoints if start_time <= datetime.fromisoformat(dp['Timestamp']) < end_time]
+        for key, datapoints in metrics.items()
+    }
+
+def finest_period(start_time):
+    """Finest period CloudWatch still retains for data starting at start_time (1-minute data is kept 15 days)"""
+    age = datetime.now(timezone.utc) - start_time
+    if age < timedelta(days=15):
+        return 60
+    if age < timedelta(days=63):
+        return 300
+    return 3600
+
+def align_window(start_time, end_time, period):
+    """Widen [start_time, end_time) to whole periods, the granularity CloudWatch returns datapoints at"""
+    start = int(start_time.timestamp()) // period * period
+    end = -(-int(end_time.timestamp() + 1) // period) * period
+    return datetime.fromtimestamp(start, timezone.utc), datetime.fromtimestamp(end, timezone.utc)
+
 def main():
+    parser = argparse.ArgumentParser(description='Collect CloudWatch metrics for the project instances and ALB')
+    parser.add_argument('--cache-file', default=CACHE_FILE, help='SQLite file keeping fetched datapoints between runs')
+    parser.add_argument('--no-cache', action='store_true', help='Fetch everything from CloudWatch without the local cache')
+    parser.add_argument('--no-telemetry', action='store_true', help="Skip pulling the apps' 1-second host telemetry")
+    parser.add_argument('--refresh-inventory', action='store_true',
+                        help='Rescan the project instances instead of revalidating the ones in inventory.json')
+    args = parser.parse_args()
+    
     try:
         print("Starting CloudWatch Metrics Collection")
         
-        monitor = CloudWatchMonitor()
+        monitor = CloudWatchMonitor(None if args.no_cache else args.cache_file)
         
         # Get resources
-        instance_ids = monitor.get_project_instances()
+        instance_ids = monitor.get_project_instances(refresh=args.refresh_inventory)
         if not instance_ids:
             print("No instances found. Run setup_aws.py first.")
             return
         
         alb_name = monitor.get_alb_arn()
+        target_groups = monitor.get_target_groups() if alb_name else {}
         
         # Collect metrics
         print("Collecting CloudWatch metrics...")
-        ec2_metrics = monitor.get_ec2_metrics(instance_ids)
-        alb_metrics = monitor.get_alb_metrics(alb_name)
+        ec2_metrics, alb_metrics = monitor.collect_metrics(instance_ids, alb_name, target_groups=target_groups)
         
         # Analyze and save
         analysis = monitor.analyze_metrics(ec2_metrics, alb_metrics)
+        
+        if os.path.exists('benchmark_results.json'):
+            print("Collecting metrics for the benchmark windows...")
+            windows = monitor.load_benchmark_windows()
+            analysis['benchmark_windows'] = monitor.get_window_metrics(windows, alb_name, target_groups)
+            if windows and not args.no_telemetry:
+                window_instances = sorted({instance_id for window in windows for instance_id in window['instances']})
+                telemetry = monitor.get_host_telemetry(window_instances, min(window['start'] for window in windows))
+                monitor.add_window_telemetry(analysis['benchmark_windows'], windows, telemetry)
+                analysis['host_telemetry'] = telemetry
+            analysis['cost_per_request'] = monitor.summarize_windows(analysis['benchmark_windows'])
         monitor.save_metrics(analysis)
         monitor.print_summary(analysis)
         
@@ -0,0 +1,71 @@
+import argparse
+from datetime import datetime, timedelta, timezone
+from cloudwatch_metrics import EC2_METRICS, MAX_QUERIES_PER_CALL, MetricQueryBatch
+
+class FakeCloudWatch:
+    """get_metric_data stand-in that counts calls and splits every series over `pages` pages"""
+
+    def __init__(self, points=4, pages=1):
+        self.points = points
+        self.pages = pages
+        self.calls = []
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy, NextToken=None):
+        assert len(MetricDataQueries) <= MAX_QUERIES_PER_CALL, f"{len(MetricDataQueries)} queries in one call"
+        self.calls.append({'queries': len(MetricDataQueries), 'NextToken': NextToken})
+        page = int(NextToken) if NextToken else 0
+        period = MetricDataQueries[0]['MetricStat']['Period']
+        timestamps = [StartTime + timedelta(seconds=period * index) for index in range(self.points)][page::self.pages]
+        response = {'MetricDataResults': [
+            {'Id': query['Id'], 'Timestamps': timestamps, 'Values': [float(index) for index in range(len(timestamps))]}
+            for query in MetricDataQueries
+        ]}
+        if page + 1 < self.pages:
+            response['NextToken'] = str(page + 1)
+        return response
+
+def build_batch(num_queries):
+    """Batch of num_queries EC2 queries, spread over as many fake instances as it takes"""
+    batch = MetricQueryBatch()
+    instance = 0
+    while len(batch.queries) < num_queries:
+        batch.add_metrics(f"i-{instance:05d}", EC2_METRICS, [{'Name': 'InstanceId', 'Value': f"i-{instance:05d}"}], 60)
+        instance += 1
+    del batch.queries[num_queries:]
+    batch.targets = {query['Id']: batch.targets[query['Id']] for query in batch.queries}
+    return batch
+
+def check(num_queries, pages, expected_calls, points):
+    cloudwatch = FakeCloudWatch(points, pages)
+    batch = build_batch(num_queries)
+    end_time = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    series = batch.fetch(cloudwatch, end_time - timedelta(minutes=points), end_time)
+
+    assert len(cloudwatch.calls) == expected_calls, f"{len(cloudwatch.calls)} calls, expected {expected_calls}"
+    assert sum(call['queries'] for call in cloudwatch.calls) == num_queries * pages
+    # Every series is split back to its instance with all its points, whatever page they came on
+    owners = {owner for owner, key, stat in batch.targets.values()}
+    assert set(series) == owners, "instances missing from the result"
+    for owner, metrics in series.items():
+        for key, datapoints in metrics.items():
+            assert len(datapoints) == points, f"{owner} {key}: {len(datapoints)} points"
+    print(f"  • {num_queries} queries over {len(owners)} instances, {pages} page(s) per call: "
+          f"{len(cloudwatch.calls)} get_metric_data calls")
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the get_metric_data call count of MetricQueryBatch against a fake CloudWatch')
+    parser.add_argument('--points', type=int, default=6, help='Datapoints per series')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print(f"GET_METRIC_DATA BATCHING ({MAX_QUERIES_PER_CALL} QUERIES PER CALL)")
+    print("="*60)
+    check(1, 1, 1, args.points)
+    check(MAX_QUERIES_PER_CALL, 1, 1, args.points)
+    check(MAX_QUERIES_PER_CALL + 1, 1, 2, args.points)
+    check(MAX_QUERIES_PER_CALL, 3, 3, args.points)
+    check(MAX_QUERIES_PER_CALL + 1, 2, 4, args.points)
+    print("\nAll checks passed")
+
+if __name__ == "__main__":
+    main()
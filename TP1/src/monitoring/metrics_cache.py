@@ -0,0 +1,103 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+CACHE_FILE = 'cloudwatch_cache.db'
+
+# CloudWatch can publish a datapoint several minutes after its period ends, so a range is only
+# recorded as fetched once it is this old; anything more recent is requested again next run
+PUBLISH_DELAY = timedelta(minutes=15)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS datapoints (
+    namespace TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    dimensions TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    stat TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (namespace, metric, dimensions, period, stat, timestamp)
+);
+CREATE TABLE IF NOT EXISTS series (
+    namespace TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    dimensions TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    stat TEXT NOT NULL,
+    fetched_from INTEGER NOT NULL,
+    fetched_until INTEGER NOT NULL,
+    PRIMARY KEY (namespace, metric, dimensions, period, stat)
+);
+'''
+
+def series_key(query):
+    """(namespace, metric, dimensions, period, stat) of a GetMetricData query"""
+    stat = query['MetricStat']
+    metric = stat['Metric']
+    dimensions = json.dumps(sorted((d['Name'], d['Value']) for d in metric['Dimensions']))
+    return (metric['Namespace'], metric['MetricName'], dimensions, stat['Period'], stat['Stat'])
+
+class MetricsCache:
+    """CloudWatch datapoints kept in SQLite, with the contiguous time range already fetched per series"""
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def fetched_range(self, query):
+        return self.connection.execute(
+            'SELECT fetched_from, fetched_until FROM series WHERE namespace=? AND metric=? AND dimensions=? AND period=? AND stat=?',
+            series_key(query)
+        ).fetchone()
+
+    def missing_ranges(self, query, start_time, end_time):
+        """Parts of [start_time, end_time) not fetched yet, as datetime pairs"""
+        fetched = self.fetched_range(query)
+        start, end = int(start_time.timestamp()), int(end_time.timestamp())
+        if fetched is None:
+            return [(start_time, end_time)]
+        fetched_from, fetched_until = fetched
+        # The fetched range only ever grows at its edges, so a gap between it and the request is fetched too
+        missing = []
+        if start < fetched_from:
+            missing.append((start_time, to_datetime(fetched_from)))
+        if end > fetched_until:
+            missing.append((to_datetime(fetched_until), end_time))
+        return missing
+
+    def store(self, query, timestamps, values, start_time, end_time):
+        """Save the datapoints fetched for [start_time, end_time) and extend the fetched range over its settled part"""
+        key = series_key(query)
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO datapoints VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [key + (int(timestamp.timestamp()), value) for timestamp, value in zip(timestamps, values)]
+        )
+        start = int(start_time.timestamp())
+        settled = min(int(end_time.timestamp()), int((datetime.now(timezone.utc) - PUBLISH_DELAY).timestamp()))
+        # Kept on a period boundary so the range fetched next time starts where CloudWatch's buckets do
+        settled -= settled % key[3]
+        if settled <= start:
+            return
+        fetched = self.fetched_range(query)
+        fetched_from, fetched_until = (start, settled) if fetched is None else (min(fetched[0], start), max(fetched[1], settled))
+        self.connection.execute('INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?, ?)', key + (fetched_from, fetched_until))
+
+    def load(self, query, start_time, end_time):
+        """Cached (timestamp, value) pairs of a series in [start_time, end_time), oldest first"""
+        rows = self.connection.execute(
+            'SELECT timestamp, value FROM datapoints WHERE namespace=? AND metric=? AND dimensions=? AND period=? AND stat=? '
+            'AND timestamp >= ? AND timestamp < ? ORDER BY timestamp',
+            series_key(query) + (int(start_time.timestamp()), int(end_time.timestamp()))
+        )
+        return [(to_datetime(timestamp), value) for timestamp, value in rows]
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+def to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc)
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+import boto3
+from botocore.exceptions import ClientError
+
+# Bumped whenever the layout of the state file changes; files of another version are rediscovered
+INVENTORY_VERSION = 1
+
+# Entries checked against AWS this recently are trusted without another call
+MAX_AGE = 300
+
+# Instance states that change on their own, so an instance in one of them is always revalidated
+TRANSITIONAL_STATES = ('pending', 'stopping', 'shutting-down')
+
+# Guards the read-modify-write of the state file between threads
+_lock = threading.Lock()
+
+def instance_record(instance):
+    tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+    return {
+        'InstanceId': instance['InstanceId'],
+        'Name': tags.get('Name', ''),
+        'State': instance['State']['Name'],
+        'InstanceType': instance['InstanceType'],
+        'ImageMode': tags.get('ImageMode', 'standard'),
+        'PublicIpAddress': instance.get('PublicIpAddress', ''),
+        'PublicDnsName': instance.get('PublicDnsName', ''),
+        'LaunchTime': instance['LaunchTime'].isoformat()
+    }
+
+# Instances and security group of one project, kept in <project>-inventory.json so the setup and
+# teardown scripts share them. Within MAX_AGE an entry is used as is, after that instances are
+# revalidated by id (a paginated scan of the Project tag if any is gone) and the security group by name.
+class Inventory:
+    def __init__(self, project_name, max_age=MAX_AGE, ec2_client=None):
+        self.project_name = project_name
+        self.path = f'{project_name}-inventory.json'
+        self.max_age = max_age
+        self.ec2_client = ec2_client or boto3.client('ec2')
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = None
+        except ValueError:
+            print(f"Ignoring unreadable {self.path}")
+            state = None
+        if state is not None and (state.get('version') != INVENTORY_VERSION or state.get('project') != self.project_name):
+            print(f"Ignoring {self.path} from another version or project")
+            state = None
+        return state or {'version': INVENTORY_VERSION, 'project': self.project_name}
+
+    # change -> function of the current section returning the new one, which is stamped as checked now
+    def update(self, section, change):
+        with _lock:
+            state = self.load()
+            state[section] = dict(change(state.get(section) or {}), checked=time.time())
+            temporary = f"{self.path}.tmp"
+            with open(temporary, 'w') as f:
+                json.dump(state, f, indent=2)
+            os.replace(temporary, self.path)
+
+    def cached(self, section):
+        entry = self.load().get(section)
+        if entry is None or time.time() - entry['checked'] > self.max_age:
+            return None
+        return entry
+
+    def clear(self):
+        with _lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def scan_instances(self):
+        paginator = self.ec2_client.get_paginator('describe_instances')
+        pages = paginator.paginate(Filters=[{'Name': 'tag:Project', 'Values': [self.project_name]}])
+        return [
+            instance_record(instance)
+            for page in pages for reservation in page['Reservations'] for instance in reservation['Instances']
+        ]
+
+    # Current records of the given instances, which are added to the inventory
+    def describe_instances(self, instance_ids):
+        paginator = self.ec2_client.get_paginator('describe_instances')
+        records = [
+            instance_record(instance)
+            for page in paginator.paginate(InstanceIds=list(instance_ids))
+            for reservation in page['Reservations'] for instance in reservation['Instances']
+        ]
+        described = {record['InstanceId']: record for record in records}
+        self.update('instances', lambda entry: {'items': dict(entry.get('items', {}), **described)})
+        return records
+
+    def get_instances(self, states=('running',), refresh=False):
+        entry = None if refresh else self.load().get('instances')
+        items = entry['items'] if entry else {}
+        if not items:
+            records = self.scan_instances()
+            self.update('instances', lambda entry: {'items': {record['InstanceId']: record for record in records}})
+            print(f"Discovered {len(records)} instances of {self.project_name}")
+        elif self.cached('instances') and not any(item['State'] in TRANSITIONAL_STATES for item in items.values()):
+            records = list(items.values())
+        else:
+            try:
+                records = self.describe_instances(sorted(items))
+            except ClientError as e:
+                # Instances terminated long enough ago are gone from EC2 altogether
+                if e.response['Error']['Code'] != 'InvalidInstanceID.NotFound':
+                    raise
+                return self.get_instances(states, refresh=True)
+        return [record for record in records if record['State'] in states]
+
+    def get_security_group(self):
+        entry = self.cached('security_group')
+        if entry is not None:
+            return entry['GroupId']
+        groups = self.ec2_client.describe_security_groups(
+            Filters=[{'Name': 'group-name', 'Values': [f'{self.project_name}-SG']}]
+        )['SecurityGroups']
+        if not groups:
+            return None
+        self.set_security_group(groups[0]['GroupId'])
+        return groups[0]['GroupId']
+
+    def set_security_group(self, group_id):
+        self.update('security_group', lambda entry: {'GroupId': group_id})
@@ -6,12 +6,14 @@ import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from constants.aws_automatisation_constants import ALLOW_HTTP_FROM_ANYWHERE, ALLOW_APP_PORT_8000_FROM_ANYWHERE, ALLOW_SSH_FROM_ANYWHERE
+from aws_automation.inventory import Inventory
 
 class AWSManager:
     def __init__(self, project_name):
         self.ec2_client = boto3.client('ec2')
         self.new_ec2 = boto3.resource('ec2')
         self.project_name = project_name
+        self.inventory = Inventory(project_name, ec2_client=self.ec2_client)
             
         print(f"AWS setup initialized for {self.project_name}")
 
@@ -23,11 +25,9 @@ class AWSManager:
 
     def create_security_group(self, can_ssh=False):
         try:
-            groups = self.ec2_client.describe_security_groups(
-                Filters=[{'Name': 'group-name', 'Values': [f'{self.project_name}-SG']}]
-            )
-            if groups['SecurityGroups']:
-                return groups['SecurityGroups'][0]['GroupId']
+            existing_id = self.inventory.get_security_group()
+            if existing_id:
+                return existing_id
             
             response = self.ec2_client.create_security_group(
                 GroupName=f'{self.project_name}-SG',
@@ -51,6 +51,7 @@ class AWSManager:
                 IpPermissions=ip_permissions
             )
             
+            self.inventory.set_security_group(sg_id)
             print(f"Created security group: {sg_id}")
             return sg_id
             
@@ -60,7 +61,8 @@ class AWSManager:
     
     # ami -> Amazon Machine Image and its purpose is to define the OS and pre-installed software in our new VM
     # key_name -> The name of the key pair to use for SSH access
-    def launch_instance(self, ami_id, security_group_id, instance_name, user_data, key_name, instance_type='t2.large'):
+    # tags -> extra {key: value} tags on top of Name and Project
+    def launch_instance(self, ami_id, security_group_id, instance_name, user_data, key_name, instance_type='t2.large', tags=None):
         print(f'Launching a {instance_type}  instance')
         response = self.ec2_client.run_instances(
             ImageId=ami_id,
@@ -75,12 +77,49 @@ class AWSManager:
                 'Tags': [
                     {'Key': 'Name', 'Value': f'{instance_name}'},
                     {'Key': 'Project', 'Value': self.project_name},
+                    *[{'Key': key, 'Value': value} for key, value in (tags or {}).items()]
                 ]
             }]
         )
         
         # Returning instance Id
         return response['Instances'][0]['InstanceId']
+
+    def find_image(self, name):
+        images = self.ec2_client.describe_images(
+            Owners=['self'],
+            Filters=[{'Name': 'name', 'Values': [name]}, {'Name': 'state', 'Values': ['available', 'pending']}]
+        )['Images']
+        return images[0]['ImageId'] if images else None
+
+    # bake_script -> user data that installs the software and then powers the builder instance off
+    # Reuses the image called name if it exists
+    def bake_image(self, name, base_ami_id, security_group_id, bake_script, key_name, instance_type='t2.large'):
+        image_waiter = self.ec2_client.get_waiter('image_available')
+        image_id = self.find_image(name)
+        if image_id is not None:
+            image_waiter.wait(ImageIds=[image_id], WaiterConfig={'Delay': 15, 'MaxAttempts': 80})
+            print(f"Reusing image {name}: {image_id}")
+            return image_id
+
+        print(f"Baking image {name} from {base_ami_id}...")
+        builder_id = self.launch_instance(base_ami_id, security_group_id, f"{self.project_name}-ImageBuilder",
+                                          bake_script, key_name, instance_type)
+        try:
+            # A builder that never stops means the bake script failed before reaching shutdown
+            self.ec2_client.get_waiter('instance_stopped').wait(
+                InstanceIds=[builder_id], WaiterConfig={'Delay': 15, 'MaxAttempts': 80}
+            )
+            image_id = self.ec2_client.create_image(
+                InstanceId=builder_id,
+                Name=name,
+                TagSpecifications=[{'ResourceType': 'image', 'Tags': [{'Key': 'Project', 'Value': self.project_name}]}]
+            )['ImageId']
+            image_waiter.wait(ImageIds=[image_id], WaiterConfig={'Delay': 15, 'MaxAttempts': 80})
+        finally:
+            self.ec2_client.terminate_instances(InstanceIds=[builder_id])
+        print(f"Baked image {image_id}")
+        return image_id
     
     def get_public_ip(self, instance_id):
         return self.new_ec2.Instance(instance_id).public_ip_address
@@ -94,11 +133,10 @@ class AWSManager:
         if not wait_for_ssh:
             return
         
-        reservations = self.ec2_client.describe_instances(InstanceIds=instance_ids)['Reservations']
         public_ips = [
-            i['PublicIpAddress']
-            for r in reservations for i in r['Instances']
-            if 'PublicIpAddress' in i
+            instance['PublicIpAddress']
+            for instance in self.inventory.describe_instances(instance_ids)
+            if instance['PublicIpAddress']
         ]
 
         # Wait for SSH availability on each instance
@@ -1,53 +1,86 @@
+import os
+import sys
 import time
 import boto3
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from aws_automation.inventory import Inventory
+
+# Calls function until it stops failing with one of retry_codes, doubling the pause up to max_delay
+def retry_with_backoff(function, retry_codes, timeout=300, initial_delay=2, max_delay=20):
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        try:
+            return function()
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code not in retry_codes or time.monotonic() + delay > deadline:
+                raise
+            print(f"{code}, retrying in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
 
 class AWSTeardown:
     def __init__(self, project_name):
         self.ec2_client = boto3.client('ec2')
         self.project_name = project_name
+        # Nothing cached is trusted here, every resource is looked up again before it is deleted
+        self.inventory = Inventory(project_name, max_age=0, ec2_client=self.ec2_client)
         print(f"AWS Teardown initialized for {self.project_name}")
 
     def find_project_instances(self):
         """Find project EC2 instances"""
-        response = self.ec2_client.describe_instances(
-            Filters=[
-                {'Name': 'tag:Project', 'Values': [self.project_name]},
-                {'Name': 'instance-state-name', 'Values': ['running', 'stopped', 'pending']}
-            ]
-        )
-        
-        instance_ids = []
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_ids.append(instance['InstanceId'])
+        instances = self.inventory.get_instances(states=('running', 'stopped', 'pending'), refresh=True)
+        instance_ids = [instance['InstanceId'] for instance in instances]
         
         print(f"Found {len(instance_ids)} instances to terminate")
         return instance_ids
 
     def terminate_instances(self, instance_ids):
-        """Terminate EC2 instances"""
+        """Request termination of EC2 instances"""
         if not instance_ids:
             print("No instances to terminate")
             return
         
         print(f"Terminating {len(instance_ids)} instances...")
         self.ec2_client.terminate_instances(InstanceIds=instance_ids)
-        
-        print("Waiting for instances to terminate...")
+
+    def wait_for_termination(self, instance_ids):
+        if not instance_ids:
+            return
         waiter = self.ec2_client.get_waiter('instance_terminated')
-        waiter.wait(InstanceIds=instance_ids)
+        waiter.wait(InstanceIds=instance_ids, WaiterConfig={'Delay': 5, 'MaxAttempts': 120})
         print("All instances terminated")
 
+    # The security group can only go once no network interface uses it, which is what terminating frees up
+    def wait_for_security_group_release(self, sg_id, timeout=600, max_interval=15):
+        deadline = time.monotonic() + timeout
+        interval = 2
+        paginator = self.ec2_client.get_paginator('describe_network_interfaces')
+        while True:
+            interfaces = [
+                interface for page in paginator.paginate(Filters=[{'Name': 'group-id', 'Values': [sg_id]}])
+                for interface in page['NetworkInterfaces']
+            ]
+            if not interfaces:
+                return
+            if time.monotonic() + interval > deadline:
+                raise TimeoutError(f"{len(interfaces)} network interfaces still use {sg_id} after {timeout}s")
+            print(f"{len(interfaces)} network interfaces still use {sg_id}, checking again in {interval}s")
+            time.sleep(interval)
+            interval = min(interval * 2, max_interval)
+
     def delete_security_group(self):
         try:
-            groups = self.ec2_client.describe_security_groups(
-                Filters=[{'Name': 'group-name', 'Values': [f'{self.project_name}-SG']}]
-            )
+            sg_id = self.inventory.get_security_group()
             
-            if groups['SecurityGroups']:
-                sg_id = groups['SecurityGroups'][0]['GroupId']
+            if sg_id:
+                self.wait_for_security_group_release(sg_id)
                 print(f"Deleting security group: {sg_id}")
-                self.ec2_client.delete_security_group(GroupId=sg_id)
+                retry_with_backoff(lambda: self.ec2_client.delete_security_group(GroupId=sg_id), ('DependencyViolation',), timeout=120)
                 print("Security group deleted")
                 
         except Exception as e:
@@ -62,9 +95,12 @@ class AWSTeardown:
             
             self.terminate_instances(instance_ids)
             
-            print("Waiting 30 seconds before deleting security group...")
-            time.sleep(30)
-            self.delete_security_group()
+            # The security group only waits for its network interfaces, not for the instances to finish terminating
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                terminated = executor.submit(self.wait_for_termination, instance_ids)
+                executor.submit(self.delete_security_group).result()
+                terminated.result()
+            self.inventory.clear()
             
             print("\n" + "=" * 50)
             print("TEARDOWN COMPLETED SUCCESSFULLY!")
@@ -12,6 +12,19 @@ nohup $HEC2/send-to-reducer.sh >> $HEC2/sender.log 2>>$HEC2/sender-error.log &
 '''
 
 
+## Documentation
+# Packages mapper.py and reducer.py need. The worker scripts below have an INSTALL_DEPENDENCIES placeholder
+# that is replaced with this, or with nothing when the instances boot from an image that already has them
+DEPENDENCY_INSTALL_SCRIPT = '''sudo yum install python-pip -y
+pip install msgpack zstandard
+'''
+
+# User data of the image builder instance, which powers off once the dependencies are installed
+IMAGE_BAKE_SCRIPT = '#!/bin/bash\nset -e\n' + DEPENDENCY_INSTALL_SCRIPT + 'shutdown -h now\n'
+
+# Boot times of the mapper and reducer workers, appended to by every run to compare the two modes
+BOOT_TIMES_FILE = 'boot_times.csv'
+
 ## Documentation
 # purpose: running automatically when EC2 instance starts
 # What it does:
@@ -135,9 +148,7 @@ EOL
 
 chmod +x $HEC2/mapper.sh $HEC2/send-to-reducer.sh
 
-sudo yum install python-pip -y
-pip install msgpack zstandard
-
+INSTALL_DEPENDENCIES
 
 nohup $HEC2/mapper.sh >> $HEC2/mapper.log 2>>$HEC2/mapper-error.log &
 '''
@@ -257,9 +268,7 @@ EOL
 
 chmod +x $HEC2/reducer.sh
 
-sudo yum install python-pip -y
-pip install msgpack zstandard
-
+INSTALL_DEPENDENCIES
 nohup $HEC2/reducer.sh >> $HEC2/reducer.log 2>>$HEC2/reducer-error.log &
 
 '''
@@ -1,11 +1,19 @@
+import argparse
+import csv
+import hashlib
 import os
 import subprocess
 import sys
+import time
+from datetime import datetime, timezone
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from aws_automation import setup_aws
 from constants.map_reduce_constants import (
     DEFAULT_AMI_ID, 
+    DEPENDENCY_INSTALL_SCRIPT,
+    IMAGE_BAKE_SCRIPT,
+    BOOT_TIMES_FILE,
     MAPPER_SENDING_SCRIPT, 
     MAPPER_USER_DATA_SCRIPT, 
     REDUCER_USER_DATA_SCRIPT, 
@@ -41,22 +49,87 @@ def split_file(input_path, m):
         print(f"Created {output_path} ({len(chunk)} lines)")
 
 
+def get_worker_image(manager, security_group_id):
+    # The name changes with the base AMI or the install script, so either change bakes a new image
+    digest = hashlib.sha1(f"{DEFAULT_AMI_ID}\n{DEPENDENCY_INSTALL_SCRIPT}".encode()).hexdigest()[:12]
+    return manager.bake_image(f"{PROJECT_NAME}-workers-{digest}", DEFAULT_AMI_ID, security_group_id,
+                              IMAGE_BAKE_SCRIPT, "tp2", INSTANCE_TYPE)
+
+
+def worker_uptime(ip, script):
+    # Seconds since the worker loop started on the instance, None while it is not running yet
+    ssh_command = [
+        'ssh', '-i', SSH_KEY_FILE,
+        *SSH_OPTIONS,
+        f'{EC2_USER}@{ip}',
+        # The bracket keeps the pattern from matching the remote shell running this command
+        f"pgrep -o -f '[{script[0]}]{script[1:]}' | xargs -r ps -o etimes= -p"
+    ]
+    output = subprocess.run(ssh_command, capture_output=True, text=True)
+    return int(output.stdout.strip()) if output.stdout.strip().isdigit() else None
+
+
+def record_boot_times(manager, workers, image_mode, timeout=900):
+    # workers -> (instance_id, role, public_ip, script); appends launch to worker loop start of each to BOOT_TIMES_FILE
+    launch_times = {
+        instance['InstanceId']: datetime.fromisoformat(instance['LaunchTime'])
+        for instance in manager.inventory.describe_instances([w[0] for w in workers])
+    }
+    rows = []
+    pending = list(workers)
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        for worker in list(pending):
+            instance_id, role, ip, script = worker
+            uptime = worker_uptime(ip, script)
+            if uptime is None:
+                continue
+            started = datetime.now(timezone.utc).timestamp() - uptime
+            boot_to_running = started - launch_times[instance_id].timestamp()
+            print(f"{role} {instance_id} ({image_mode} image): {script} running {boot_to_running:.0f}s after launch")
+            rows.append([datetime.now(timezone.utc).isoformat(), instance_id, role, image_mode, round(boot_to_running, 1)])
+            pending.remove(worker)
+        if pending:
+            time.sleep(5)
+
+    for instance_id, role, _, script in pending:
+        print(f"{role} {instance_id}: {script} not running after {timeout}s, check /var/log/cloud-init-output.log")
+
+    new_file = not os.path.exists(BOOT_TIMES_FILE)
+    with open(BOOT_TIMES_FILE, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(['timestamp', 'instance_id', 'role', 'image_mode', 'boot_to_worker_running'])
+        writer.writerows(rows)
+    print(f"Boot times appended to {BOOT_TIMES_FILE}")
+
 
 def main():
+    parser = argparse.ArgumentParser(description='Deploy the mapper and reducer instances and start the job')
+    parser.add_argument('--prebaked', action='store_true',
+                        help='Boot from an image with msgpack and zstandard pre-installed, baked on first use')
+    args = parser.parse_args()
+
     try:
         INSTANCES = 3
         split_file(FRIEND_LIST_FILE, INSTANCES)
         manager = setup_aws.AWSManager(PROJECT_NAME)
         
         security_group_id = manager.create_security_group(True)
+        ami_id = get_worker_image(manager, security_group_id) if args.prebaked else DEFAULT_AMI_ID
+        image_mode = 'prebaked' if args.prebaked else 'standard'
+        install_script = '' if args.prebaked else DEPENDENCY_INSTALL_SCRIPT
+
         mapper_ids = []
         for i in range(1, INSTANCES + 1):
-            mapper_user_data_script = MAPPER_USER_DATA_SCRIPT.replace('INSTANCE_NUMBER', str(i))
-            instance_id1 = manager.launch_instance(DEFAULT_AMI_ID, security_group_id, f"mapperInstance-{i}", mapper_user_data_script, "tp2", INSTANCE_TYPE)
+            mapper_user_data_script = MAPPER_USER_DATA_SCRIPT.replace('INSTANCE_NUMBER', str(i)).replace('INSTALL_DEPENDENCIES', install_script)
+            instance_id1 = manager.launch_instance(ami_id, security_group_id, f"mapperInstance-{i}", mapper_user_data_script, "tp2", INSTANCE_TYPE,
+                                                   {'ImageMode': image_mode})
             mapper_ids.append((instance_id1, i))
 
-        reducer_user_data_script = REDUCER_USER_DATA_SCRIPT.replace('INSTANCE_NUMBER', str(INSTANCES))
-        instance_id2 = manager.launch_instance(DEFAULT_AMI_ID, security_group_id, "reducerInstance", reducer_user_data_script, "tp2", INSTANCE_TYPE)
+        reducer_user_data_script = REDUCER_USER_DATA_SCRIPT.replace('INSTANCE_NUMBER', str(INSTANCES)).replace('INSTALL_DEPENDENCIES', install_script)
+        instance_id2 = manager.launch_instance(ami_id, security_group_id, "reducerInstance", reducer_user_data_script, "tp2", INSTANCE_TYPE,
+                                               {'ImageMode': image_mode})
         ip2 = manager.get_public_ip(instance_id2)
         
         mapper_instance_ids = [id[0] for id in mapper_ids]
@@ -130,6 +203,10 @@ def main():
             except Exception as e:
                 print(f'SCP failed: {e}')
 
+        workers = [(instance_id, f'mapper-{i}', manager.get_public_ip(instance_id), 'mapper.sh') for instance_id, i in mapper_ids]
+        workers.append((instance_id2, 'reducer', ip2, 'reducer.sh'))
+        record_boot_times(manager, workers, image_mode)
+
         print("Mapper Reducer instances deployment completed successfully!")
 
     except Exception as e: